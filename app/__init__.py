@@ -2,17 +2,21 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
-from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from config import Config
 from flask_dotenv import DotEnv
+from app.cache import ResponseCache
+from app.db_routing import RoutingSession, configure_binds
+from app import db_routing
+from app.passwords import PasswordHasher
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
-bcrypt = Bcrypt()
 env = DotEnv()
+response_cache = ResponseCache()
+password_hasher = PasswordHasher()
 
 
 def create_app(config_class=Config):
@@ -21,16 +25,59 @@ def create_app(config_class=Config):
     env.init_app(app)
 
     # Initialize Flask extensions
+    configure_binds(app)
     db.init_app(app)
+    db_routing.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
-    bcrypt.init_app(app)
     CORS(app)
+    response_cache.init_app(app)
+    password_hasher.init_app(app)
+
+    # JSON backend and streamed list responses
+    from app import encoding
+    encoding.init_app(app)
+
+    # Per-request SQL / serialization timing (Server-Timing header)
+    from app import instrumentation
+    instrumentation.init_app(app)
+
+    # On-the-fly compression of large JSON responses
+    from app import compression
+    compression.init_app(app)
 
     # Register blueprints
     from app.api import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
 
+    # The frontend and its fingerprinted assets (flask build-assets)
+    from app.assets import assets_bp
+    app.register_blueprint(assets_bp)
+
+    from app.auth import role_versions
+    role_versions.init_app(app)
+
+    from app.geo import building_index
+    building_index.init_app(app)
+
+    from app.intervals import event_intervals
+    event_intervals.init_app(app)
+
+    from app.planner import agenda_planner
+    agenda_planner.init_app(app)
+
+    # Live open-day updates over Server-Sent Events
+    from app.live import broker
+    broker.init_app(app)
+
+    # Background jobs, run by `flask worker`
+    from app import jobs
+    jobs.init_app(app)
+
+    # CLI commands
+    from app.cli import register_commands
+    register_commands(app)
+
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
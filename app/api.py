@@ -1,21 +1,58 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import (
-    create_access_token, create_refresh_token,
-    jwt_required, get_jwt_identity
+    create_access_token, jwt_required, get_jwt_identity
 )
-from app import db
+from app import db, password_hasher, response_cache
 from app.models import (
     User, OpenDay, Event, Building, SubjectArea,
-    Registration, UserAgenda, Feedback, Course, FAQ
+    Registration, UserAgenda, Feedback, Course, FAQ, Notification, UserNotification,
+    ContactMessage
 )
 from app.utils import validate_email, validate_password
+from app.loading import with_profile
+from app.cache import cached, cached_fragment
+from app.pagination import fetch_page, unpaginated, PaginationError
+from app.shapes import wants_normalized, SideLoader, ShapeError
+from app.fields import requested_fields, select_fields, serializer, FieldsError
+from app.encoding import list_response
+from app.passwords import PasswordHasherBusy
+from app.db_routing import use_primary
+from app.metrics import metrics
+from app.auth import admin_required, create_tokens, token_claims
+from app.booking import reserve_seat, release_seat, update_agenda
+from app.upsert import insert_if_absent, insert_or_get
+from app.geo import building_index, GeoError
+from app.intervals import event_intervals, find_conflicts, minutes, parse_window, TimeWindowError
+from app.planner import agenda_planner
+from app import importer, bundle, search, notifications, live, jobs
+from app.importer import ImportFormatError, detect_format
 from datetime import datetime, time
+from functools import partial
+import csv
+import io
 import json
 
 # Create Blueprint
 api_bp = Blueprint('api', __name__)
 
 
+@api_bp.errorhandler(PaginationError)
+@api_bp.errorhandler(ShapeError)
+@api_bp.errorhandler(FieldsError)
+@api_bp.errorhandler(search.SearchError)
+@api_bp.errorhandler(GeoError)
+@api_bp.errorhandler(TimeWindowError)
+def invalid_query_parameter(error):
+    return jsonify({'error': str(error)}), 400
+
+
+@api_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    response = jsonify({'error': 'Server busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 # ==================== AUTH ROUTES ====================
 
 @api_bp.route('/auth/register', methods=['POST'])
@@ -35,24 +72,26 @@ def register():
         return jsonify(
             {'error': 'Password must be at least 8 characters and include a number and special character'}), 400
 
-    # Check if user already exists
-    if User.query.filter_by(email=data['email']).first():
+    # Hashing is the expensive part, so a known email is turned away before it;
+    # the insert below still settles a race between two new registrations
+    if db.session.query(User.id).filter_by(email=data['email']).first() is not None:
         return jsonify({'error': 'Email already registered'}), 409
 
-    # Create new user
+    # Create the user unless the email is taken, in one statement
     try:
-        user = User(
-            email=data['email'],
-            password=data['password'],
-            full_name=data['full_name'],
-            phone=data.get('phone')
-        )
-        db.session.add(user)
+        user = insert_if_absent(User, {
+            'email': data['email'],
+            'password_hash': password_hasher.hash(data['password']),
+            'full_name': data['full_name'],
+            'phone': data.get('phone')
+        }, ['email'])
+        if user is None:
+            db.session.rollback()
+            return jsonify({'error': 'Email already registered'}), 409
         db.session.commit()
 
         # Generate tokens
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token, refresh_token = create_tokens(user)
 
         return jsonify({
             'message': 'User registered successfully',
@@ -60,6 +99,9 @@ def register():
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 201
+    except PasswordHasherBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -77,8 +119,16 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    access_token = create_access_token(identity=user.id)
-    refresh_token = create_refresh_token(identity=user.id)
+    # Upgrade hashes made with an old cost factor while we have the password
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except PasswordHasherBusy:
+            # The login itself succeeded; the rehash can wait for next time
+            db.session.rollback()
+
+    access_token, refresh_token = create_tokens(user)
 
     return jsonify({
         'message': 'Login successful',
@@ -92,11 +142,18 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity)
+    user = User.query.get(identity)
+
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Re-read the role so a refreshed token reflects the current one
+    access_token = create_access_token(identity=identity, additional_claims=token_claims(user))
     return jsonify({'access_token': access_token}), 200
 
 
 @api_bp.route('/auth/me', methods=['GET'])
+@use_primary
 @jwt_required()
 def get_user():
     identity = get_jwt_identity()
@@ -111,14 +168,20 @@ def get_user():
 # ==================== OPEN DAYS ROUTES ====================
 
 @api_bp.route('/opendays', methods=['GET'])
+@cached('open_days')
 def get_open_days():
-    open_days = OpenDay.query.order_by(OpenDay.event_date).all()
+    fields = requested_fields('open_days')
+    query = select_fields(OpenDay.query, 'open_days', fields) if fields else OpenDay.query
+    serialize = serializer('open_days', fields) if fields else OpenDay.to_dict
+
+    open_days = query.order_by(OpenDay.event_date).all()
     return jsonify({
-        'open_days': [open_day.to_dict() for open_day in open_days]
+        'open_days': [serialize(open_day) for open_day in open_days]
     }), 200
 
 
 @api_bp.route('/opendays/<int:open_day_id>', methods=['GET'])
+@cached('open_days')
 def get_open_day(open_day_id):
     open_day = OpenDay.query.get(open_day_id)
 
@@ -128,16 +191,61 @@ def get_open_day(open_day_id):
     return jsonify({'open_day': open_day.to_dict()}), 200
 
 
-@api_bp.route('/opendays', methods=['POST'])
-@jwt_required()
-def create_open_day():
-    # Check if user is admin
+@api_bp.route('/opendays/<int:open_day_id>/bundle', methods=['GET'])
+@jwt_required(optional=True)
+def get_open_day_bundle(open_day_id):
+    # The shared part comes from the response cache; the overlay is per user
+    public, etag = cached_fragment(
+        f'bundle:{open_day_id}', bundle.PUBLIC_TABLES, lambda: bundle.public_bundle(open_day_id)
+    )
+    if public is None:
+        return jsonify({'error': 'Open day not found'}), 404
+
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    if user_id is None:
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = jsonify(public)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = response_cache.cache_control()
+    else:
+        response = jsonify({**public, **bundle.user_overlay(int(user_id), open_day_id)})
+        response.headers['Cache-Control'] = 'private, no-cache'
+
+    response.vary.add('Authorization')
+    return response
+
+
+@api_bp.route('/opendays/<int:open_day_id>/stream', methods=['GET'])
+def stream_open_day(open_day_id):
+    # Server-Sent Events for the open day; see app/live.py
+    if not db.session.query(OpenDay.id).filter(OpenDay.id == open_day_id).scalar():
+        return jsonify({'error': 'Open day not found'}), 404
+
+    config = current_app.config
+    if not live.broker.connect(config['LIVE_MAX_CONNECTIONS']):
+        response = jsonify({'error': 'Too many live connections, try again shortly'})
+        response.headers['Retry-After'] = str(max(config['LIVE_RETRY_MS'] // 1000, 1))
+        return response, 503
+    live.broker.ensure_relay()
+
+    # EventSource sends Last-Event-ID itself when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = current_app.response_class(
+        live.broker.stream(open_day_id, last_event_id, config['LIVE_HEARTBEAT'], config['LIVE_RETRY_MS']),
+        mimetype='text/event-stream'
+    )
+    response.call_on_close(live.broker.disconnect)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tells nginx not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
-    if not user or not user.is_admin:
-        return jsonify({'error': 'Unauthorized'}), 403
 
+@api_bp.route('/opendays', methods=['POST'])
+@admin_required
+def create_open_day():
     data = request.get_json()
 
     # Validate required fields
@@ -184,6 +292,7 @@ def create_open_day():
 # ==================== EVENTS ROUTES ====================
 
 @api_bp.route('/events', methods=['GET'])
+@cached('events', 'buildings', 'subject_areas')
 def get_events():
     # Get query parameters for filtering
     open_day_id = request.args.get('open_day_id', type=int)
@@ -191,8 +300,12 @@ def get_events():
     subject_area_id = request.args.get('subject_area_id', type=int)
     building_id = request.args.get('building_id', type=int)
 
-    # Build query
-    query = Event.query
+    # Build query; a sparse fieldset loads only its own columns and joins
+    fields = requested_fields('events')
+    if fields:
+        query = select_fields(Event.query, 'events', fields, Event.start_time)
+    else:
+        query = with_profile(Event.query, 'events')
 
     if open_day_id:
         query = query.filter(Event.open_day_id == open_day_id)
@@ -202,18 +315,35 @@ def get_events():
         query = query.filter(Event.subject_area_id == subject_area_id)
     if building_id:
         query = query.filter(Event.building_id == building_id)
+    # Events running at any time in [from, to), found in the interval index
+    if 'from' in request.args or 'to' in request.args:
+        low, high = parse_window(request.args.get('from'), request.args.get('to'))
+        query = query.filter(Event.id.in_(event_intervals.overlapping(low, high, open_day_id or None)))
+
+    normalized = wants_normalized()
+    if fields:
+        to_dict = serializer('events', fields, normalized)
+    else:
+        to_dict = partial(Event.to_dict, normalized=normalized)
 
     # Sort by start time
-    events = query.order_by(Event.start_time).all()
+    page = fetch_page(query, Event.start_time, Event.id)
 
-    return jsonify({
-        'events': [event.to_dict() for event in events]
-    }), 200
+    if normalized:
+        loader = SideLoader()
+
+        def serialize(event):
+            loader.add(event)
+            return to_dict(event)
+
+        return list_response(page, 'events', serialize, loader.payload), 200
+    return list_response(page, 'events', to_dict), 200
 
 
 @api_bp.route('/events/<int:event_id>', methods=['GET'])
+@cached('events', 'buildings', 'subject_areas')
 def get_event(event_id):
-    event = Event.query.get(event_id)
+    event = with_profile(Event.query, 'events').filter(Event.id == event_id).first()
 
     if not event:
         return jsonify({'error': 'Event not found'}), 404
@@ -222,15 +352,8 @@ def get_event(event_id):
 
 
 @api_bp.route('/events', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_event():
-    # Check if user is admin
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-
-    if not user or not user.is_admin:
-        return jsonify({'error': 'Unauthorized'}), 403
-
     data = request.get_json()
 
     # Validate required fields
@@ -243,11 +366,17 @@ def create_event():
     if not open_day:
         return jsonify({'error': 'Open day not found'}), 404
 
+    # Convert string times to Python time objects
     try:
-        # Convert string times to Python time objects
         start_time = datetime.strptime(data['start_time'], '%H:%M').time()
         end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start_time and end_time must be HH:MM'}), 400
+    # The interval index and the agenda planner need a non-empty time span
+    if start_time >= end_time:
+        return jsonify({'error': 'start_time must be before end_time'}), 400
 
+    try:
         event = Event(
             open_day_id=data['open_day_id'],
             title=data['title'],
@@ -263,6 +392,8 @@ def create_event():
         )
 
         db.session.add(event)
+        db.session.flush()
+        live.publish(event.open_day_id, 'event_created', live.event_summary(event))
         db.session.commit()
 
         return jsonify({
@@ -274,12 +405,40 @@ def create_event():
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/import/schedule', methods=['POST'])
+@admin_required
+def import_schedule():
+    # Accept either a multipart upload or a raw CSV / JSON-lines body
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = request.args.get('format') or detect_format(upload.filename) or detect_format(upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or detect_format(request.mimetype)
+
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'Format must be csv or jsonl'}), 400
+
+    try:
+        result = importer.import_schedule(io.TextIOWrapper(stream, encoding='utf-8', newline=''), fmt)
+    except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if not result.ok:
+        return jsonify({'error': 'Import failed validation; nothing was imported', **result.to_dict()}), 400
+
+    return jsonify({'message': 'Schedule imported successfully', **result.to_dict()}), 201
+
+
 # ==================== REGISTRATIONS ROUTES ====================
 
 @api_bp.route('/register/openday/<int:open_day_id>', methods=['POST'])
 @jwt_required()
 def register_for_open_day(open_day_id):
-    user_id = get_jwt_identity()
+    user_id = int(get_jwt_identity())
     data = request.get_json() or {}
 
     # Check if open day exists
@@ -287,22 +446,25 @@ def register_for_open_day(open_day_id):
     if not open_day:
         return jsonify({'error': 'Open day not found'}), 404
 
-    # Check if already registered
-    existing = Registration.query.filter_by(user_id=user_id, open_day_id=open_day_id).first()
-    if existing:
-        return jsonify({'message': 'Already registered for this open day', 'registration': existing.to_dict()}), 200
-
     try:
-        registration = Registration(
-            user_id=user_id,
-            open_day_id=open_day_id,
-            interest_area=data.get('interest_area'),
-            receive_updates=data.get('receive_updates', False)
-        )
-
-        db.session.add(registration)
+        # Register, or get the existing registration
+        registration, created = insert_or_get(Registration, {
+            'user_id': user_id,
+            'open_day_id': open_day_id,
+            'interest_area': data.get('interest_area'),
+            'receive_updates': data.get('receive_updates', False)
+        }, ['user_id', 'open_day_id'])
+        if created:
+            # The confirmation email is sent by a worker, after this commits
+            jobs.enqueue('registration_confirmation', {'registration_id': registration.id})
         db.session.commit()
 
+        if not created:
+            return jsonify({
+                'message': 'Already registered for this open day',
+                'registration': registration.to_dict()
+            }), 200
+
         return jsonify({
             'message': 'Successfully registered for open day',
             'registration': registration.to_dict()
@@ -317,62 +479,177 @@ def register_for_open_day(open_day_id):
 def get_user_registrations():
     user_id = get_jwt_identity()
 
-    registrations = Registration.query.filter_by(user_id=user_id).all()
+    query = with_profile(Registration.query, 'registrations').filter_by(user_id=user_id)
+    page = fetch_page(query, Registration.id, Registration.id)
 
-    return jsonify({
-        'registrations': [registration.to_dict() for registration in registrations]
-    }), 200
+    return list_response(page, 'registrations', Registration.to_dict), 200
+
+
+@api_bp.route('/registrations/export', methods=['GET'])
+@admin_required
+def export_registrations():
+    # Every registration, streamed; meant for admin exports
+    query = with_profile(Registration.query, 'registrations').order_by(Registration.id)
+    return list_response(unpaginated(query), 'registrations', Registration.to_dict), 200
 
 
 # ==================== AGENDA ROUTES ====================
 
 @api_bp.route('/agenda', methods=['GET'])
+@use_primary
 @jwt_required()
 def get_user_agenda():
     user_id = get_jwt_identity()
     open_day_id = request.args.get('open_day_id', type=int)
 
     # Get user agenda items
-    query = UserAgenda.query.filter_by(user_id=user_id)
+    query = UserAgenda.query.join(Event).filter(UserAgenda.user_id == user_id)
 
     # Filter by open day if provided
     if open_day_id:
-        query = query.join(Event).filter(Event.open_day_id == open_day_id)
+        query = query.filter(Event.open_day_id == open_day_id)
+
+    normalized = wants_normalized()
+
+    page = fetch_page(
+        with_profile(query, 'agenda'), Event.start_time, UserAgenda.id,
+        row_keys=lambda item: [item.event.start_time, item.id]
+    )
+
+    if normalized:
+        loader = SideLoader()
+
+        def serialize(item):
+            loader.add(item.event)
+            return item.to_dict(normalized=True)
+
+        return list_response(page, 'agenda', serialize, loader.payload), 200
+    return list_response(page, 'agenda', UserAgenda.to_dict), 200
+
+
+@api_bp.route('/agenda/conflicts', methods=['GET'])
+@jwt_required()
+def get_agenda_conflicts():
+    user_id = get_jwt_identity()
+    open_day_id = request.args.get('open_day_id', type=int)
+
+    query = db.session.query(
+        Event.id, Event.open_day_id, Event.title, Event.start_time, Event.end_time, Event.building_id
+    ).join(UserAgenda, UserAgenda.event_id == Event.id).filter(UserAgenda.user_id == user_id)
+    if open_day_id:
+        query = query.filter(Event.open_day_id == open_day_id)
+
+    events = {}
+    by_day = {}
+    for row in query:
+        events[row.id] = {
+            'id': row.id, 'open_day_id': row.open_day_id, 'title': row.title,
+            'start_time': row.start_time.strftime('%H:%M'), 'end_time': row.end_time.strftime('%H:%M'),
+            'building_id': row.building_id,
+        }
+        by_day.setdefault(row.open_day_id, []).append(
+            (row.id, minutes(row.start_time), minutes(row.end_time), row.building_id)
+        )
+
+    # Overlaps, and back-to-back events too far apart to walk between in time
+    max_walk = building_index.max_walking_minutes() if by_day else 0
+    conflicts = []
+    for day in sorted(by_day, key=lambda day: (day is None, day)):
+        for conflict in find_conflicts(by_day[day], building_index.walking_minutes, max_walk):
+            conflicts.append({**conflict, 'first': events[conflict['first']], 'second': events[conflict['second']]})
 
-    agenda_items = query.join(Event).order_by(Event.start_time).all()
+    return jsonify({'conflicts': conflicts}), 200
 
-    # Format response
-    result = []
-    for item in agenda_items:
-        event_data = item.event.to_dict()
-        event_data['attended'] = item.attended
-        event_data['added_at'] = item.added_at.isoformat() if item.added_at else None
-        result.append(event_data)
+
+@api_bp.route('/agenda/auto', methods=['POST'])
+@jwt_required()
+def plan_agenda():
+    user_id = int(get_jwt_identity())
+    open_day_id = request.args.get('open_day_id', type=int)
+    data = request.get_json(silent=True) or {}
+    commit = data.get('commit', False)
+
+    if not open_day_id:
+        return jsonify({'error': 'open_day_id is required'}), 400
+    if not isinstance(commit, bool):
+        return jsonify({'error': 'commit must be true or false'}), 400
+
+    plan = agenda_planner.plan(open_day_id)
+    if not plan and not db.session.get(OpenDay, open_day_id):
+        return jsonify({'error': 'Open day not found'}), 404
+
+    interest_area = db.session.query(Registration.interest_area).filter_by(
+        user_id=user_id, open_day_id=open_day_id
+    ).scalar()
+
+    # Events already in the agenda stay; skip them and everything they overlap
+    excluded = set()
+    agenda = db.session.query(Event.id, Event.start_time, Event.end_time).join(
+        UserAgenda, UserAgenda.event_id == Event.id
+    ).filter(UserAgenda.user_id == user_id, Event.open_day_id == open_day_id)
+    for event_id, start, end in agenda:
+        excluded.add(event_id)
+        excluded.update(event_intervals.overlapping(minutes(start), minutes(end), open_day_id))
+
+    chosen, score = plan.solve(interest_area, excluded)
+    results = None
+    if commit:
+        # Seat counts in the plan can be a little behind; an event that fills up
+        # meanwhile is left out and the schedule worked out again without it
+        try:
+            for attempt in range(current_app.config['AUTO_AGENDA_RETRIES'] + 1):
+                results = update_agenda(user_id, add=chosen)
+                missed = {result['event_id'] for result in results if result['outcome'] in ('full', 'not_found')}
+                if not missed or attempt == current_app.config['AUTO_AGENDA_RETRIES']:
+                    break
+                db.session.rollback()
+                excluded |= missed
+                chosen, score = plan.solve(interest_area, excluded)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+        added = {result['event_id'] for result in results if result['outcome'] == 'added'}
+        chosen = [event_id for event_id in chosen if event_id in added]
+        score = plan.score(interest_area, chosen)
+
+    events = (
+        with_profile(Event.query, 'events').filter(Event.id.in_(chosen)).order_by(Event.start_time, Event.id).all()
+        if chosen else []
+    )
 
     return jsonify({
-        'agenda': result
+        'open_day_id': open_day_id,
+        'interest_area': interest_area,
+        'committed': commit,
+        'score': round(score, 3),
+        'events': [event.to_dict() for event in events],
+        'results': results,
     }), 200
 
 
 @api_bp.route('/agenda/add/<int:event_id>', methods=['POST'])
 @jwt_required()
 def add_to_agenda(event_id):
-    user_id = get_jwt_identity()
-
-    # Check if event exists
-    event = Event.query.get(event_id)
-    if not event:
-        return jsonify({'error': 'Event not found'}), 404
-
-    # Check if already in agenda
-    existing = UserAgenda.query.filter_by(user_id=user_id, event_id=event_id).first()
-    if existing:
-        return jsonify({'message': 'Event already in agenda'}), 200
+    user_id = int(get_jwt_identity())
 
-    # Add to agenda
     try:
-        agenda_item = UserAgenda(user_id=user_id, event_id=event_id)
-        db.session.add(agenda_item)
+        # Reserve a seat first; this fails fast when the event is full
+        if not reserve_seat(event_id):
+            db.session.rollback()
+
+            # Slow path only: work out why no seat was available
+            if not db.session.get(Event, event_id):
+                return jsonify({'error': 'Event not found'}), 404
+            if UserAgenda.query.filter_by(user_id=user_id, event_id=event_id).first():
+                return jsonify({'message': 'Event already in agenda'}), 200
+            return jsonify({'error': 'Event is full'}), 409
+
+        # The unique constraint on (user_id, event_id) skips duplicates;
+        # rolling back also returns the seat reserved above
+        if insert_if_absent(UserAgenda, {'user_id': user_id, 'event_id': event_id}, ['user_id', 'event_id']) is None:
+            db.session.rollback()
+            return jsonify({'message': 'Event already in agenda'}), 200
         db.session.commit()
 
         return jsonify({
@@ -386,17 +663,17 @@ def add_to_agenda(event_id):
 @api_bp.route('/agenda/remove/<int:event_id>', methods=['DELETE'])
 @jwt_required()
 def remove_from_agenda(event_id):
-    user_id = get_jwt_identity()
+    user_id = int(get_jwt_identity())
 
-    # Check if item exists in user's agenda
-    agenda_item = UserAgenda.query.filter_by(user_id=user_id, event_id=event_id).first()
+    # Remove from agenda and give the seat back in the same transaction
+    try:
+        removed = UserAgenda.query.filter_by(user_id=user_id, event_id=event_id).delete()
 
-    if not agenda_item:
-        return jsonify({'error': 'Event not in agenda'}), 404
+        if not removed:
+            db.session.rollback()
+            return jsonify({'error': 'Event not in agenda'}), 404
 
-    # Remove from agenda
-    try:
-        db.session.delete(agenda_item)
+        release_seat(event_id, removed)
         db.session.commit()
 
         return jsonify({
@@ -407,9 +684,48 @@ def remove_from_agenda(event_id):
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/agenda/batch', methods=['POST'])
+@jwt_required()
+def update_agenda_batch():
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    add = data.get('add', [])
+    remove = data.get('remove', [])
+
+    # Validate input
+    for ids in (add, remove):
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': 'add and remove must be lists of event ids'}), 400
+    if not add and not remove:
+        return jsonify({'error': 'Nothing to add or remove'}), 400
+    limit = current_app.config['AGENDA_BATCH_LIMIT']
+    if len(add) + len(remove) > limit:
+        return jsonify({'error': f'At most {limit} event ids per batch'}), 400
+
+    # Apply the whole batch in one transaction
+    try:
+        results = update_agenda(user_id, add=list(dict.fromkeys(add)), remove=list(dict.fromkeys(remove)))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    agenda = (
+        with_profile(UserAgenda.query.join(Event).filter(UserAgenda.user_id == user_id), 'agenda')
+        .order_by(Event.start_time, UserAgenda.id)
+        .all()
+    )
+
+    return jsonify({
+        'results': results,
+        'agenda': [item.to_dict() for item in agenda]
+    }), 200
+
+
 # ==================== MAPS ROUTES ====================
 
 @api_bp.route('/maps/buildings', methods=['GET'])
+@cached('buildings')
 def get_buildings():
     campus = request.args.get('campus')
 
@@ -418,14 +734,44 @@ def get_buildings():
     if campus:
         query = query.filter(Building.campus == campus)
 
-    buildings = query.all()
+    page = fetch_page(query, Building.name, Building.id)
 
-    return jsonify({
-        'buildings': [building.to_dict() for building in buildings]
-    }), 200
+    return list_response(page, 'buildings', Building.to_dict), 200
+
+
+@api_bp.route('/maps/buildings/nearby', methods=['GET'])
+def get_nearby_buildings():
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng are required'}), 400
+
+    radius = request.args.get('radius', 500, type=float)
+    limit = request.args.get('limit', 10, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, current_app.config['PAGINATION_MAX_LIMIT'])
+
+    # Answered from the in-memory grid index; see app/geo.py
+    return jsonify({'buildings': building_index.nearby(lat, lng, radius, limit)}), 200
+
+
+@api_bp.route('/maps/walking-times', methods=['GET'])
+@cached('buildings')
+def get_walking_times():
+    # Estimated walks between buildings, for travel time between agenda items
+    building_ids = request.args.get('building_ids')
+    if building_ids:
+        try:
+            building_ids = [int(building_id) for building_id in building_ids.split(',')]
+        except ValueError:
+            return jsonify({'error': 'building_ids must be a comma-separated list of ids'}), 400
+
+    return jsonify({'walking_times': building_index.walking_matrix(building_ids)}), 200
 
 
 @api_bp.route('/maps/campuses', methods=['GET'])
+@cached('buildings')
 def get_campuses():
     # Get unique campus names
     campuses = db.session.query(Building.campus).distinct().all()
@@ -439,22 +785,26 @@ def get_campuses():
 # ==================== COURSES ROUTES ====================
 
 @api_bp.route('/courses', methods=['GET'])
+@cached('courses', 'subject_areas')
 def get_courses():
     subject_area_id = request.args.get('subject_area_id', type=int)
 
-    query = Course.query
+    fields = requested_fields('courses')
+    if fields:
+        query = select_fields(Course.query, 'courses', fields, Course.name)
+    else:
+        query = with_profile(Course.query, 'courses')
 
     if subject_area_id:
         query = query.filter(Course.subject_area_id == subject_area_id)
 
-    courses = query.all()
+    page = fetch_page(query, Course.name, Course.id)
 
-    return jsonify({
-        'courses': [course.to_dict() for course in courses]
-    }), 200
+    return list_response(page, 'courses', serializer('courses', fields) if fields else Course.to_dict), 200
 
 
 @api_bp.route('/courses/subject-areas', methods=['GET'])
+@cached('subject_areas')
 def get_subject_areas():
     subject_areas = SubjectArea.query.all()
 
@@ -468,7 +818,7 @@ def get_subject_areas():
 @api_bp.route('/feedback', methods=['POST'])
 @jwt_required()
 def submit_feedback():
-    user_id = get_jwt_identity()
+    user_id = int(get_jwt_identity())
     data = request.get_json()
 
     # Validate required fields
@@ -484,22 +834,19 @@ def submit_feedback():
     if not open_day:
         return jsonify({'error': 'Open day not found'}), 404
 
-    # Check if user already submitted feedback for this open day
-    existing = Feedback.query.filter_by(user_id=user_id, open_day_id=data['open_day_id']).first()
-    if existing:
-        return jsonify({'error': 'You have already submitted feedback for this open day'}), 409
-
     try:
-        feedback = Feedback(
-            user_id=user_id,
-            open_day_id=data['open_day_id'],
-            rating=data['rating'],
-            useful_aspects=data.get('useful_aspects', []),
-            improvement_suggestions=data.get('improvement_suggestions'),
-            additional_comments=data.get('additional_comments')
-        )
-
-        db.session.add(feedback)
+        # One feedback per user and open day, enforced by the unique constraint
+        feedback = insert_if_absent(Feedback, {
+            'user_id': user_id,
+            'open_day_id': data['open_day_id'],
+            'rating': data['rating'],
+            'useful_aspects': data.get('useful_aspects', []),
+            'improvement_suggestions': data.get('improvement_suggestions'),
+            'additional_comments': data.get('additional_comments')
+        }, ['user_id', 'open_day_id'])
+        if feedback is None:
+            db.session.rollback()
+            return jsonify({'error': 'You have already submitted feedback for this open day'}), 409
         db.session.commit()
 
         return jsonify({
@@ -525,31 +872,57 @@ def submit_contact_form():
     if not validate_email(data['email']):
         return jsonify({'error': 'Invalid email format'}), 400
 
+    # The subject becomes an email header, which cannot hold a line break
+    subject = data.get('subject') or 'Open Day Inquiry'
+    if not isinstance(subject, str) or '\r' in subject or '\n' in subject:
+        return jsonify({'error': 'subject must be a single line of text'}), 400
+
     try:
-        # Here you would typically save to database and/or send an email
-        # For simplicity, we'll just return a success message
+        contact = ContactMessage(
+            name=data['name'],
+            email=data['email'],
+            subject=subject,
+            message=data['message']
+        )
+        db.session.add(contact)
+        # Emails go out from a worker once the message is saved
+        jobs.enqueue('send_email', {
+            'to': current_app.config['CONTACT_EMAIL'],
+            'subject': f"Contact form: {contact.subject}",
+            'body': f"From {contact.name} <{contact.email}>\n\n{contact.message}\n",
+            'reply_to': contact.email
+        })
+        jobs.enqueue('send_email', {
+            'to': contact.email,
+            'subject': f"We received your message: {contact.subject}",
+            'body': f"Hello {contact.name},\n\nThank you for getting in touch. "
+                    "We will get back to you soon.\n\nYour message:\n\n"
+                    f"{contact.message}\n"
+        })
+        db.session.commit()
+
         return jsonify({
             'message': 'Your message has been sent. We will get back to you soon.',
-            'contact': {
-                'name': data['name'],
-                'email': data['email'],
-                'subject': data.get('subject', 'Open Day Inquiry'),
-                'message': data['message']
-            }
+            'contact': contact.to_dict()
         }), 201
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 # ==================== FAQ ROUTES ====================
 
 @api_bp.route('/faqs', methods=['GET'])
+@cached('faqs')
 def get_faqs():
-    faqs = FAQ.query.order_by(FAQ.created_at.desc()).all()
-    return jsonify({'faqs': [faq.to_dict() for faq in faqs]}), 200
+    fields = requested_fields('faqs')
+    query = select_fields(FAQ.query, 'faqs', fields, FAQ.created_at) if fields else FAQ.query
+    page = fetch_page(query, FAQ.created_at, FAQ.id, descending=True)
+    return list_response(page, 'faqs', serializer('faqs', fields) if fields else FAQ.to_dict), 200
 
 
 @api_bp.route('/faqs/<int:faq_id>', methods=['GET'])
+@cached('faqs')
 def get_faq(faq_id):
     faq = FAQ.query.get(faq_id)
     if not faq:
@@ -558,13 +931,8 @@ def get_faq(faq_id):
 
 
 @api_bp.route('/faqs', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_faq():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user or not user.is_admin:
-        return jsonify({'error': 'Unauthorized'}), 403
-
     data = request.get_json()
     if not all(k in data for k in ['question', 'answer']):
         return jsonify({'error': 'Missing required fields'}), 400
@@ -580,13 +948,8 @@ def create_faq():
 
 
 @api_bp.route('/faqs/<int:faq_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_faq(faq_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user or not user.is_admin:
-        return jsonify({'error': 'Unauthorized'}), 403
-
     faq = FAQ.query.get(faq_id)
     if not faq:
         return jsonify({'error': 'FAQ not found'}), 404
@@ -605,13 +968,8 @@ def update_faq(faq_id):
 
 
 @api_bp.route('/faqs/<int:faq_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_faq(faq_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user or not user.is_admin:
-        return jsonify({'error': 'Unauthorized'}), 403
-
     faq = FAQ.query.get(faq_id)
     if not faq:
         return jsonify({'error': 'FAQ not found'}), 404
@@ -623,3 +981,127 @@ def delete_faq(faq_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+
+# ==================== NOTIFICATIONS ROUTES ====================
+
+@api_bp.route('/notifications', methods=['GET'])
+@use_primary
+@jwt_required()
+def get_notifications():
+    user_id = int(get_jwt_identity())
+    unread = request.args.get('unread', '').lower() in ('1', 'true', 'yes')
+
+    query = with_profile(UserNotification.query, 'notifications').filter(UserNotification.user_id == user_id)
+    if unread:
+        query = query.filter(UserNotification.is_read.is_(False))
+
+    # Newest first; notification ids are unique within an inbox
+    page = fetch_page(query, UserNotification.notification_id, UserNotification.notification_id, descending=True)
+
+    return list_response(page, 'notifications', UserNotification.to_dict), 200
+
+
+@api_bp.route('/notifications/unread-count', methods=['GET'])
+@use_primary
+@jwt_required()
+def get_unread_notification_count():
+    # Read from the counter on the user row, not counted
+    return jsonify({'unread_count': notifications.unread_count(int(get_jwt_identity()))}), 200
+
+
+@api_bp.route('/notifications/<int:notification_id>/read', methods=['POST'])
+@jwt_required()
+def mark_notification_read(notification_id):
+    user_id = int(get_jwt_identity())
+
+    try:
+        if not notifications.mark_read(user_id, [notification_id]) and not UserNotification.query.filter_by(
+                user_id=user_id, notification_id=notification_id).first():
+            db.session.rollback()
+            return jsonify({'error': 'Notification not found'}), 404
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'unread_count': notifications.unread_count(user_id)}), 200
+
+
+@api_bp.route('/notifications/read-all', methods=['POST'])
+@jwt_required()
+def mark_all_notifications_read():
+    user_id = int(get_jwt_identity())
+
+    try:
+        marked = notifications.mark_read(user_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'marked_read': marked, 'unread_count': notifications.unread_count(user_id)}), 200
+
+
+@api_bp.route('/notifications', methods=['POST'])
+@admin_required
+def send_notification():
+    data = request.get_json() or {}
+    audience = data.get('audience', 'both')
+
+    # Validate required fields
+    if not all(data.get(k) for k in ('title', 'message', 'related_event_id')):
+        return jsonify({'error': 'title, message and related_event_id are required'}), 400
+    if audience not in notifications.AUDIENCES:
+        return jsonify({'error': f"audience must be one of: {', '.join(notifications.AUDIENCES)}"}), 400
+
+    event = db.session.get(Event, data['related_event_id'])
+    if not event:
+        return jsonify({'error': 'Event not found'}), 404
+
+    # Delivery to every user in the audience is left to a worker; the
+    # notification and its job commit together
+    try:
+        notification = Notification(
+            title=data['title'],
+            message=data['message'],
+            notification_type=data.get('notification_type', 'event_update'),
+            related_event_id=event.id
+        )
+        db.session.add(notification)
+        db.session.flush()
+        job = jobs.enqueue('notification_fan_out', {
+            'notification_id': notification.id, 'event_id': event.id, 'audience': audience,
+        })
+        live.publish(event.open_day_id, 'announcement', {
+            'notification_id': notification.id, 'title': notification.title, 'message': notification.message,
+            'notification_type': notification.notification_type, 'related_event_id': event.id,
+        })
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'message': 'Notification queued for delivery',
+        'notification': notification.to_dict(),
+        'job': job.to_dict()
+    }), 202
+
+
+# ==================== SEARCH ROUTES ====================
+
+@api_bp.route('/search', methods=['GET'])
+@cached('courses', 'events', 'faqs')
+def search_content():
+    # Ranked hits across courses, events and FAQs; see app/search.py
+    return jsonify(search.search()), 200
+
+
+# ==================== METRICS ROUTES ====================
+
+@api_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    # Job counters come from the workers' own processes; queue depths from the table
+    return jsonify({**metrics.snapshot(), 'jobs': jobs.queue_stats()}), 200
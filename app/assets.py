@@ -0,0 +1,161 @@
+"""
+Build step and serving for the single-page frontend in app/static.
+
+`flask build-assets` turns app/static/index.html into a short entry page
+plus fingerprinted assets under app/static/dist:
+
+- every inline <script> and <style> block without attributes is moved to
+  its own file and referenced from the same place, so execution order is
+  unchanged;
+- local files the page refers to (the logo) are copied;
+- each asset is named after a hash of its content, e.g. index-4.3f9c2a1b7e0d.js,
+  so its URL changes whenever it does and it can be cached forever;
+- gzip and, when the brotli package is installed, brotli variants are
+  written next to every compressible file.
+
+`/` serves the entry page with `no-cache`, so clients revalidate it on each
+visit and pick up new asset URLs at once. `/assets/<name>` serves the
+fingerprinted files with an immutable one-year Cache-Control. Both send the
+best precompressed variant the client accepts. Without a build, `/` falls
+back to the source index.html.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import Blueprint, current_app, send_from_directory, abort
+from werkzeug.security import safe_join
+from app.compression import accepted_encodings, brotli
+
+ENTRY = 'index.html'
+MANIFEST = 'manifest.json'
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+COMPRESSIBLE = ('.html', '.js', '.css', '.svg', '.json', '.txt')
+
+# Inline blocks with no attributes; <script src=...> and typed blocks are left alone
+INLINE_BLOCK = re.compile(r'<(script|style)>(.*?)</\1>', re.S | re.I)
+LOCAL_REFERENCE = re.compile(r'\b(src|href)="(?![a-z][a-z0-9+.-]*:|/|#)([^"?#]+)"', re.I)
+
+assets_bp = Blueprint('assets', __name__)
+
+
+def dist_dir(app):
+    return app.config.get('ASSETS_DIST_DIR') or os.path.join(app.static_folder, 'dist')
+
+
+def fingerprint(name, data):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(directory, name, data):
+    """Write a file and its compressed variants; returns the bytes written per encoding"""
+    sizes = {'identity': len(data)}
+    with open(os.path.join(directory, name), 'wb') as fh:
+        fh.write(data)
+    if not name.endswith(COMPRESSIBLE):
+        return sizes
+
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    for encoding, compressed in variants.items():
+        # Only worth serving if it actually saves bytes
+        if len(compressed) < len(data):
+            with open(os.path.join(directory, name + SUFFIXES[encoding]), 'wb') as fh:
+                fh.write(compressed)
+            sizes[encoding] = len(compressed)
+    return sizes
+
+
+def build(app):
+    """Build app/static/dist from app/static/index.html; returns {file: sizes}"""
+    source_dir = app.static_folder
+    target = dist_dir(app)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+
+    with open(os.path.join(source_dir, ENTRY), encoding='utf-8') as fh:
+        html = fh.read()
+
+    manifest, report = {}, {}
+    counter = 0
+
+    def emit(name, data):
+        fingerprinted = fingerprint(name, data)
+        report[fingerprinted] = _write(target, fingerprinted, data)
+        manifest[name] = fingerprinted
+        return f'/assets/{fingerprinted}'
+
+    def extract(match):
+        nonlocal counter
+        counter += 1
+        tag, body = match.group(1).lower(), match.group(2)
+        if tag == 'style':
+            url = emit(f'index-{counter}.css', body.encode('utf-8'))
+            return f'<link rel="stylesheet" href="{url}">'
+        url = emit(f'index-{counter}.js', body.encode('utf-8'))
+        return f'<script src="{url}"></script>'
+
+    def relink(match):
+        attribute, reference = match.groups()
+        path = safe_join(source_dir, reference)
+        if path is None or not os.path.isfile(path):
+            return match.group(0)
+        if reference not in manifest:
+            with open(path, 'rb') as fh:
+                emit(reference, fh.read())
+        return f'{attribute}="/assets/{manifest[reference]}"'
+
+    html = INLINE_BLOCK.sub(extract, html)
+    html = LOCAL_REFERENCE.sub(relink, html)
+
+    report[ENTRY] = _write(target, ENTRY, html.encode('utf-8'))
+    with open(os.path.join(target, MANIFEST), 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return report
+
+
+def send_precompressed(directory, name, max_age, immutable=False):
+    """Send a file, or its best precompressed variant the client accepts"""
+    path = safe_join(directory, name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    filename, encoding = name, None
+    for candidate in accepted_encodings():
+        if os.path.isfile(path + SUFFIXES[candidate]):
+            filename, encoding = name + SUFFIXES[candidate], candidate
+            break
+
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response = send_from_directory(directory, filename, mimetype=mimetype, max_age=max_age)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+@assets_bp.route('/')
+def index():
+    target = dist_dir(current_app)
+    if os.path.isfile(os.path.join(target, ENTRY)):
+        return send_precompressed(target, ENTRY, max_age=0)
+    return send_precompressed(current_app.static_folder, ENTRY, max_age=0)
+
+
+@assets_bp.route('/assets/<path:name>')
+def asset(name):
+    # The entry page is only served, short-lived, at /
+    if name in (ENTRY, MANIFEST):
+        abort(404)
+    return send_precompressed(dist_dir(current_app), name,
+                              max_age=current_app.config['ASSET_MAX_AGE'], immutable=True)
@@ -0,0 +1,96 @@
+import threading
+import time
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import (
+    create_access_token, create_refresh_token,
+    jwt_required, get_jwt
+)
+from app import db, jwt
+from app.models import User
+
+
+class RoleVersionCache:
+    """
+    In-memory map of user id -> current role version.
+
+    Tokens carry the role version they were issued with. Changing a user's
+    role bumps the version, and any token with an older version is rejected
+    without a database lookup. The map only holds users whose role has ever
+    changed and is reloaded at most every ROLE_VERSION_REFRESH seconds, so
+    role changes made by another worker take effect within that window.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.refresh_interval = 30
+
+    def init_app(self, app):
+        app.config.setdefault('ROLE_VERSION_REFRESH', 30)
+        self.refresh_interval = app.config['ROLE_VERSION_REFRESH']
+
+    def current(self, user_id):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.reload()
+        return self._versions.get(user_id, 0)
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._versions[user_id] = version
+
+    def reload(self):
+        rows = db.session.query(User.id, User.role_version).filter(User.role_version > 0).all()
+        with self._lock:
+            self._versions = {user_id: version for user_id, version in rows}
+            self._loaded_at = time.monotonic()
+
+
+role_versions = RoleVersionCache()
+
+
+def token_claims(user):
+    return {
+        'role': 'admin' if user.is_admin else 'user',
+        'rv': user.role_version or 0
+    }
+
+
+def create_tokens(user):
+    """Access and refresh tokens for a user, carrying their role claims"""
+    claims = token_claims(user)
+    identity = str(user.id)
+    return (
+        create_access_token(identity=identity, additional_claims=claims),
+        create_refresh_token(identity=identity, additional_claims=claims)
+    )
+
+
+def change_role(user, is_admin):
+    """Set a user's admin flag and revoke every token issued under the old role"""
+    user.is_admin = is_admin
+    user.role_version = (user.role_version or 0) + 1
+    db.session.commit()
+    role_versions.set(user.id, user.role_version)
+
+
+@jwt.token_in_blocklist_loader
+def token_role_revoked(jwt_header, jwt_payload):
+    try:
+        user_id = int(jwt_payload['sub'])
+    except (KeyError, ValueError):
+        return True
+    return jwt_payload.get('rv', 0) < role_versions.current(user_id)
+
+
+def admin_required(fn):
+    """Require a valid access token whose role claim is admin"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+        return fn(*args, **kwargs)
+
+    return wrapper
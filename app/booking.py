@@ -0,0 +1,151 @@
+from sqlalchemy import select, update, delete, or_
+from app import db
+from app.models import Event, UserAgenda
+from app.upsert import insert_all_if_absent
+from app import live
+
+
+# Read back by every seat change to see whether an event filled up or reopened
+SEAT_COLUMNS = (Event.id, Event.open_day_id, Event.capacity, Event.seats_taken)
+
+# Seat counter UPDATEs pass cache_tables=(): no cached response, interval index
+# or plan shows seats_taken, so a booking must not count as an events write
+
+
+def _publish_capacity(rows, change):
+    # Live streams hear when an event fills up or reopens, not every booking
+    for row in rows:
+        if not row.capacity:
+            continue
+        before = row.seats_taken - change
+        if (before < row.capacity) != (row.seats_taken < row.capacity):
+            live.publish(row.open_day_id, 'capacity', {
+                'event_id': row.id, 'capacity': row.capacity, 'seats_taken': row.seats_taken,
+                'full': row.seats_taken >= row.capacity,
+            })
+
+
+def reserve_seat(event_id):
+    """
+    Take one seat on an event in a single conditional UPDATE.
+
+    The row lock taken by the UPDATE is the only serialization point: two
+    concurrent reservations for the last seat cannot both match
+    `seats_taken < capacity`, so an event is never overbooked. Returns False
+    when the event is full or does not exist. Events without a capacity
+    still count seats so the counter stays accurate if one is set later.
+    """
+    row = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .where(or_(Event.capacity.is_(None), Event.seats_taken < Event.capacity))
+        .values(seats_taken=Event.seats_taken + 1)
+        .returning(*SEAT_COLUMNS)
+        .execution_options(synchronize_session=False, cache_tables=())
+    ).first()
+    if row is None:
+        return False
+    _publish_capacity([row], 1)
+    return True
+
+
+def release_seat(event_id, count=1):
+    """Give back seats freed by agenda removals"""
+    rows = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .values(seats_taken=Event.seats_taken - count)
+        .returning(*SEAT_COLUMNS)
+        .execution_options(synchronize_session=False, cache_tables=())
+    ).all()
+    _publish_capacity(rows, -count)
+
+
+def reserve_seats(event_ids):
+    """reserve_seat for many events in one UPDATE; returns the ids that got a seat"""
+    if not event_ids:
+        return set()
+    rows = db.session.execute(
+        update(Event)
+        .where(Event.id.in_(event_ids))
+        .where(or_(Event.capacity.is_(None), Event.seats_taken < Event.capacity))
+        .values(seats_taken=Event.seats_taken + 1)
+        .returning(*SEAT_COLUMNS)
+        .execution_options(synchronize_session=False, cache_tables=())
+    ).all()
+    _publish_capacity(rows, 1)
+    return {row.id for row in rows}
+
+
+def release_seats(event_ids):
+    """Give back one seat on each of the events"""
+    if not event_ids:
+        return
+    rows = db.session.execute(
+        update(Event)
+        .where(Event.id.in_(event_ids))
+        .values(seats_taken=Event.seats_taken - 1)
+        .returning(*SEAT_COLUMNS)
+        .execution_options(synchronize_session=False, cache_tables=())
+    ).all()
+    _publish_capacity(rows, -1)
+
+
+def update_agenda(user_id, add=(), remove=()):
+    """
+    Apply a batch of agenda additions and removals in the current transaction.
+
+    Each step is one set-based statement over the whole batch, however many
+    ids it holds. Removals go first so a batch can swap one session for
+    another. Seats are reserved with the same conditional UPDATE as
+    reserve_seat, so a batch never overbooks an event. Returns a list of
+    {'event_id', 'action', 'outcome'} in request order; the caller commits.
+    """
+    results = []
+
+    if remove:
+        removed = set(db.session.scalars(
+            delete(UserAgenda)
+            .where(UserAgenda.user_id == user_id, UserAgenda.event_id.in_(remove))
+            .returning(UserAgenda.event_id)
+            .execution_options(synchronize_session=False)
+        ))
+        release_seats(removed)
+        results += [
+            {'event_id': event_id, 'action': 'remove',
+             'outcome': 'removed' if event_id in removed else 'not_in_agenda'}
+            for event_id in remove
+        ]
+
+    if add:
+        already = set(db.session.scalars(
+            select(UserAgenda.event_id)
+            .where(UserAgenda.user_id == user_id, UserAgenda.event_id.in_(add))
+        ))
+        wanted = [event_id for event_id in add if event_id not in already]
+        reserved = reserve_seats(wanted)
+        added = set(insert_all_if_absent(
+            UserAgenda,
+            [{'user_id': user_id, 'event_id': event_id} for event_id in sorted(reserved)],
+            ['user_id', 'event_id'],
+            UserAgenda.event_id
+        ))
+        # A concurrent request added some of these first; give their seats back
+        release_seats(reserved - added)
+
+        # Only ids that got no seat need telling apart: full or nonexistent
+        unreserved = [event_id for event_id in wanted if event_id not in reserved]
+        existing = set(db.session.scalars(select(Event.id).where(Event.id.in_(unreserved)))) if unreserved else set()
+
+        for event_id in add:
+            if event_id in added:
+                outcome = 'added'
+            elif event_id in already or event_id in reserved:
+                outcome = 'already_in_agenda'
+            elif event_id in existing:
+                outcome = 'full'
+            else:
+                outcome = 'not_found'
+            results.append({'event_id': event_id, 'action': 'add', 'outcome': outcome})
+
+    return results
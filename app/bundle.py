@@ -0,0 +1,57 @@
+"""
+Everything an open-day page needs, in one response.
+
+The public part (the open day, its events and the subject areas) is the
+same for every visitor and is cached on its own. The per-user overlay
+(registrations and this open day's agenda) is added only for signed-in
+requests and is never cached. Each part is built from a fixed number of
+queries, however many events the open day has.
+"""
+from app import db
+from app.models import OpenDay, Event, SubjectArea, Registration, UserAgenda
+from app.loading import with_profile
+
+# Tables the public part is built from; a write to any of them invalidates it
+PUBLIC_TABLES = ('open_days', 'events', 'buildings', 'subject_areas')
+
+
+def public_bundle(open_day_id):
+    """The shared part of the bundle in three queries, or None if there is no such open day"""
+    open_day = db.session.get(OpenDay, open_day_id)
+    if open_day is None:
+        return None
+
+    events = (
+        with_profile(Event.query, 'events')
+        .filter(Event.open_day_id == open_day_id)
+        .order_by(Event.start_time, Event.id)
+        .all()
+    )
+    subject_areas = SubjectArea.query.all()
+
+    return {
+        'open_day': open_day.to_dict(),
+        'events': [event.to_dict() for event in events],
+        'subject_areas': [subject_area.to_dict() for subject_area in subject_areas],
+    }
+
+
+def user_overlay(user_id, open_day_id):
+    """The signed-in visitor's registrations and agenda for the open day, in two queries"""
+    registrations = (
+        with_profile(Registration.query, 'registrations')
+        .filter(Registration.user_id == user_id)
+        .order_by(Registration.id)
+        .all()
+    )
+    agenda = (
+        with_profile(UserAgenda.query.join(Event), 'agenda')
+        .filter(UserAgenda.user_id == user_id, Event.open_day_id == open_day_id)
+        .order_by(Event.start_time, UserAgenda.id)
+        .all()
+    )
+
+    return {
+        'registrations': [registration.to_dict() for registration in registrations],
+        'agenda': [item.to_dict() for item in agenda],
+    }
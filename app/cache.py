@@ -0,0 +1,233 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, make_response, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CacheEntry:
+    def __init__(self, body, etag, mimetype, tables):
+        self.body = body
+        self.etag = etag
+        self.mimetype = mimetype
+        self.tables = tables
+        self.created_at = time.monotonic()
+
+
+class ResponseCache:
+    """
+    In-process cache for public GET responses.
+
+    Entries hold the serialized body and a strong ETag, and are tagged with
+    the tables the response was built from. Committing a session that
+    inserted, updated or deleted rows in one of those tables, through the
+    ORM or a Core statement, drops every entry tagged with it, so a cached
+    body is never older than the last write made in this process.
+
+    Other worker processes have caches of their own that this commit does
+    not reach, so no entry is served for longer than RESPONSE_CACHE_TTL
+    seconds either; that bounds how stale they can be.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+        self.max_entries = 512
+        self.max_age = 0
+        self.ttl = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 512)
+        app.config.setdefault('RESPONSE_CACHE_MAX_AGE', 0)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 30)
+        self.max_entries = app.config['RESPONSE_CACHE_MAX_ENTRIES']
+        self.max_age = app.config['RESPONSE_CACHE_MAX_AGE']
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        app.extensions['response_cache'] = self
+
+        if not event.contains(Session, 'after_flush', _track_written_tables):
+            event.listen(Session, 'after_flush', _track_written_tables)
+            event.listen(Session, 'do_orm_execute', _track_statement_tables)
+            event.listen(Session, 'after_commit', _invalidate_written_tables)
+            event.listen(Session, 'after_rollback', _forget_written_tables)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl and time.monotonic() - entry.created_at > self.ttl:
+                # May predate a write committed by another worker
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def generation(self, tables):
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    def recently_invalidated(self, tables, seconds):
+        """Whether any of the tables was written in the last `seconds`"""
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            return any(self._invalidated_at.get(table, float('-inf')) > cutoff for table in tables)
+
+    def set(self, key, entry, generation):
+        with self._lock:
+            # A write committed while the response was being built; storing
+            # it now would outlive the invalidation that already happened.
+            if generation != tuple(self._generations.get(table, 0) for table in sorted(entry.tables)):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tables):
+        """Drop every entry built from any of the given tables"""
+        tables = set(tables)
+        with self._lock:
+            now = time.monotonic()
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                self._invalidated_at[table] = now
+            stale = [key for key, entry in self._entries.items() if entry.tables & tables]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cache_control(self):
+        if self.max_age:
+            return f'public, max-age={self.max_age}'
+        # Always revalidate; an unchanged resource costs a bodyless 304
+        return 'public, no-cache'
+
+
+def make_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def cached(*tables):
+    """
+    Serve a public GET route from the response cache.
+
+    `tables` names every table the response is built from; a commit that
+    writes to any of them invalidates the cached response.
+    """
+    tables = frozenset(tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions.get('response_cache')
+            if cache is None or not current_app.config['RESPONSE_CACHE_ENABLED']:
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            entry = cache.get(key)
+
+            if entry is None:
+                generation = cache.generation(tables)
+                _read_fresh_rows(cache, tables)
+                response = make_response(view(*args, **kwargs))
+                # Only successful responses are worth keeping
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = CacheEntry(body, make_etag(body), response.mimetype, tables)
+                cache.set(key, entry, generation)
+
+            if request.if_none_match.contains_weak(entry.etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.response_class(entry.body, status=200, mimetype=entry.mimetype)
+
+            response.set_etag(entry.etag)
+            response.headers['Cache-Control'] = cache.cache_control()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def cached_fragment(key, tables, build):
+    """
+    Build the public part of a response once and share it between requests.
+
+    `build` returns JSON-serializable data, or None when the resource does
+    not exist, which is not cached. Returns (data, etag), or (None, None).
+    The data is shared, so callers must copy it rather than modify it.
+    """
+    cache = current_app.extensions.get('response_cache')
+    enabled = cache is not None and current_app.config['RESPONSE_CACHE_ENABLED']
+    entry = cache.get(key) if enabled else None
+
+    if entry is None:
+        generation = cache.generation(tables) if enabled else None
+        if enabled:
+            _read_fresh_rows(cache, tables)
+        data = build()
+        if data is None:
+            return None, None
+        entry = CacheEntry(data, make_etag(current_app.json.dumps(data).encode()), None, frozenset(tables))
+        if enabled:
+            cache.set(key, entry, generation)
+
+    return entry.body, entry.etag
+
+
+def _read_fresh_rows(cache, tables):
+    # A replica may not have caught up with a fresh write yet; don't cache
+    # what it returns in that window
+    if g.get('db_route') == 'replica' and cache.recently_invalidated(
+            tables, current_app.config['REPLICA_PIN_SECONDS']):
+        g.db_route = 'primary'
+
+
+# ==================== SESSION HOOKS ====================
+
+def _track_written_tables(session, flush_context):
+    written = session.info.setdefault('written_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            written.add(table)
+
+
+def _track_statement_tables(orm_execute_state):
+    # Core INSERT/UPDATE/DELETE statements (and query.delete()) bypass the
+    # flush, so their target table is recorded here. A statement can name the
+    # tables it invalidates with execution_options(cache_tables=...); () for none.
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        tables = orm_execute_state.execution_options.get('cache_tables')
+        if tables is None:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            tables = [table.name] if getattr(table, 'name', None) else []
+        if tables:
+            orm_execute_state.session.info.setdefault('written_tables', set()).update(tables)
+
+
+def _invalidate_written_tables(session):
+    written = session.info.pop('written_tables', None)
+    if not written or not has_app_context():
+        return
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        cache.invalidate(*written)
+
+
+def _forget_written_tables(session):
+    session.info.pop('written_tables', None)
@@ -0,0 +1,105 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.models import User
+
+
+def register_commands(app):
+    app.cli.add_command(set_admin)
+    app.cli.add_command(import_schedule)
+    app.cli.add_command(build_assets)
+    app.cli.add_command(worker)
+    app.cli.add_command(smtp_sink)
+
+
+@click.command('set-admin')
+@click.argument('email')
+@click.option('--revoke', is_flag=True, help='Remove admin rights instead of granting them.')
+@with_appcontext
+def set_admin(email, revoke):
+    """Grant or revoke admin rights; the user's existing tokens stop working."""
+    from app.auth import change_role
+
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f'No user with email {email}')
+
+    change_role(user, not revoke)
+    click.echo(f"{email} is {'no longer' if revoke else 'now'} an admin (role version {user.role_version})")
+
+
+@click.command('import-schedule')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@with_appcontext
+def import_schedule(path, fmt):
+    """Import open days and events from a CSV or JSON-lines file."""
+    from app.importer import import_schedule as run_import, detect_format, ImportFormatError
+
+    fmt = fmt or detect_format(path)
+    if not fmt:
+        raise click.ClickException('Cannot tell the format from the file name; pass --format')
+
+    with open(path, encoding='utf-8', newline='') as stream:
+        try:
+            result = run_import(stream, fmt)
+        except ImportFormatError as e:
+            raise click.ClickException(str(e))
+
+    if not result.ok:
+        for error in result.errors:
+            click.echo(f"line {error['line']}: {'; '.join(error['errors'])}", err=True)
+        raise click.ClickException(f'{len(result.errors)} invalid records; nothing was imported')
+
+    click.echo(f'Imported {result.open_days} open days and {result.events} events')
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets():
+    """Build the fingerprinted, precompressed frontend into app/static/dist."""
+    from app.assets import build, dist_dir
+
+    report = build(current_app)
+    for name, sizes in sorted(report.items()):
+        variants = ', '.join(f'{encoding} {size}' for encoding, size in sizes.items() if encoding != 'identity')
+        click.echo(f"{name:40} {sizes['identity']:>8}" + (f'  ({variants})' if variants else ''))
+    click.echo(f'Wrote {len(report)} files to {dist_dir(current_app)}')
+
+
+@click.command('worker')
+@click.option('--processes', type=int, help='Worker processes; defaults to JOB_WORKER_PROCESSES.')
+@click.option('--threads', type=int, help='Threads per process; defaults to JOB_WORKER_THREADS.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due instead of waiting for more.')
+@with_appcontext
+def worker(processes, threads, burst):
+    """Run background jobs until stopped with SIGTERM or Ctrl-C."""
+    from app.jobs import run_workers
+
+    processes = processes or current_app.config['JOB_WORKER_PROCESSES']
+    threads = threads or current_app.config['JOB_WORKER_THREADS']
+    click.echo(f'Running jobs with {processes} process(es) of {threads} thread(s)')
+    run_workers(current_app._get_current_object(), processes, threads, burst)
+
+
+@click.command('smtp-sink')
+@click.option('--host', default='localhost', show_default=True)
+@click.option('--port', type=int, default=1025, show_default=True)
+@click.option('--maildir', type=click.Path(file_okay=False), help='Also save each message here as an .eml file.')
+def smtp_sink(host, port, maildir):
+    """Accept and print email locally instead of sending it."""
+    from email import message_from_bytes
+    from app.mail import SMTPSink
+
+    def show(sender, recipients, data):
+        message = message_from_bytes(data)
+        click.echo(f"{sender} -> {', '.join(recipients)}: {message['Subject']}")
+
+    sink = SMTPSink(host, port, maildir, on_message=show)
+    click.echo(f'SMTP sink listening on {host}:{port}')
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.server_close()
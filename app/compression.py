@@ -0,0 +1,92 @@
+"""
+Content-Encoding negotiation and on-the-fly compression of JSON responses.
+
+JSON responses of at least COMPRESS_MIN_SIZE bytes are compressed with
+brotli or gzip, whichever the client prefers. Streamed list responses
+(app/encoding.py) are compressed chunk by chunk as they are sent. brotli is
+optional; without it only gzip is offered. Static assets are compressed
+ahead of time instead (app/assets.py).
+"""
+import gzip
+import zlib
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+def accepted_encodings():
+    """Encodings this server can produce that the client accepts, best first"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    quality = {encoding: request.accept_encodings[encoding] for encoding in offered}
+    return sorted((encoding for encoding in offered if quality[encoding] > 0),
+                  key=lambda encoding: -quality[encoding])
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_stream(chunks, encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request hook: compress a JSON response when worth it"""
+    config = current_app.config
+    if (not config['COMPRESS_ENABLED']
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.mimetype not in config['COMPRESS_MIMETYPES']
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encodings = accepted_encodings()
+    if not encodings:
+        return response
+    encoding = encodings[0]
+    level = config['COMPRESS_BROTLI_QUALITY'] if encoding == 'br' else config['COMPRESS_GZIP_LEVEL']
+
+    if response.is_streamed:
+        # Unpaginated listings; their size is unknown up front but they are the big ones
+        response.response = _compress_stream(response.response, encoding, level)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    # The encoded body is a different representation; its validator is only weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_MIMETYPES', ('application/json',))
+    app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+    app.after_request(compress_response)
@@ -0,0 +1,134 @@
+"""
+Read/write splitting between the primary database and an optional replica.
+
+With SQLALCHEMY_REPLICA_URI set, GET and HEAD requests read from the
+replica. A request is kept on the primary when:
+
+- its view is marked with @use_primary;
+- the client wrote recently, so an agenda fetch right after
+  add_to_agenda does not read a replica that has not caught up yet.
+  Successful writes set a short-lived cookie for browsers on this
+  origin, and pin the JWT's user for cross-origin clients that send a
+  Bearer token and no cookies. User pins are held by the worker process
+  that handled the write;
+- the session writes anything. From then on, the request's reads use the
+  primary as well.
+
+Each database has its own pool, sized by SQLALCHEMY_POOL_SIZE and
+SQLALCHEMY_REPLICA_POOL_SIZE.
+"""
+import threading
+import time
+from flask import g, request, has_request_context, current_app
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+# JWT subject: time.time() until which that user reads from the primary
+_user_pins = {}
+_pins_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends eligible reads to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not has_request_context() or g.get('db_route') != REPLICA:
+            return False
+        if self._flushing or self.new or self.dirty or self.deleted or isinstance(clause, UpdateBase):
+            # This request writes; keep the rest of it on the primary
+            g.db_route = 'primary'
+            return False
+        return True
+
+
+def use_primary(view):
+    """Always serve this view from the primary, even for GET"""
+    view.use_primary = True
+    return view
+
+
+def configure_binds(app):
+    """Add the replica bind and per-pool sizes; call before db.init_app"""
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if app.config.get('SQLALCHEMY_POOL_SIZE'):
+        options.setdefault('pool_size', app.config['SQLALCHEMY_POOL_SIZE'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_url = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if not replica_url:
+        return
+
+    replica = {'url': replica_url}
+    if app.config.get('SQLALCHEMY_REPLICA_POOL_SIZE'):
+        replica['pool_size'] = app.config['SQLALCHEMY_REPLICA_POOL_SIZE']
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA] = replica
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def _request_user():
+    # The JWT subject, if the request carries a valid token
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def pin_user(user, seconds):
+    """Send the user's reads to the primary for the next `seconds`"""
+    now = time.time()
+    with _pins_lock:
+        if len(_user_pins) > 10000:
+            for key in [key for key, until in _user_pins.items() if until <= now]:
+                del _user_pins[key]
+        _user_pins[str(user)] = now + seconds
+
+
+def _pinned_to_primary():
+    try:
+        if float(request.cookies.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    user = _request_user()
+    return user is not None and _user_pins.get(str(user), 0) > time.time()
+
+
+def init_app(app):
+    app.config.setdefault('REPLICA_PIN_SECONDS', 5)
+    if not app.config.get('SQLALCHEMY_REPLICA_URI'):
+        return
+
+    @app.before_request
+    def choose_database():
+        view = current_app.view_functions.get(request.endpoint)
+        if (request.method in READ_METHODS
+                and not getattr(view, 'use_primary', False)
+                and not _pinned_to_primary()):
+            g.db_route = REPLICA
+        else:
+            g.db_route = 'primary'
+
+    @app.after_request
+    def pin_after_write(response):
+        if request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400:
+            seconds = app.config['REPLICA_PIN_SECONDS']
+            user = _request_user()
+            if user is not None:
+                pin_user(user, seconds)
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + seconds:.3f}',
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
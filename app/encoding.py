@@ -0,0 +1,119 @@
+"""
+JSON encoding for API responses.
+
+The encoding backend is pluggable (JSON_BACKEND). 'auto' uses orjson when it
+is installed and falls back to the stdlib json module otherwise. 'orjson'
+and 'stdlib' force one or the other. The app's JSON provider encodes with
+the chosen backend, so jsonify() benefits everywhere.
+
+list_response() builds the body of a list route. Unpaginated listings are
+streamed: rows come from the database in batches and are encoded and sent
+one chunk at a time. Peak memory is then one batch of ORM objects and one
+chunk of JSON, rather than every row plus the whole encoded body. The body
+is produced after the request's after_request hooks have run, so the
+Server-Timing header of a streamed response does not include its query,
+serialization or encoding time.
+"""
+import json
+from flask import current_app, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+BACKENDS = ('auto', 'orjson', 'stdlib')
+
+
+def resolve_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"JSON_BACKEND must be one of: {', '.join(BACKENDS)}")
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+    if name == 'auto':
+        return 'orjson' if orjson is not None else 'stdlib'
+    return name
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default provider, encoding with orjson when that backend is selected"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.backend = resolve_backend(app.config.get('JSON_BACKEND', 'auto'))
+
+    def dumps(self, obj, **kwargs):
+        return self.dumpb(obj, **kwargs).decode('utf-8')
+
+    def dumpb(self, obj, **kwargs):
+        """Encode to UTF-8 bytes, skipping the str round trip orjson would otherwise need"""
+        # jsonify passes separators (orjson is always compact) or indent=2
+        if (self.backend != 'orjson' or set(kwargs) - {'separators', 'indent'}
+                or kwargs.get('indent') not in (None, 2)):
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+        # Dates and dataclasses go through Flask's default() so the output
+        # matches the stdlib encoder's
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder handles
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+
+def dumpb(obj):
+    """Compact JSON bytes using the app's provider"""
+    provider = current_app.json
+    if isinstance(provider, FastJSONProvider):
+        return provider.dumpb(obj, separators=(',', ':'))
+    return json.dumps(obj, separators=(',', ':'), default=provider.default).encode('utf-8')
+
+
+def list_response(page, key, serialize, extra=None):
+    """
+    Response for a list route: {key: [serialize(item), ...], ...}.
+
+    A paginated page is small and goes through jsonify. An unpaginated page
+    is streamed when JSON_STREAM_LISTS is on; its items are then a lazy
+    iterator (see pagination.unpaginated). `extra` is an optional callable
+    returning further top-level members, called once every item has been
+    serialized, so it can report things gathered along the way.
+    """
+    if page.paginated or not current_app.config['JSON_STREAM_LISTS']:
+        body = page.payload(key, [serialize(item) for item in page.items])
+        if extra is not None:
+            body.update(extra())
+        return jsonify(body)
+
+    chunk_size = current_app.config['JSON_STREAM_BATCH_SIZE']
+
+    def generate():
+        yield b'{' + dumpb(key) + b':['
+        chunk, separator = [], b''
+        for item in page.items:
+            chunk.append(serialize(item))
+            if len(chunk) >= chunk_size:
+                # Encode the batch as one array and drop its brackets
+                yield separator + dumpb(chunk)[1:-1]
+                chunk, separator = [], b','
+        if chunk:
+            yield separator + dumpb(chunk)[1:-1]
+        yield b']'
+        for name, value in (extra() if extra is not None else {}).items():
+            yield b',' + dumpb(name) + b':' + dumpb(value)
+        yield b'}'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+
+def init_app(app):
+    app.config.setdefault('JSON_BACKEND', 'auto')
+    app.config.setdefault('JSON_STREAM_LISTS', True)
+    app.config.setdefault('JSON_STREAM_BATCH_SIZE', 1000)
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,119 @@
+"""
+Sparse fieldsets for list routes.
+
+`?fields=id,title,start_time` limits each item to the named fields. The
+selection is pushed down into the query: only the columns behind those
+fields are SELECTed (load_only), and a relationship such as `building` is
+joined only when it is one of them. Unrequested attributes are set to
+raise rather than lazy-load, so a serializer bug shows up as an error
+instead of a query per row.
+
+Relationship fields are embedded whole; the selection applies to the top
+level only. Without `fields` a route keeps its usual loading profile and
+to_dict() output.
+"""
+from datetime import date, time, datetime
+from flask import request
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, joinedload, raiseload
+from app.instrumentation import timed_serializer
+from app.models import Event, Course, OpenDay, FAQ
+
+# The fields each resource accepts, in the order to_dict() emits them
+FIELDSETS = {
+    'events': (Event, (
+        'id', 'open_day_id', 'title', 'description', 'event_type', 'start_time', 'end_time',
+        'room', 'capacity', 'presenter', 'created_at', 'building', 'subject_area',
+    )),
+    'courses': (Course, (
+        'id', 'name', 'description', 'subject_area', 'faculty', 'duration', 'ucas_code', 'level',
+    )),
+    'open_days': (OpenDay, (
+        'id', 'title', 'description', 'event_date', 'start_time', 'end_time', 'location',
+        'is_virtual', 'registration_deadline', 'created_at',
+    )),
+    'faqs': (FAQ, ('id', 'question', 'answer', 'category')),
+}
+
+
+class FieldsError(ValueError):
+    """Raised for an empty or unknown ?fields=; reported as a 400"""
+
+
+def requested_fields(resource):
+    """The fields this request selected, in to_dict() order, or None for all of them"""
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+
+    allowed = FIELDSETS[resource][1]
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    if not names:
+        raise FieldsError('fields must name at least one field')
+    unknown = names.difference(allowed)
+    if unknown:
+        raise FieldsError(f"Unknown fields: {', '.join(sorted(unknown))}; "
+                          f"choose from: {', '.join(allowed)}")
+    return tuple(name for name in allowed if name in names)
+
+
+def _relationships(model):
+    return inspect(model).relationships
+
+
+def select_fields(query, resource, fields, *keys):
+    """
+    Load only what `fields` needs.
+
+    `keys` are further columns the route reads from each row, such as the
+    sort keys pagination builds its cursor from.
+    """
+    model = FIELDSETS[resource][0]
+    relationships = _relationships(model)
+
+    columns, joins = list(keys), []
+    for name in fields:
+        if name in relationships:
+            relationship = relationships[name]
+            columns.extend(getattr(model, column.key) for column in relationship.local_columns)
+            joins.append(joinedload(getattr(model, name)))
+        else:
+            columns.append(getattr(model, name))
+
+    return query.options(load_only(*columns, raiseload=True), *joins, raiseload('*'))
+
+
+def _format(value):
+    # Matches the formatting of the models' to_dict()
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def serializer(resource, fields, normalized=False):
+    """
+    A to_dict() replacement emitting only `fields`.
+
+    With `normalized`, relationship fields are emitted as their foreign key
+    (`building` becomes `building_id`), as in the normalized shape.
+    """
+    relationships = _relationships(FIELDSETS[resource][0])
+    foreign_keys = {name: next(iter(relationship.local_columns)).key
+                    for name, relationship in relationships.items()}
+
+    @timed_serializer
+    def to_dict(obj):
+        data = {}
+        for name in fields:
+            if name not in relationships:
+                data[name] = _format(getattr(obj, name))
+            elif normalized:
+                data[foreign_keys[name]] = getattr(obj, foreign_keys[name])
+            else:
+                related = getattr(obj, name)
+                data[name] = related.to_dict() if related is not None else None
+        return data
+
+    return to_dict
@@ -0,0 +1,189 @@
+"""
+In-memory spatial index of campus buildings.
+
+Buildings with coordinates are bucketed into a grid of GEO_GRID_METERS
+square cells. A nearby query only looks at the cells its radius overlaps,
+wrapping at the antimeridian, so its cost depends on the radius (capped
+at GEO_MAX_RADIUS) and not on how many buildings there are. Near the
+poles, where that is a whole row of cells, it looks at the occupied cells
+instead whenever there are fewer of those. The Haversine distance between every pair
+of buildings is computed once per build, together with a walking estimate:
+the straight line times WALKING_DETOUR, at WALKING_SPEED metres a minute.
+
+The index is rebuilt on first use after a commit writes to `buildings` in
+this process (the response cache's table generations), and at least every
+GEO_INDEX_REFRESH seconds so writes made by other workers are picked up.
+"""
+import heapq
+import math
+import threading
+import time
+from flask import current_app
+from app import db, response_cache
+from app.models import Building
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+class GeoError(ValueError):
+    """Raised for missing or out-of-range coordinates; reported as a 400"""
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _longitudes(lng, span):
+    """The (west, east) longitude ranges within span degrees of lng, split at the antimeridian"""
+    west, east = lng - span, lng + span
+    if east - west >= 360:
+        return [(-180, 180)]
+    if west < -180:
+        return [(-180, east), (west + 360, 180)]
+    if east > 180:
+        return [(west, 180), (-180, east - 360)]
+    return [(west, east)]
+
+
+class _Snapshot:
+    """One immutable build of the index; swapped in whole on rebuild"""
+
+    def __init__(self, buildings, cell_meters, detour, speed):
+        self.buildings = {building['id']: building for building in buildings}
+        self.cell_meters = cell_meters
+        self.detour = detour
+        self.speed = speed
+
+        self.cells = {}
+        for building in buildings:
+            self.cells.setdefault(self.cell(building['latitude'], building['longitude']), []).append(building)
+
+        # Distances in metres between every pair of buildings
+        self.distances = {
+            a['id']: {b['id']: haversine(a['latitude'], a['longitude'], b['latitude'], b['longitude'])
+                      for b in buildings}
+            for a in buildings
+        }
+        self.max_distance = max((d for row in self.distances.values() for d in row.values()), default=0)
+
+    def cell(self, lat, lng):
+        # Cells are cell_meters tall; longitude degrees are scaled at the
+        # equator, so cells are narrower towards the poles but never miss
+        size = self.cell_meters / METERS_PER_DEGREE
+        return math.floor(lat / size), math.floor(lng / size)
+
+    def nearby(self, lat, lng, radius, limit):
+        size = self.cell_meters / METERS_PER_DEGREE
+        lat_span = radius / METERS_PER_DEGREE
+        # Near the poles the radius can reach every longitude; never walk more than one row of cells
+        lng_span = min(radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)), 180)
+        rows = math.floor(max(lat - lat_span, -90) / size), math.floor(min(lat + lat_span, 90) / size)
+        columns = [(math.floor(west / size), math.floor(east / size)) for west, east in _longitudes(lng, lng_span)]
+
+        if (rows[1] - rows[0] + 1) * sum(high - low + 1 for low, high in columns) > len(self.cells):
+            # Fewer occupied cells than cells to look at; filter those instead
+            cells = [buildings for (row, column), buildings in self.cells.items()
+                     if rows[0] <= row <= rows[1] and any(low <= column <= high for low, high in columns)]
+        else:
+            cells = [self.cells.get((row, column), ())
+                     for row in range(rows[0], rows[1] + 1)
+                     for low, high in columns
+                     for column in range(low, high + 1)]
+
+        candidates = []
+        for buildings in cells:
+            for building in buildings:
+                distance = haversine(lat, lng, building['latitude'], building['longitude'])
+                if distance <= radius:
+                    candidates.append((distance, building['id'], building))
+        return heapq.nsmallest(limit, candidates, key=lambda hit: (hit[0], hit[1]))
+
+    def walking_minutes(self, meters):
+        return meters * self.detour / self.speed
+
+
+class BuildingIndex:
+    def __init__(self):
+        self._snapshot = None
+        self._generation = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('GEO_GRID_METERS', 250)
+        app.config.setdefault('GEO_MAX_RADIUS', 5000)
+        app.config.setdefault('GEO_INDEX_REFRESH', 60)
+        app.config.setdefault('WALKING_SPEED', 80)
+        app.config.setdefault('WALKING_DETOUR', 1.3)
+
+    def _stale(self, generation):
+        return (self._snapshot is None or generation != self._generation
+                or time.monotonic() - self._built_at > current_app.config['GEO_INDEX_REFRESH'])
+
+    def snapshot(self):
+        generation = response_cache.generation({'buildings'})
+        if self._stale(generation):
+            with self._lock:
+                # Another thread may have rebuilt it while this one waited
+                if self._stale(generation):
+                    self.rebuild(generation)
+        return self._snapshot
+
+    def rebuild(self, generation=None):
+        rows = db.session.query(Building).filter(
+            Building.latitude.isnot(None), Building.longitude.isnot(None)
+        ).order_by(Building.id).all()
+        config = current_app.config
+        self._snapshot = _Snapshot([building.to_dict() for building in rows], config['GEO_GRID_METERS'],
+                                   config['WALKING_DETOUR'], config['WALKING_SPEED'])
+        self._generation = generation if generation is not None else response_cache.generation({'buildings'})
+        self._built_at = time.monotonic()
+
+    def nearby(self, lat, lng, radius, limit):
+        """Buildings within radius metres of a point, nearest first, with their distance and walk"""
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise GeoError('lat must be within -90..90 and lng within -180..180')
+        max_radius = current_app.config['GEO_MAX_RADIUS']
+        if not 0 < radius <= max_radius:
+            raise GeoError(f'radius must be between 0 and {max_radius} metres')
+
+        snapshot = self.snapshot()
+        return [
+            {**building, 'distance_m': round(distance),
+             'walking_minutes': round(snapshot.walking_minutes(distance), 1)}
+            for distance, _, building in snapshot.nearby(lat, lng, radius, limit)
+        ]
+
+    def distance(self, from_building_id, to_building_id):
+        """Metres between two buildings, or None if either has no coordinates"""
+        return self.snapshot().distances.get(from_building_id, {}).get(to_building_id)
+
+    def walking_minutes(self, from_building_id, to_building_id):
+        """Estimated walk between two buildings in minutes, or None if unknown"""
+        snapshot = self.snapshot()
+        meters = snapshot.distances.get(from_building_id, {}).get(to_building_id)
+        return None if meters is None else snapshot.walking_minutes(meters)
+
+    def max_walking_minutes(self):
+        """The longest walk between any two buildings, in minutes"""
+        snapshot = self.snapshot()
+        return snapshot.walking_minutes(snapshot.max_distance)
+
+    def walking_matrix(self, building_ids=None):
+        """{from id: {to id: {'meters', 'minutes'}}} for the given buildings, or all of them"""
+        snapshot = self.snapshot()
+        ids = [building_id for building_id in (building_ids or snapshot.distances) if building_id in snapshot.distances]
+        return {
+            a: {b: {'meters': round(snapshot.distances[a][b]),
+                    'minutes': round(snapshot.walking_minutes(snapshot.distances[a][b]), 1)}
+                for b in ids}
+            for a in ids
+        }
+
+
+building_index = BuildingIndex()
@@ -0,0 +1,288 @@
+"""
+Bulk import of open days and their events from CSV or JSON lines.
+
+Every record has a `record` field of `open_day` or `event`. Open days may
+carry a `ref` that events in the same file point at with `open_day_ref`;
+events can instead name an existing `open_day_id`.
+
+    record,ref,title,event_date,start_time,end_time,open_day_ref,event_type,...
+    open_day,ug-june,Undergraduate Open Day,2026-06-20,09:00,16:00,,,...
+    event,,Welcome Talk,,09:30,10:00,ug-june,Talk,...
+
+The input is parsed one record at a time and every record is validated
+before anything is written. If any record is invalid, nothing is written.
+Valid files are inserted in one transaction: open days with a multi-row
+INSERT ... RETURNING, events with COPY on Postgres or multi-row INSERTs of
+BATCH_SIZE rows elsewhere.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert
+from app import db, response_cache, live
+from app.models import OpenDay, Event, Building, SubjectArea
+
+BATCH_SIZE = 1000
+
+EVENT_COLUMNS = (
+    'open_day_id', 'title', 'description', 'event_type', 'start_time', 'end_time',
+    'building_id', 'room', 'capacity', 'subject_area_id', 'presenter', 'seats_taken', 'created_at'
+)
+
+
+class ImportFormatError(Exception):
+    """The input could not be read at all (bad format, unparseable line)"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.open_days = 0
+        self.events = 0
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {
+            'imported': {'open_days': self.open_days, 'events': self.events},
+            'errors': self.errors
+        }
+
+
+# ==================== PARSING ====================
+
+def detect_format(name):
+    """Format from a filename or content type; None if unrecognised"""
+    name = (name or '').lower()
+    if name.endswith('.csv') or 'csv' in name:
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in name or 'jsonl' in name or 'json' in name:
+        return 'jsonl'
+    return None
+
+
+def iter_records(text_stream, fmt):
+    """Yield (line number, record dict) without reading the whole input"""
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            yield reader.line_num, {k: (v if v != '' else None) for k, v in record.items() if k}
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ImportFormatError(f'Line {line_num}: invalid JSON ({e})')
+            if not isinstance(record, dict):
+                raise ImportFormatError(f'Line {line_num}: expected a JSON object')
+            yield line_num, record
+    else:
+        raise ImportFormatError(f'Unsupported format: {fmt}')
+
+
+# ==================== VALIDATION ====================
+
+def _text(record, field, errors, required=False):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            errors.append(f'{field} is required')
+        return None
+    return str(value).strip()
+
+
+def _parsed(record, field, errors, parse, message, required=False):
+    value = _text(record, field, errors, required)
+    if value is None:
+        return None
+    try:
+        return parse(value)
+    except ValueError:
+        errors.append(f'{field} {message}')
+        return None
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def _int(value):
+    return int(value)
+
+
+def _bool(value):
+    if value.lower() in ('1', 'true', 'yes', 'y'):
+        return True
+    if value.lower() in ('0', 'false', 'no', 'n'):
+        return False
+    raise ValueError(value)
+
+
+def validate_open_day(record, errors):
+    row = {
+        'title': _text(record, 'title', errors, required=True),
+        'description': _text(record, 'description', errors),
+        'event_date': _parsed(record, 'event_date', errors, _date, 'must be YYYY-MM-DD', required=True),
+        'start_time': _parsed(record, 'start_time', errors, _time, 'must be HH:MM', required=True),
+        'end_time': _parsed(record, 'end_time', errors, _time, 'must be HH:MM', required=True),
+        'location': _text(record, 'location', errors),
+        'is_virtual': _parsed(record, 'is_virtual', errors, _bool, 'must be true or false') or False,
+        'registration_deadline': _parsed(record, 'registration_deadline', errors, _date, 'must be YYYY-MM-DD'),
+    }
+    if row['start_time'] and row['end_time'] and row['start_time'] >= row['end_time']:
+        errors.append('start_time must be before end_time')
+    return row
+
+
+def validate_event(record, errors):
+    row = {
+        'open_day_id': _parsed(record, 'open_day_id', errors, _int, 'must be an integer'),
+        'title': _text(record, 'title', errors, required=True),
+        'description': _text(record, 'description', errors),
+        'event_type': _text(record, 'event_type', errors, required=True),
+        'start_time': _parsed(record, 'start_time', errors, _time, 'must be HH:MM', required=True),
+        'end_time': _parsed(record, 'end_time', errors, _time, 'must be HH:MM', required=True),
+        'building_id': _parsed(record, 'building_id', errors, _int, 'must be an integer'),
+        'room': _text(record, 'room', errors),
+        'capacity': _parsed(record, 'capacity', errors, _int, 'must be an integer'),
+        'subject_area_id': _parsed(record, 'subject_area_id', errors, _int, 'must be an integer'),
+        'presenter': _text(record, 'presenter', errors),
+    }
+    if row['start_time'] and row['end_time'] and row['start_time'] >= row['end_time']:
+        errors.append('start_time must be before end_time')
+    if row['capacity'] is not None and row['capacity'] < 0:
+        errors.append('capacity must not be negative')
+    return row
+
+
+def _existing_ids(model, ids):
+    if not ids:
+        return set()
+    return {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+# ==================== IMPORT ====================
+
+def import_schedule(text_stream, fmt):
+    """Validate every record, then insert all of them or none"""
+    result = ImportResult()
+    open_days, open_day_refs, events = [], {}, []
+    errors_by_line = {}
+
+    for line_num, record in iter_records(text_stream, fmt):
+        errors = []
+        kind = record.get('record')
+
+        if kind == 'open_day':
+            row = validate_open_day(record, errors)
+            ref = _text(record, 'ref', errors)
+            if ref is not None:
+                if ref in open_day_refs:
+                    errors.append(f'duplicate ref {ref!r}')
+                open_day_refs[ref] = len(open_days)
+            open_days.append(row)
+        elif kind == 'event':
+            row = validate_event(record, errors)
+            ref = _text(record, 'open_day_ref', errors)
+            if ref is None and row['open_day_id'] is None:
+                errors.append('open_day_ref or open_day_id is required')
+            events.append((line_num, ref, row))
+        else:
+            errors.append("record must be 'open_day' or 'event'")
+
+        if errors:
+            errors_by_line[line_num] = errors
+
+    # Foreign keys are checked in one query per table, not per row
+    known_open_days = _existing_ids(OpenDay, {row['open_day_id'] for _, _, row in events if row['open_day_id']})
+    known_buildings = _existing_ids(Building, {row['building_id'] for _, _, row in events if row['building_id']})
+    known_subjects = _existing_ids(SubjectArea, {row['subject_area_id'] for _, _, row in events if row['subject_area_id']})
+
+    for line_num, ref, row in events:
+        errors = []
+        if ref is not None and ref not in open_day_refs:
+            errors.append(f'unknown open_day_ref {ref!r}')
+        if ref is None and row['open_day_id'] and row['open_day_id'] not in known_open_days:
+            errors.append(f"open day {row['open_day_id']} does not exist")
+        if row['building_id'] and row['building_id'] not in known_buildings:
+            errors.append(f"building {row['building_id']} does not exist")
+        if row['subject_area_id'] and row['subject_area_id'] not in known_subjects:
+            errors.append(f"subject area {row['subject_area_id']} does not exist")
+        if errors:
+            errors_by_line.setdefault(line_num, []).extend(errors)
+
+    if errors_by_line:
+        result.errors = [{'line': line, 'errors': errors_by_line[line]} for line in sorted(errors_by_line)]
+        return result
+
+    now = datetime.utcnow()
+    try:
+        open_day_ids = []
+        if open_days:
+            for row in open_days:
+                row['created_at'] = now
+            open_day_ids = list(db.session.scalars(
+                insert(OpenDay).returning(OpenDay.id, sort_by_parameter_order=True),
+                open_days
+            ))
+
+        event_rows = []
+        for _, ref, row in events:
+            if ref is not None:
+                row['open_day_id'] = open_day_ids[open_day_refs[ref]]
+            row['seats_taken'] = 0
+            row['created_at'] = now
+            event_rows.append(row)
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            _copy_events(event_rows)
+        else:
+            for start in range(0, len(event_rows), BATCH_SIZE):
+                # One INSERT ... VALUES (...), (...) per batch, not an executemany
+                db.session.execute(insert(Event).values(event_rows[start:start + BATCH_SIZE]))
+
+        # One live message per open day rather than one per imported event
+        added = Counter(row['open_day_id'] for row in event_rows)
+        for open_day_id, count in sorted(added.items()):
+            live.publish(open_day_id, 'schedule_changed', {'events_added': count})
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # COPY writes on the raw connection, which the response cache's session hooks never see
+    response_cache.invalidate('open_days', 'events')
+
+    result.open_days = len(open_days)
+    result.events = len(event_rows)
+    return result
+
+
+def _copy_events(rows):
+    """Stream event rows into Postgres with COPY inside the session's transaction"""
+    # Every value is quoted, so an unquoted empty field can only be NULL; an
+    # empty string ("") or a literal \N in the text stays what it was
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join('' if row[column] is None else '"' + str(row[column]).replace('"', '""') + '"'
+                              for column in EVENT_COLUMNS))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY events ({', '.join(EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
@@ -0,0 +1,170 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request, has_request_context
+from app.encoding import FastJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import db
+
+logger = logging.getLogger('app.timing')
+
+
+class QueryCounter:
+    """Collects the SQL statements, and their parameters, executed on an engine"""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Count the statements executed on the engine inside the block"""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
+
+
+# ==================== REQUEST TIMING ====================
+
+class RequestTiming:
+    """Where one request spent its time, in seconds"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.json_time = 0.0
+        self.serialize_depth = 0
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.sql_count} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'json;dur={self.json_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+def current_timing():
+    if has_request_context():
+        return g.get('timing')
+    return None
+
+
+def timed_serializer(to_dict):
+    """
+    Charge a model's to_dict() to the request's serialization time.
+
+    Only the outermost call is timed, so Event.to_dict() embedding
+    Building.to_dict() is not counted twice.
+    """
+    @wraps(to_dict)
+    def wrapper(*args, **kwargs):
+        timing = current_timing()
+        if timing is None or timing.serialize_depth:
+            return to_dict(*args, **kwargs)
+        timing.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return to_dict(*args, **kwargs)
+        finally:
+            timing.serialize_time += time.perf_counter() - started
+            timing.serialize_depth -= 1
+
+    return wrapper
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """The app's JSON provider, charging encoding time to the request"""
+
+    def dumps(self, obj, **kwargs):
+        timing = current_timing()
+        if timing is None:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            timing.json_time += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context: a statement that raises never
+    # reaches after_cursor_execute, and nothing may outlive it on the
+    # pooled connection
+    if context is not None and current_timing() is not None:
+        context._server_timing_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = current_timing()
+    started = getattr(context, '_server_timing_start', None)
+    if timing is None or started is None:
+        return
+    timing.sql_count += 1
+    timing.sql_time += time.perf_counter() - started
+
+
+def init_app(app):
+    app.config.setdefault('SERVER_TIMING_ENABLED', True)
+    app.config.setdefault('SERVER_TIMING_LOG', True)
+    if not app.config['SERVER_TIMING_ENABLED']:
+        return
+
+    log_requests = app.config['SERVER_TIMING_LOG']
+    if log_requests and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    app.json = TimedJSONProvider(app)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timing():
+        g.timing = RequestTiming()
+
+    @app.after_request
+    def emit_timing(response):
+        timing = g.pop('timing', None)
+        if timing is None:
+            return response
+
+        total = time.perf_counter() - timing.started
+        response.headers['Server-Timing'] = timing.server_timing(total)
+        if not log_requests:
+            return response
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(timing.sql_time * 1000, 2),
+            'db_queries': timing.sql_count,
+            'serialize_ms': round(timing.serialize_time * 1000, 2),
+            'json_ms': round(timing.json_time * 1000, 2),
+        }))
+        return response
@@ -0,0 +1,210 @@
+"""
+In-memory interval index over event times, per open day.
+
+Each open day's events are held as half-open [start, end) minute ranges in
+an implicit interval tree: one array sorted by start, read as a balanced
+binary tree in which every node also records the latest end below it.
+A window query walks down from the root and skips any subtree that ends
+before the window opens, so it costs O(log n + k) for k hits; building it
+is a sort.
+
+The indexes are dropped on first use after a commit writes to `events` in
+this process (the response cache's table generations), and at least every
+INTERVAL_INDEX_REFRESH seconds so writes made by other workers are picked up.
+
+find_conflicts() is the agenda clash check: one sort and a sweep that
+compares each event only with the ones still running or just finished,
+rather than every pair.
+"""
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from app import db, response_cache
+from app.models import Event
+
+DAY_MINUTES = 24 * 60
+
+# Subtrees of up to this height are scanned linearly; cheaper than descending
+LINEAR_SCAN_LEVELS = 3
+
+
+class TimeWindowError(ValueError):
+    """Raised for a malformed ?from= / ?to=; reported as a 400"""
+
+
+def minutes(value):
+    """Minutes since midnight of a time"""
+    return value.hour * 60 + value.minute
+
+
+def parse_window(start, end):
+    """(from, to) in minutes from 'HH:MM' strings; either may be None for an open end"""
+    try:
+        low = minutes(datetime.strptime(start, '%H:%M').time()) if start else 0
+        high = minutes(datetime.strptime(end, '%H:%M').time()) if end else DAY_MINUTES
+    except ValueError:
+        raise TimeWindowError('from and to must be times as HH:MM')
+    if low >= high:
+        raise TimeWindowError('from must be earlier than to')
+    return low, high
+
+
+class IntervalIndex:
+    """A static interval tree over (start, end, id) triples"""
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals)
+        self.starts = [start for start, _, _ in self.intervals]
+        self.ends = [end for _, end, _ in self.intervals]
+        self.height = len(self.intervals).bit_length() - 1
+        self.max_ends = self._augment()
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def _augment(self):
+        """Latest end under every node, bottom up"""
+        # Padded to a full tree of this height: nodes past the end of the array
+        # hold no interval (-1) but still cover real ones below them.
+        size = (1 << (self.height + 1)) - 1
+        max_ends = self.ends + [-1] * (size - len(self.ends))
+        for level in range(1, self.height + 1):
+            half = 1 << (level - 1)
+            for i in range((half << 1) - 1, size, half << 2):
+                max_ends[i] = max(max_ends[i], max_ends[i - half], max_ends[i + half])
+        return max_ends
+
+    def overlapping(self, start, end):
+        """Ids of the intervals that overlap [start, end), in start order"""
+        n = len(self.intervals)
+        if n == 0:
+            return []
+        hits = []
+        # (node, level, left subtree done)
+        stack = [((1 << self.height) - 1, self.height, False)]
+        while stack:
+            node, level, left_done = stack.pop()
+            if level <= LINEAR_SCAN_LEVELS:
+                first = node >> level << level
+                for i in range(first, min(first + (1 << (level + 1)) - 1, n)):
+                    if self.starts[i] >= end:
+                        break
+                    if self.ends[i] > start:
+                        hits.append(i)
+            elif not left_done:
+                stack.append((node, level, True))
+                left = node - (1 << (level - 1))
+                if self.max_ends[left] > start:
+                    stack.append((left, level - 1, False))
+            elif node < n and self.starts[node] < end:
+                if self.ends[node] > start:
+                    hits.append(node)
+                right = node + (1 << (level - 1))
+                if self.max_ends[right] > start:
+                    stack.append((right, level - 1, False))
+        return [self.intervals[i][2] for i in sorted(hits)]
+
+
+class EventIntervals:
+    """The interval indexes of every open day, built on demand"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._complete = False
+        self._generation = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('INTERVAL_INDEX_REFRESH', 30)
+
+    def _current(self):
+        """The cached indexes, dropping them first if events have changed"""
+        generation = response_cache.generation({'events'})
+        expired = self._built_at is None or \
+            time.monotonic() - self._built_at > current_app.config['INTERVAL_INDEX_REFRESH']
+        if generation != self._generation or expired:
+            with self._lock:
+                self._indexes, self._complete = {}, False
+                self._generation, self._built_at = generation, time.monotonic()
+        return self._indexes
+
+    def _load(self, open_day_id=None):
+        """Build the index of one open day, or of every open day not yet built"""
+        generation = response_cache.generation({'events'})
+        query = db.session.query(Event.open_day_id, Event.id, Event.start_time, Event.end_time)
+        if open_day_id is not None:
+            query = query.filter(Event.open_day_id == open_day_id)
+        grouped = {} if open_day_id is None else {open_day_id: []}
+        for day, event_id, start, end in query:
+            grouped.setdefault(day, []).append((minutes(start), minutes(end), event_id))
+        built = {day: IntervalIndex(intervals) for day, intervals in grouped.items()}
+        with self._lock:
+            # Events changed while this was built: answer this call with it, but do not keep it
+            if generation != self._generation or generation != response_cache.generation({'events'}):
+                return built
+            for day, index in built.items():
+                self._indexes.setdefault(day, index)
+            if open_day_id is None:
+                self._complete = True
+        return built
+
+    def index(self, open_day_id):
+        index = self._current().get(open_day_id)
+        if index is None:
+            index = self._load(open_day_id)[open_day_id]
+        return index
+
+    def overlapping(self, start, end, open_day_id=None):
+        """Ids of events overlapping [start, end) minutes, on one open day or on any"""
+        if open_day_id is not None:
+            return self.index(open_day_id).overlapping(start, end)
+        self._current()
+        if not self._complete:
+            self._load()
+        return [event_id for index in list(self._indexes.values()) for event_id in index.overlapping(start, end)]
+
+
+event_intervals = EventIntervals()
+
+
+def find_conflicts(events, walking_minutes, max_walk):
+    """
+    Overlapping and too-tight pairs among one open day's events.
+
+    `events` are (id, start, end, building_id) with times in minutes.
+    `walking_minutes(a, b)` estimates the walk between two buildings (None
+    if unknown) and `max_walk` bounds it. A pair is too tight when the
+    second starts after the first ends but sooner than the walk between
+    them. Events are swept in start order; only those that ended less than
+    max_walk minutes ago can clash with the next one, and they are kept in
+    a heap by end time.
+    """
+    horizon = math.ceil(max_walk or 0)
+    conflicts = []
+    recent = []  # (end, order, event)
+    for order, event in enumerate(sorted(events, key=lambda item: (item[1], item[2], item[0]))):
+        event_id, start, end, building_id = event
+        while recent and recent[0][0] + horizon <= start:
+            heapq.heappop(recent)
+        for _, _, earlier in sorted(recent, key=lambda item: (item[2][1], item[2][0])):
+            earlier_id, earlier_start, earlier_end, earlier_building = earlier
+            if earlier_end > start:
+                conflicts.append({
+                    'type': 'overlap', 'first': earlier_id, 'second': event_id,
+                    'overlap_minutes': min(earlier_end, end) - start,
+                })
+                continue
+            walk = None
+            if earlier_building is not None and building_id is not None and earlier_building != building_id:
+                walk = walking_minutes(earlier_building, building_id)
+            if walk is not None and start - earlier_end < math.ceil(walk):
+                conflicts.append({
+                    'type': 'tight', 'first': earlier_id, 'second': event_id,
+                    'gap_minutes': start - earlier_end, 'walking_minutes': round(walk, 1),
+                })
+        heapq.heappush(recent, (end, order, event))
+    return conflicts
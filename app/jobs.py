@@ -0,0 +1,341 @@
+"""
+A durable background job queue kept in the `jobs` table.
+
+Request handlers call enqueue() and return. The job row commits with the
+rest of the request's transaction, so a job exists only when the work
+that asked for it was saved. `flask worker` runs the jobs:
+JOB_WORKER_PROCESSES processes of JOB_WORKER_THREADS threads, each
+claiming one due job at a time.
+
+Claiming is a single UPDATE of the oldest due row. On Postgres the row is
+picked with FOR UPDATE SKIP LOCKED, so concurrent workers never wait on
+each other or take the same job. SQLite runs one writer at a time, so
+the same statement is already exclusive there.
+
+A job's handler and the write that marks it done commit together; a
+handler's database writes happen exactly once. Side effects outside the
+database (email) are at least once. A failed job is retried after
+JOB_RETRY_BASE * 2^(attempt - 1) seconds, jittered and capped at
+JOB_RETRY_MAX, until it has had max_attempts tries; then it stays
+`failed` with its last error. A job whose worker died mid-run is
+requeued once its lock is JOB_LOCK_TIMEOUT seconds old. Finished jobs
+are deleted after JOB_RETENTION_DAYS.
+
+Counters and timings go to the process's metrics registry; queue depths
+are read from the table (queue_stats(), shown in /api/metrics).
+"""
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, delete, func, select, update
+from app import db, mail, notifications
+from app.metrics import metrics
+from app.models import Event, Job, Notification, Registration, UserNotification
+
+logger = logging.getLogger('app.jobs')
+
+HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure that retrying cannot fix"""
+
+
+def init_app(app):
+    app.config.setdefault('JOB_WORKER_PROCESSES', 1)
+    app.config.setdefault('JOB_WORKER_THREADS', 4)
+    app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_RETRY_BASE', 10)
+    app.config.setdefault('JOB_RETRY_MAX', 3600)
+    app.config.setdefault('JOB_LOCK_TIMEOUT', 600)
+    app.config.setdefault('JOB_REAP_INTERVAL', 60)
+    app.config.setdefault('JOB_RETENTION_DAYS', 7)
+    app.config.setdefault('MAIL_SERVER', 'localhost')
+    app.config.setdefault('MAIL_PORT', 1025)
+    app.config.setdefault('MAIL_USE_TLS', False)
+    app.config.setdefault('MAIL_USERNAME', None)
+    app.config.setdefault('MAIL_PASSWORD', None)
+    app.config.setdefault('MAIL_TIMEOUT', 10)
+    app.config.setdefault('MAIL_DEFAULT_SENDER', 'opendays@wlv.ac.uk')
+    app.config.setdefault('CONTACT_EMAIL', 'opendays@wlv.ac.uk')
+
+
+def handler(kind):
+    """Register a function as the handler of a job kind; it is called with the payload as keywords"""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, delay=0, max_attempts=None):
+    """Add a job to the current transaction; it runs once that commits"""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    return job
+
+
+def retry_delay(attempts):
+    """Seconds before the next try of a job that has failed `attempts` times"""
+    config = current_app.config
+    delay = min(config['JOB_RETRY_BASE'] * 2 ** (attempts - 1), config['JOB_RETRY_MAX'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(worker_id):
+    """Take the oldest due job, committed as running; None when nothing is due"""
+    now = datetime.utcnow()
+    due = (
+        select(Job.id)
+        .where(Job.status == 'queued', Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    job = db.session.execute(
+        update(Job)
+        .where(Job.id == due, Job.status == 'queued')
+        .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.session.commit()
+    return job
+
+
+def execute(job):
+    """Run a claimed job and record how it went"""
+    started = time.perf_counter()
+    metrics.observe('job_queue_delay_seconds', max((datetime.utcnow() - job.run_at).total_seconds(), 0))
+    try:
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise PermanentJobError(f'No handler for job kind {job.kind!r}')
+        fn(**job.payload)
+        db.session.execute(
+            update(Job).where(Job.id == job.id)
+            .values(status='done', finished_at=datetime.utcnow(), locked_by=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        error = f'{type(e).__name__}: {e}'
+        final = isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts
+        if final:
+            values = {'status': 'failed', 'finished_at': datetime.utcnow()}
+        else:
+            values = {'status': 'queued', 'run_at': datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))}
+        db.session.execute(
+            update(Job).where(Job.id == job.id)
+            .values(locked_by=None, last_error=error, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        metrics.inc('jobs_failed_total' if final else 'jobs_retried_total')
+        logger.warning('job %s (%s) attempt %s/%s failed%s: %s', job.id, job.kind, job.attempts,
+                       job.max_attempts, '' if final else ', will retry', error)
+        return False
+    finally:
+        metrics.observe(f'job_{job.kind}_seconds', time.perf_counter() - started)
+
+    metrics.inc('jobs_succeeded_total')
+    return True
+
+
+def reap():
+    """Requeue jobs whose worker stopped mid-run, and delete old finished jobs"""
+    config = current_app.config
+    now = datetime.utcnow()
+    requeued = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < now - timedelta(seconds=config['JOB_LOCK_TIMEOUT']))
+        .values(
+            # One that has used up its attempts may be what keeps killing workers
+            status=case((Job.attempts >= Job.max_attempts, 'failed'), else_='queued'),
+            locked_by=None, run_at=now, last_error='Worker stopped while running the job'
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.execute(
+        delete(Job)
+        .where(Job.status == 'done', Job.finished_at < now - timedelta(days=config['JOB_RETENTION_DAYS']))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if requeued:
+        metrics.inc('jobs_reaped_total', requeued)
+        logger.warning('requeued %s jobs left running by stopped workers', requeued)
+
+
+def work_until_empty(worker_id='inline', limit=None):
+    """Run due jobs in this thread until there are none (or `limit` ran); returns how many ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        execute(job)
+        ran += 1
+    return ran
+
+
+def queue_stats():
+    """Job counts by status and the age of the oldest due job, from the table"""
+    now = datetime.utcnow()
+    counts = dict(db.session.query(Job.status, func.count()).group_by(Job.status).all())
+    oldest = db.session.query(func.min(Job.run_at)).filter(Job.status == 'queued', Job.run_at <= now).scalar()
+    return {
+        **{status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')},
+        'oldest_due_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0,
+    }
+
+
+# ==================== WORKER ====================
+
+class Worker:
+    """Threads of one worker process, each claiming and running one job at a time"""
+
+    def __init__(self, app, threads, burst=False):
+        self.app = app
+        self.threads = threads
+        self.burst = burst
+        self.stopping = threading.Event()
+
+    def _loop(self, index):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        config = self.app.config
+        next_reap = 0
+        with self.app.app_context():
+            while not self.stopping.is_set():
+                try:
+                    if index == 0 and time.monotonic() >= next_reap:
+                        reap()
+                        next_reap = time.monotonic() + config['JOB_REAP_INTERVAL']
+                    job = claim(worker_id)
+                    if job is not None:
+                        execute(job)
+                except Exception:
+                    logger.exception('worker %s could not claim or record a job', worker_id)
+                    db.session.rollback()
+                    job = None
+                finally:
+                    db.session.remove()
+
+                if job is None:
+                    if self.burst:
+                        return
+                    self.stopping.wait(config['JOB_POLL_INTERVAL'])
+
+    def run(self):
+        """Run until SIGTERM/SIGINT (or, in burst mode, until the queue is empty)"""
+        def stop(signum, frame):
+            logger.info('worker %s stopping after its current jobs', os.getpid())
+            self.stopping.set()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+
+        threads = [threading.Thread(target=self._loop, args=(i,), name=f'job-worker-{i}')
+                   for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+        logger.info('worker %s stopped; %s', os.getpid(), metrics.snapshot()['counters'])
+
+
+def _worker_process(app, threads, burst):
+    # Connections inherited from the parent are not safe to share
+    with app.app_context():
+        db.engine.dispose(close=False)
+    Worker(app, threads, burst).run()
+
+
+def run_workers(app, processes, threads, burst=False):
+    """`processes` worker processes of `threads` threads; in this process when there is one"""
+    if processes <= 1:
+        Worker(app, threads, burst).run()
+        return
+
+    with app.app_context():
+        db.engine.dispose()
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_worker_process, args=(app, threads, burst), name=f'job-worker-{i}')
+                for i in range(processes)]
+    for child in children:
+        child.start()
+
+    def stop(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        child.join()
+
+
+# ==================== HANDLERS ====================
+
+def _send(to, subject, body, reply_to=None):
+    try:
+        mail.send_email(to, subject, body, reply_to=reply_to)
+    except ValueError as e:
+        # A header that cannot be written (a line break in it) fails the same way every time
+        raise PermanentJobError(f'Cannot build the email: {e}') from e
+
+
+@handler('send_email')
+def send_email(to, subject, body, reply_to=None):
+    _send(to, subject, body, reply_to=reply_to)
+
+
+@handler('registration_confirmation')
+def registration_confirmation(registration_id):
+    registration = db.session.get(Registration, registration_id)
+    if registration is None or registration.user is None:
+        # Cancelled before the job ran; nothing to confirm
+        return
+    open_day = registration.open_day
+    when = f"{open_day.event_date:%A %d %B %Y}, {open_day.start_time:%H:%M}-{open_day.end_time:%H:%M}"
+    _send(
+        registration.user.email,
+        f'You are registered for {open_day.title}',
+        f'Hello {registration.user.full_name},\n\n'
+        f'Thank you for registering for {open_day.title} on {when}'
+        f"{f' at {open_day.location}' if open_day.location else ''}.\n\n"
+        'You can build your agenda for the day in the app.\n'
+    )
+
+
+@handler('notification_fan_out')
+def notification_fan_out(notification_id, event_id, audience):
+    notification = db.session.get(Notification, notification_id)
+    event = db.session.get(Event, event_id)
+    if notification is None or event is None:
+        raise PermanentJobError('The notification or its event no longer exists')
+    # A rerun after a lost lock must not deliver (or count) twice
+    if db.session.query(UserNotification.id).filter_by(notification_id=notification_id).first():
+        return
+    delivered = notifications.fan_out(notification, event, audience)
+    logger.info('notification %s delivered to %s users', notification_id, delivered)
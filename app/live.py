@@ -0,0 +1,263 @@
+"""
+Live open-day updates as Server-Sent Events.
+
+Writes that visitors should see straight away call publish(): a new
+event, a schedule import, an announcement, or an event filling up or
+reopening. A message is only released once the transaction that
+published it commits.
+
+- On Postgres publish() runs pg_notify on the LIVE_CHANNEL channel in
+  the same transaction. Every worker runs one listener thread with its
+  own connection and hands what it hears to its broker, so all workers
+  see the same messages in the same (commit) order, the publishing
+  worker included.
+- Elsewhere (SQLite, a single process) the messages wait in the
+  session and go straight to the local broker on commit.
+
+The broker keeps the last LIVE_REPLAY_SIZE messages of each open day.
+A client that reconnects with Last-Event-ID gets the messages after that
+one. If it has fallen out of the buffer, the client is sent a `reset`
+event instead, telling it to refetch. Idle streams cost a waiting thread
+(a greenlet under gevent) and a heartbeat comment every LIVE_HEARTBEAT
+seconds. Each worker accepts at most LIVE_MAX_CONNECTIONS streams.
+"""
+import itertools
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import deque
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app import db
+
+logger = logging.getLogger('app.live')
+
+LIVE_CHANNEL = 'open_day_updates'
+# pg_notify payloads must stay under 8000 bytes
+MAX_PAYLOAD = 7900
+
+_ids = itertools.count(1)
+
+
+def _message_id():
+    # Unique across workers; resuming matches it exactly, it is never compared
+    return f'{time.time_ns() // 1000:x}-{os.getpid():x}-{next(_ids):x}'
+
+
+def event_summary(event):
+    """The fields of an event a live message carries; descriptions are left out"""
+    return {
+        'id': event.id,
+        'title': event.title,
+        'event_type': event.event_type,
+        'start_time': event.start_time.strftime('%H:%M') if event.start_time else None,
+        'end_time': event.end_time.strftime('%H:%M') if event.end_time else None,
+        'building_id': event.building_id,
+        'room': event.room,
+        'capacity': event.capacity,
+    }
+
+
+class _Channel:
+    """One open day's recent messages, numbered in arrival order"""
+
+    def __init__(self, size):
+        self.messages = deque(maxlen=size)
+        self.sequence = 0
+        self.condition = threading.Condition()
+
+
+class Broker:
+    """In-process pub/sub of live messages, one channel per open day"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._relay = None
+        self.replay_size = 256
+        self.connections = 0
+
+    def init_app(self, app):
+        app.config.setdefault('LIVE_HEARTBEAT', 15)
+        app.config.setdefault('LIVE_RETRY_MS', 3000)
+        app.config.setdefault('LIVE_REPLAY_SIZE', 256)
+        app.config.setdefault('LIVE_MAX_CONNECTIONS', 5000)
+        app.config.setdefault('LIVE_PG_RELAY', True)
+        self.replay_size = app.config['LIVE_REPLAY_SIZE']
+        app.extensions['live_broker'] = self
+
+        if not event.contains(Session, 'after_commit', _release_messages):
+            event.listen(Session, 'after_commit', _release_messages)
+            event.listen(Session, 'after_soft_rollback', _drop_messages)
+
+    def _channel(self, open_day_id):
+        channel = self._channels.get(open_day_id)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.setdefault(open_day_id, _Channel(self.replay_size))
+        return channel
+
+    def dispatch(self, message):
+        """Add a message to its open day's channel and wake that channel's streams"""
+        channel = self._channel(message['open_day_id'])
+        with channel.condition:
+            channel.sequence += 1
+            channel.messages.append((channel.sequence, message))
+            channel.condition.notify_all()
+
+    def reset_all(self):
+        """Tell every stream its history is incomplete, e.g. after the relay reconnects"""
+        for open_day_id in list(self._channels):
+            self.dispatch({'id': _message_id(), 'open_day_id': open_day_id, 'event': 'reset', 'data': {}})
+
+    def connect(self, limit):
+        """Take a stream slot; False when this worker already has `limit` streams"""
+        with self._lock:
+            if self.connections >= limit:
+                return False
+            self.connections += 1
+            return True
+
+    def disconnect(self):
+        with self._lock:
+            self.connections -= 1
+
+    def stream(self, open_day_id, last_event_id=None, heartbeat=15, retry_ms=3000):
+        """
+        The SSE body of one open day's stream. Call connect() first and
+        disconnect() once the response is closed.
+        """
+        channel = self._channel(open_day_id)
+        yield f'retry: {retry_ms}\n\n'
+
+        with channel.condition:
+            cursor = channel.sequence
+            reset = None
+            if last_event_id:
+                cursor = next((sequence for sequence, message in channel.messages
+                               if message['id'] == last_event_id), None)
+                if cursor is None:
+                    # Too old to resume from; the client has to refetch
+                    cursor, reset = channel.sequence, _reset(channel)
+        if reset:
+            yield reset
+
+        while True:
+            with channel.condition:
+                channel.condition.wait_for(lambda: channel.sequence > cursor, timeout=heartbeat)
+                pending = [(sequence, message) for sequence, message in channel.messages if sequence > cursor]
+                # Fell further behind than the buffer reaches
+                reset = _reset(channel) if pending and pending[0][0] > cursor + 1 else None
+                cursor = channel.sequence
+
+            if reset:
+                yield reset
+                continue
+            if not pending:
+                yield ': heartbeat\n\n'
+            for _, message in pending:
+                yield _format(message)
+
+    def ensure_relay(self):
+        """Start this worker's Postgres listener, once, on first use"""
+        if self._relay is not None or not current_app.config['LIVE_PG_RELAY']:
+            return
+        if db.engine.dialect.name != 'postgresql':
+            return
+        with self._lock:
+            if self._relay is None:
+                url = db.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+                self._relay = PostgresRelay(self, url)
+                self._relay.start()
+
+
+class PostgresRelay(threading.Thread):
+    """Listens on LIVE_CHANNEL and dispatches every notification to the broker"""
+
+    def __init__(self, broker, url):
+        super().__init__(name='live-relay', daemon=True)
+        self.broker = broker
+        self.url = url
+
+    def run(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        backoff = 1
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(self.url)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = connection.cursor()
+                cursor.execute(f'LISTEN {LIVE_CHANNEL}')
+                if backoff > 1:
+                    # Messages sent while disconnected are lost
+                    self.broker.reset_all()
+                backoff = 1
+                while True:
+                    if select.select([connection], [], [], 30) == ([], [], []):
+                        # Quiet; make sure the connection is still there
+                        cursor.execute('SELECT 1')
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.broker.dispatch(json.loads(connection.notifies.pop(0).payload))
+            except Exception:
+                logger.exception('live relay lost its connection; retrying in %ss', backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def _reset(channel):
+    # Resuming after the reset starts from the newest message; an empty id clears Last-Event-ID
+    newest = channel.messages[-1][1]['id'] if channel.messages else ''
+    return f'id: {newest}\nevent: reset\ndata: {{}}\n\n'
+
+
+def _format(message):
+    return f"id: {message['id']}\nevent: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+def publish(open_day_id, kind, data):
+    """
+    Queue a live message for an open day's streams in the current
+    transaction; it is sent when the transaction commits.
+    """
+    message = {'id': _message_id(), 'open_day_id': open_day_id, 'event': kind, 'data': data}
+    if db.engine.dialect.name == 'postgresql':
+        payload = json.dumps(message)
+        if len(payload.encode('utf-8')) > MAX_PAYLOAD:
+            message['event'], message['data'] = 'reset', {}
+            payload = json.dumps(message)
+        db.session.execute(db.select(func.pg_notify(LIVE_CHANNEL, payload)))
+    else:
+        # Messages belong to a transaction even if nothing else has begun one
+        session = db.session()
+        if not session.in_transaction():
+            session.begin()
+        session.info.setdefault('live_messages', []).append(message)
+
+
+# ==================== SESSION HOOKS ====================
+
+def _release_messages(session):
+    for message in session.info.pop('live_messages', ()):
+        broker.dispatch(message)
+
+
+def _drop_messages(session, previous_transaction):
+    # Fires for every rollback, even one with no database work to undo;
+    # a savepoint rolling back leaves the outer transaction's messages
+    if previous_transaction.parent is None:
+        session.info.pop('live_messages', None)
+
+
+broker = Broker()
@@ -0,0 +1,34 @@
+from sqlalchemy.orm import joinedload, contains_eager
+from app.models import Event, Course, Registration, UserAgenda, UserNotification
+
+
+# Loading profiles
+# Each list endpoint declares the relationships its serializer touches so they
+# are fetched with the rows instead of one lazy SELECT per row. All of these
+# are many-to-one, so a LEFT OUTER JOIN keeps every listing to one query.
+LOADING_PROFILES = {
+    'events': (
+        joinedload(Event.building),
+        joinedload(Event.subject_area),
+    ),
+    'courses': (
+        joinedload(Course.subject_area),
+    ),
+    'registrations': (
+        joinedload(Registration.open_day),
+    ),
+    # The agenda query already joins Event for filtering and sorting, so the
+    # event is populated from that join rather than a second one.
+    'agenda': (
+        contains_eager(UserAgenda.event).joinedload(Event.building),
+        contains_eager(UserAgenda.event).joinedload(Event.subject_area),
+    ),
+    'notifications': (
+        joinedload(UserNotification.notification),
+    ),
+}
+
+
+def with_profile(query, name):
+    """Apply the named loading profile to a query"""
+    return query.options(*LOADING_PROFILES[name])
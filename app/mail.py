@@ -0,0 +1,121 @@
+"""
+Outgoing email, and a local SMTP stand-in for development and tests.
+
+send_email() talks plain SMTP to MAIL_SERVER:MAIL_PORT. It is only ever
+called from background jobs (app/jobs.py), never inside a request.
+
+SMTPSink accepts whatever it is sent and keeps it: in memory, and as .eml
+files when given a directory. `flask smtp-sink` runs one on
+localhost:1025, the default MAIL_PORT, so a development setup sends real
+SMTP without mail leaving the machine.
+"""
+import os
+import smtplib
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import make_msgid
+from flask import current_app
+
+
+def send_email(to, subject, body, reply_to=None):
+    """Send one plain-text email; raises on any SMTP failure so the job retries"""
+    config = current_app.config
+    message = EmailMessage()
+    message['From'] = config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    message['Message-ID'] = make_msgid(domain=config['MAIL_DEFAULT_SENDER'].rpartition('@')[2] or None)
+    if reply_to:
+        message['Reply-To'] = reply_to
+    message.set_content(body)
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT']) as smtp:
+        if config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if config['MAIL_USERNAME']:
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        smtp.send_message(message)
+
+
+# ==================== SMTP STAND-IN ====================
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost SMTP sink')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.deliver(sender, recipients, b''.join(lines))
+                self.reply('250 OK queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """A local SMTP server that keeps every message it receives"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=1025, maildir=None, on_message=None):
+        super().__init__((host, port), _SinkHandler)
+        self.maildir = maildir
+        self.on_message = on_message
+        self.messages = []
+        self._lock = threading.Lock()
+        if maildir:
+            os.makedirs(maildir, exist_ok=True)
+
+    def deliver(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append({'from': sender, 'to': recipients, 'data': data})
+            count = len(self.messages)
+        if self.maildir:
+            path = os.path.join(self.maildir, f'{time.time_ns()}-{count}.eml')
+            with open(path, 'wb') as f:
+                f.write(data)
+        if self.on_message:
+            self.on_message(sender, recipients, data)
+
+    def start(self):
+        """Serve from a daemon thread; returns the sink"""
+        threading.Thread(target=self.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
@@ -1,4 +1,5 @@
-from app import db, bcrypt
+from app import db, password_hasher
+from app.instrumentation import timed_serializer
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import ARRAY
 
@@ -14,17 +15,33 @@ class User(db.Model):
     phone = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_admin = db.Column(db.Boolean, default=False)
+    role_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Maintained by app/notifications.py; unread user_notifications rows of this user
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Partial: only users whose role has changed, read by the role-version cache
+    __table_args__ = (
+        db.Index('ix_users_role_version', 'role_version',
+                 postgresql_where=db.text('role_version > 0'), sqlite_where=db.text('role_version > 0')),
+    )
 
     def __init__(self, email, password, full_name, phone=None, is_admin=False):
         self.email = email
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.set_password(password)
         self.full_name = full_name
         self.phone = phone
         self.is_admin = is_admin
 
+    def set_password(self, password):
+        self.password_hash = password_hasher.hash(password)
+
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -44,6 +61,7 @@ class SubjectArea(db.Model):
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
 
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -67,6 +85,9 @@ class OpenDay(db.Model):
     registration_deadline = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_open_days_event_date', 'event_date'),)
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -95,6 +116,12 @@ class Building(db.Model):
     longitude = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_buildings_campus_name', 'campus', 'name', 'id'),
+        db.Index('ix_buildings_name', 'name', 'id'),
+    )
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -121,6 +148,8 @@ class Event(db.Model):
     building_id = db.Column(db.Integer, db.ForeignKey('buildings.id'))
     room = db.Column(db.String(50))
     capacity = db.Column(db.Integer)
+    # Maintained by app/booking.py; the number of agenda entries for this event
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     subject_area_id = db.Column(db.Integer, db.ForeignKey('subject_areas.id'))
     presenter = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -130,8 +159,18 @@ class Event(db.Model):
     building = db.relationship('Building', backref='events')
     subject_area = db.relationship('SubjectArea', backref='events')
 
-    def to_dict(self):
-        return {
+    # Listings filter by open day and sort by (start_time, id)
+    __table_args__ = (
+        db.Index('ix_events_open_day_start', 'open_day_id', 'start_time', 'id'),
+        db.Index('ix_events_start', 'start_time', 'id'),
+        db.Index('ix_events_event_type', 'event_type'),
+        db.Index('ix_events_subject_area_id', 'subject_area_id'),
+        db.Index('ix_events_building_id', 'building_id'),
+    )
+
+    @timed_serializer
+    def to_dict(self, normalized=False):
+        data = {
             'id': self.id,
             'open_day_id': self.open_day_id,
             'title': self.title,
@@ -139,13 +178,20 @@ class Event(db.Model):
             'event_type': self.event_type,
             'start_time': self.start_time.strftime('%H:%M') if self.start_time else None,
             'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
-            'building': self.building.to_dict() if self.building else None,
             'room': self.room,
             'capacity': self.capacity,
-            'subject_area': self.subject_area.to_dict() if self.subject_area else None,
             'presenter': self.presenter,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+        # Normalized events refer to buildings and subject areas by id; the
+        # response side-loads each one once (app/shapes.py)
+        if normalized:
+            data['building_id'] = self.building_id
+            data['subject_area_id'] = self.subject_area_id
+        else:
+            data['building'] = self.building.to_dict() if self.building else None
+            data['subject_area'] = self.subject_area.to_dict() if self.subject_area else None
+        return data
 
 
 # Registrations
@@ -165,6 +211,13 @@ class Registration(db.Model):
     open_day = db.relationship('OpenDay', backref='registrations')
     subject = db.relationship('SubjectArea', backref='interested_registrations')
 
+    # Notification fan-out reads an open day's registrants
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'open_day_id', name='registration_user_open_day_unique'),
+        db.Index('ix_registrations_open_day_user', 'open_day_id', 'user_id'),
+    )
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -192,7 +245,18 @@ class UserAgenda(db.Model):
     user = db.relationship('User', backref='agenda_items')
     event = db.relationship('Event', backref='agenda_items')
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'event_id', name='user_event_unique'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'event_id', name='user_event_unique'),
+        db.Index('ix_user_agenda_event_id', 'event_id'),
+    )
+
+    @timed_serializer
+    def to_dict(self, normalized=False):
+        # An agenda entry is the event plus the visitor's own fields
+        data = self.event.to_dict(normalized=normalized)
+        data['attended'] = self.attended
+        data['added_at'] = self.added_at.isoformat() if self.added_at else None
+        return data
 
 
 # Feedback
@@ -203,7 +267,7 @@ class Feedback(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     open_day_id = db.Column(db.Integer, db.ForeignKey('open_days.id'))
     rating = db.Column(db.Integer)
-    useful_aspects = db.Column(ARRAY(db.String))
+    useful_aspects = db.Column(ARRAY(db.String).with_variant(db.JSON, 'sqlite'))
     improvement_suggestions = db.Column(db.Text)
     additional_comments = db.Column(db.Text)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -212,6 +276,9 @@ class Feedback(db.Model):
     user = db.relationship('User', backref='feedback')
     open_day = db.relationship('OpenDay', backref='feedback')
 
+    __table_args__ = (db.UniqueConstraint('user_id', 'open_day_id', name='feedback_user_open_day_unique'),)
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -242,6 +309,12 @@ class Course(db.Model):
     # Relationships
     subject_area = db.relationship('SubjectArea', backref='courses')
 
+    __table_args__ = (
+        db.Index('ix_courses_subject_area_name', 'subject_area_id', 'name', 'id'),
+        db.Index('ix_courses_name', 'name', 'id'),
+    )
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
@@ -262,12 +335,140 @@ class FAQ(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     question = db.Column(db.Text, nullable=False)
     answer = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    category = db.Column(db.String(100))
+    # NOT NULL: it is the keyset pagination sort key, and NULLs never compare
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           server_default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_faqs_created_at', 'created_at', 'id'),)
+
+    @timed_serializer
     def to_dict(self):
         return {
             'id': self.id,
             'question': self.question,
+            'answer': self.answer,
             'category': self.category,
         }
+
+
+# Notifications
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(255), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    notification_type = db.Column(db.String(50))  # event_update, reminder, general, etc.
+    related_event_id = db.Column(db.Integer, db.ForeignKey('events.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    related_event = db.relationship('Event', backref='notifications')
+
+    @timed_serializer
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'message': self.message,
+            'notification_type': self.notification_type,
+            'related_event_id': self.related_event_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+# User Notifications (one row per delivered notification, with its read status)
+class UserNotification(db.Model):
+    __tablename__ = 'user_notifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id'))
+    is_read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    delivered_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
+
+    # Relationships
+    user = db.relationship('User', backref='notification_items')
+    notification = db.relationship('Notification', backref='deliveries')
+
+    # The inbox is read newest first through the unique (user_id, notification_id) index
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'notification_id', name='user_notification_unique'),
+        db.Index('ix_user_notifications_notification_id', 'notification_id'),
+    )
+
+    @timed_serializer
+    def to_dict(self):
+        # An inbox entry is the notification plus the user's own fields
+        data = self.notification.to_dict()
+        data['is_read'] = self.is_read
+        data['delivered_at'] = self.delivered_at.isoformat() if self.delivered_at else None
+        return data
+
+
+# Contact Messages
+class ContactMessage(db.Model):
+    __tablename__ = 'contact_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255))
+    message = db.Column(db.Text, nullable=False)
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    responded = db.Column(db.Boolean, default=False)
+    responded_at = db.Column(db.DateTime)
+
+    @timed_serializer
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'email': self.email,
+            'subject': self.subject,
+            'message': self.message,
+            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
+            'responded': self.responded
+        }
+
+
+# Background Jobs (app/jobs.py)
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued', server_default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False, default=5, server_default='5')
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(255))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # Partial: workers only ever look for queued jobs that are due, oldest first
+    __table_args__ = (
+        db.Index('ix_jobs_queued_run_at', 'run_at', 'id',
+                 postgresql_where=db.text("status = 'queued'"), sqlite_where=db.text("status = 'queued'")),
+        db.Index('ix_jobs_running_locked_at', 'locked_at',
+                 postgresql_where=db.text("status = 'running'"), sqlite_where=db.text("status = 'running'")),
+    )
+
+    @timed_serializer
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,87 @@
+"""
+In-app notifications: fan-out and the per-user unread counter.
+
+A notification is written once to `notifications` and delivered as one
+`user_notifications` row per recipient. Fan-out is a single
+INSERT ... SELECT over the audience (an event's agenda holders, the
+registrants of its open day, or both), so the database does the work
+for any audience size in one statement and no user rows pass through
+Python.
+
+`users.unread_notifications` is kept in step in the same transaction:
+delivery adds one for each new row, marking read subtracts the number of
+rows that actually changed. The unread count is then a primary key
+lookup, never a COUNT over the inbox.
+"""
+from sqlalchemy import insert, literal, select, union, update
+from app import db
+from app.models import Registration, User, UserAgenda, UserNotification
+
+AUDIENCES = ('agenda', 'registrants', 'both')
+
+
+def audience_query(event, audience):
+    """SELECT of the user ids a notification about `event` goes to"""
+    agenda = select(UserAgenda.user_id).where(UserAgenda.event_id == event.id, UserAgenda.user_id.isnot(None))
+    registrants = select(Registration.user_id).where(
+        Registration.open_day_id == event.open_day_id, Registration.user_id.isnot(None)
+    )
+    if audience == 'agenda':
+        return agenda.distinct()
+    if audience == 'registrants':
+        return registrants.distinct()
+    return union(agenda, registrants)
+
+
+def fan_out(notification, event, audience='both'):
+    """
+    Deliver a flushed notification to the audience of an event in the
+    current transaction; returns the number of users it reached.
+    """
+    recipients = audience_query(event, audience).subquery()
+    delivered = db.session.execute(
+        insert(UserNotification).from_select(
+            ['user_id', 'notification_id'],
+            select(recipients.c.user_id, literal(notification.id))
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+    if delivered:
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(
+                select(UserNotification.user_id).where(UserNotification.notification_id == notification.id)
+            ))
+            .values(unread_notifications=User.unread_notifications + 1)
+            .execution_options(synchronize_session=False)
+        )
+    return delivered
+
+
+def mark_read(user_id, notification_ids=None):
+    """
+    Mark some of a user's notifications read, or all of them; returns how
+    many were unread. The caller commits.
+    """
+    statement = (
+        update(UserNotification)
+        .where(UserNotification.user_id == user_id, UserNotification.is_read.is_(False))
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if notification_ids is not None:
+        statement = statement.where(UserNotification.notification_id.in_(notification_ids))
+    changed = db.session.execute(statement).rowcount
+
+    if changed:
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(unread_notifications=User.unread_notifications - changed)
+            .execution_options(synchronize_session=False)
+        )
+    return changed
+
+
+def unread_count(user_id):
+    return db.session.query(User.unread_notifications).filter(User.id == user_id).scalar() or 0
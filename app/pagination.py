@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import date, time, datetime
+from flask import request, current_app
+from sqlalchemy import tuple_
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor or limit; reported as a 400"""
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, paginated=True):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.paginated = paginated
+
+    def payload(self, key, serialized):
+        """Response body for this page; legacy responses keep their old shape"""
+        body = {key: serialized}
+        if self.paginated:
+            body['next_cursor'] = self.next_cursor
+        return body
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_load(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError, UnicodeError):
+        raise PaginationError('Invalid cursor')
+
+
+def _dump(value):
+    if isinstance(value, (date, time, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _load(value, column):
+    python_type = column.type.python_type
+    if value is None:
+        return None
+    if python_type in (date, time, datetime):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def wants_page():
+    """Whether this request should get a paginated response"""
+    if 'limit' in request.args or 'cursor' in request.args:
+        return True
+    return not current_app.config['LEGACY_UNPAGINATED_LISTS']
+
+
+def paginate(query, sort_column, id_column, descending=False, row_keys=None):
+    """
+    Keyset-paginate a query on (sort_column, id_column).
+
+    Reads `limit` and `cursor` from the request. The cursor is an opaque
+    encoding of the last row's keys, so each page is an index range scan
+    that starts where the previous one ended rather than an OFFSET.
+    `row_keys` extracts the key values from a row when they do not live on
+    the row itself (e.g. agenda items sorted by their event's start time).
+    """
+    limit = request.args.get('limit', current_app.config['PAGINATION_DEFAULT_LIMIT'], type=int)
+    if limit is None or limit < 1:
+        raise PaginationError('limit must be a positive integer')
+    limit = min(limit, current_app.config['PAGINATION_MAX_LIMIT'])
+
+    columns = [sort_column] if sort_column is id_column else [sort_column, id_column]
+    keys = tuple_(*columns) if len(columns) > 1 else columns[0]
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        last = decode_cursor(cursor, columns)
+        bound = tuple_(*last) if len(columns) > 1 else last[0]
+        query = query.filter(keys < bound if descending else keys > bound)
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        if row_keys:
+            values = row_keys(last_row)
+        else:
+            values = [getattr(last_row, column.key) for column in columns]
+        next_cursor = encode_cursor(values)
+
+    return Page(rows, next_cursor)
+
+
+def fetch_page(query, sort_column, id_column, descending=False, row_keys=None):
+    """Paginate the query, or return every row when the request is legacy"""
+    if wants_page():
+        return paginate(query, sort_column, id_column, descending, row_keys)
+
+    columns = [sort_column] if sort_column is id_column else [sort_column, id_column]
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return unpaginated(query.order_by(*order))
+
+
+def unpaginated(query):
+    """
+    Every row of an ordered query as one page.
+
+    When list responses are streamed (app/encoding.py) the rows are read
+    lazily, JSON_STREAM_BATCH_SIZE at a time, instead of all at once.
+    """
+    if current_app.config.get('JSON_STREAM_LISTS'):
+        return Page(query.yield_per(current_app.config['JSON_STREAM_BATCH_SIZE']), paginated=False)
+    return Page(query.all(), paginated=False)
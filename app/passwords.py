@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from app.metrics import metrics
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the bcrypt queue is full; reported as a 503"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small bounded thread pool.
+
+    bcrypt releases the GIL, so a handful of workers saturate the CPU budget
+    we are willing to spend on it without pinning every request thread.
+    At most BCRYPT_WORKERS + BCRYPT_QUEUE_LIMIT operations may be in flight;
+    anything beyond that fails immediately instead of queueing behind a
+    registration burst or credential-stuffing wave.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 2
+        self.queue_limit = 32
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('BCRYPT_WORKERS', 2)
+        app.config.setdefault('BCRYPT_QUEUE_LIMIT', 32)
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.workers = app.config['BCRYPT_WORKERS']
+        self.queue_limit = app.config['BCRYPT_QUEUE_LIMIT']
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        # Created lazily so forked workers do not inherit a parent's threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='bcrypt'
+                )
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit)
+            return self._executor
+
+    def _run(self, operation, fn, *args):
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            metrics.inc('bcrypt_rejected_total')
+            raise PasswordHasherBusy('Too many concurrent password operations')
+
+        def timed():
+            started = time.perf_counter()
+            # Time spent queued for a free worker, not counting the hash itself
+            metrics.observe('bcrypt_wait_seconds', started - queued)
+            try:
+                return fn(*args)
+            finally:
+                metrics.observe(f'bcrypt_{operation}_seconds', time.perf_counter() - started)
+
+        queued = time.perf_counter()
+        future = executor.submit(timed)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        hashed = self._run('hash', bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+        return hashed.decode('utf-8')
+
+    def verify(self, password_hash, password):
+        return self._run('verify', bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with a different cost than configured"""
+        return hash_rounds(password_hash) != self.rounds
+
+
+def hash_rounds(password_hash):
+    """Cost factor of a modular-crypt bcrypt hash ($2b$12$...)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
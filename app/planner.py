@@ -0,0 +1,145 @@
+"""
+Automatic agenda planning for one open day.
+
+Picks the set of non-overlapping events with the greatest total weight
+(weighted interval scheduling). An event's weight comes from how well its
+subject matches the registrant's interest area, scaled down as it fills:
+
+    matching subject      SUBJECT_MATCH_WEIGHT
+    no subject (general)  GENERAL_WEIGHT
+    another subject       OTHER_SUBJECT_WEIGHT
+
+    times 0.5 + 0.5 * remaining seats / capacity; full events are skipped
+
+Each open day's events are held sorted by end time together with their
+predecessor table, the number of events that end before each one starts.
+With those, a plan is one O(n) pass of dynamic programming and a walk
+back; the weights for each interest area are worked out once per build.
+Plans are dropped after a schedule change is committed to `events` in this
+process. Seat bookings do not count as one (booking.py marks its counter
+updates with cache_tables=()); seat counts, and changes made by other
+workers, are picked up when plans expire every AUTO_AGENDA_REFRESH seconds.
+"""
+import threading
+import time
+from bisect import bisect_right
+from flask import current_app
+from app import db, response_cache
+from app.models import Event
+from app.intervals import minutes
+
+SUBJECT_MATCH_WEIGHT = 4.0
+GENERAL_WEIGHT = 1.0
+OTHER_SUBJECT_WEIGHT = 0.25
+
+
+class DayPlan:
+    """One open day's events, sorted by end, with their predecessor table"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (minutes(row.end_time), minutes(row.start_time), row.id))
+        self.ids = [row.id for row in rows]
+        self.starts = [minutes(row.start_time) for row in rows]
+        self.ends = [minutes(row.end_time) for row in rows]
+        self.subjects = [row.subject_area_id for row in rows]
+        # Fraction of seats still free; None for events without a capacity
+        self.free = [
+            None if not row.capacity else max(row.capacity - (row.seats_taken or 0), 0) / row.capacity
+            for row in rows
+        ]
+        # predecessors[j]: how many events end no later than event j starts
+        self.predecessors = [bisect_right(self.ends, start, 0, j) for j, start in enumerate(self.starts)]
+        self._weights = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def weights(self, interest_area):
+        """Event weights for a registrant interested in interest_area (None for none)"""
+        weights = self._weights.get(interest_area)
+        if weights is None:
+            weights = []
+            for start, end, subject, free in zip(self.starts, self.ends, self.subjects, self.free):
+                if end <= start or free == 0:
+                    weights.append(0.0)
+                    continue
+                if subject is None:
+                    weight = GENERAL_WEIGHT
+                elif subject == interest_area:
+                    weight = SUBJECT_MATCH_WEIGHT
+                else:
+                    weight = OTHER_SUBJECT_WEIGHT
+                weights.append(weight * (1.0 if free is None else 0.5 + 0.5 * free))
+            self._weights[interest_area] = weights
+        return weights
+
+    def score(self, interest_area, event_ids):
+        """Total weight of the given events for a registrant interested in interest_area"""
+        weights = dict(zip(self.ids, self.weights(interest_area)))
+        return sum(weights.get(event_id, 0.0) for event_id in event_ids)
+
+    def solve(self, interest_area, excluded=()):
+        """(event ids in time order, total weight) of the best schedule avoiding `excluded` ids"""
+        weights = self.weights(interest_area)
+        excluded = set(excluded)
+        n = len(self.ids)
+
+        # best[j]: the greatest weight using only the first j events by end time
+        best = [0.0] * (n + 1)
+        for j in range(n):
+            weight = 0.0 if self.ids[j] in excluded else weights[j]
+            take = weight + best[self.predecessors[j]]
+            best[j + 1] = take if weight > 0 and take > best[j] else best[j]
+
+        chosen = []
+        j = n
+        while j > 0:
+            if best[j] != best[j - 1]:
+                chosen.append(self.ids[j - 1])
+                j = self.predecessors[j - 1]
+            else:
+                j -= 1
+        chosen.reverse()
+        return chosen, best[n]
+
+
+class AgendaPlanner:
+    """The DayPlan of every open day, built on demand"""
+
+    def __init__(self):
+        self._plans = {}
+        self._generation = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('AUTO_AGENDA_REFRESH', 30)
+        app.config.setdefault('AUTO_AGENDA_RETRIES', 3)
+
+    def _current(self):
+        generation = response_cache.generation({'events'})
+        expired = self._built_at is None or \
+            time.monotonic() - self._built_at > current_app.config['AUTO_AGENDA_REFRESH']
+        if generation != self._generation or expired:
+            with self._lock:
+                self._plans = {}
+                self._generation, self._built_at = generation, time.monotonic()
+        return self._plans
+
+    def plan(self, open_day_id):
+        """The DayPlan of an open day; empty if it has no events"""
+        plan = self._current().get(open_day_id)
+        if plan is None:
+            generation = response_cache.generation({'events'})
+            rows = db.session.query(
+                Event.id, Event.start_time, Event.end_time, Event.subject_area_id, Event.capacity, Event.seats_taken
+            ).filter(Event.open_day_id == open_day_id).all()
+            plan = DayPlan(rows)
+            with self._lock:
+                # Not kept if the schedule changed while it was read
+                if generation == self._generation == response_cache.generation({'events'}):
+                    plan = self._plans.setdefault(open_day_id, plan)
+        return plan
+
+
+agenda_planner = AgendaPlanner()
@@ -0,0 +1,253 @@
+"""
+Full-text search across courses, events and FAQs.
+
+Each searchable row has a title, some keywords and a body, weighted in
+that order:
+
+    course  name      ucas_code, faculty   description
+    event   title     presenter            description
+    faq     question                       answer
+
+On Postgres each table has a generated `search_vector` tsvector column
+with a GIN index; a search ranks the matches of each table with
+ts_rank_cd and merges them. On SQLite one FTS5 table, `search_index`,
+holds all three kinds and is kept up to date by triggers; it is ranked
+with bm25. Both are created by migration c4d1e9a7b352, and by
+db.create_all() through the DDL hooks at the bottom of this module.
+
+Every search term must match; the last one also matches as a prefix once
+it is three characters long, so results follow the user as they type.
+
+Every match is ranked. The index finds the matches; ranking costs time
+per match, and only the best `offset + limit` of each kind are kept
+(ORDER BY score LIMIT inside each branch on Postgres, one ordered FTS5
+query on SQLite) before they are merged into the page. Snippets are cut
+from the body of the page's rows only, HTML-escaped, with the words that
+look like the search terms wrapped in <mark>.
+"""
+import html
+import re
+from flask import request, current_app
+from sqlalchemy import DDL, Integer, column, event, text
+from app import db
+from app.models import Course, Event, FAQ
+from app.pagination import encode_cursor, decode_cursor, PaginationError
+
+KINDS = ('course', 'event', 'faq')
+MAX_TERMS = 8
+MIN_PREFIX = 3
+SNIPPET_WORDS = 16
+LANGUAGE = 'english'
+# Each page ranks offset + limit rows of every kind; paging stops this many
+# PAGINATION_MAX_LIMIT pages in
+MAX_PAGES = 10
+
+# kind: (table, title column, keyword columns, body column)
+SOURCES = {
+    'course': ('courses', 'name', ('ucas_code', 'faculty'), 'description'),
+    'event': ('events', 'title', ('presenter',), 'description'),
+    'faq': ('faqs', 'question', (), 'answer'),
+}
+
+# The FTS5 rowid encodes the kind and the row's id
+KIND_CODES = {'course': 1, 'event': 2, 'faq': 3}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+
+
+class SearchError(ValueError):
+    """Raised for a missing query or an unknown type; reported as a 400"""
+
+
+def search_terms(query):
+    """The words of a query, lower-cased; punctuation and operators are dropped"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _prefix(terms):
+    # Whether the last term is matched as a prefix; short ones would match nearly everything
+    return len(terms[-1]) >= MIN_PREFIX
+
+
+def hit_pattern(terms):
+    """
+    Matches a word of a snippet that is a hit for one of the terms.
+
+    Approximates the stemmer: 'computer' and 'computing' share a stem, so
+    all but a suffix's worth of each term is compared. This also covers
+    the last term matching as a prefix.
+    """
+    stems = sorted({term[:max(4, len(term) - 3)] for term in terms}, key=len, reverse=True)
+    return re.compile(r'\W*(?:' + '|'.join(map(re.escape, stems)) + ')', re.I)
+
+
+def snippet(body, pattern):
+    """Up to SNIPPET_WORDS words of body around its first hit, escaped and highlighted"""
+    if not body:
+        return None
+    words = body.split()
+    first = next((i for i, word in enumerate(words) if pattern.match(word)), 0)
+    start = max(0, min(first - 3, len(words) - SNIPPET_WORDS))
+    end = start + SNIPPET_WORDS
+
+    parts = [f'<mark>{html.escape(word)}</mark>' if pattern.match(word) else html.escape(word)
+             for word in words[start:end]]
+    return ('…' if start > 0 else '') + ' '.join(parts) + ('…' if end < len(words) else '')
+
+
+def _keywords(columns, row=''):
+    # The keyword columns as one SQL string expression
+    return " || ' ' || ".join(f"coalesce({row}{name}, '')" for name in columns) or "''"
+
+
+def _postgres_query(terms, kinds):
+    # Terms are \w+ only, so quoting them makes a valid tsquery
+    quoted = [f"'{term}'" for term in terms]
+    if _prefix(terms):
+        quoted[-1] += ':*'
+    # Each kind ranks all its matches and keeps only the best that can reach the page
+    parts = [
+        f"(SELECT '{kind}' AS kind, id, {title} AS title, {body} AS body, "
+        f"ts_rank_cd(search_vector, q.query) AS score "
+        f"FROM {table}, q WHERE search_vector @@ q.query ORDER BY score DESC, id LIMIT :top)"
+        for kind, (table, title, _, body) in SOURCES.items() if kind in kinds
+    ]
+    sql = f"""
+        WITH q AS (SELECT to_tsquery('{LANGUAGE}', :tsquery) AS query)
+        SELECT kind, id, title, body, score
+        FROM ({' UNION ALL '.join(parts)}) AS hits
+        ORDER BY score DESC, kind, id
+        LIMIT :limit OFFSET :offset
+    """
+    return text(sql), {'tsquery': ' & '.join(quoted)}
+
+
+def _sqlite_query(terms, kinds):
+    quoted = [f'"{term}"' for term in terms]
+    if _prefix(terms):
+        quoted[-1] += '*'
+    codes = ', '.join(str(KIND_CODES[kind]) for kind in kinds)
+    # bm25 is lower for better matches; column weights follow title, keywords, body.
+    # Title and body are read for the page only, not for every candidate.
+    sql = f"""
+        WITH hits AS (
+            SELECT rowid, -bm25(search_index, 10.0, 5.0, 1.0) AS score
+            FROM search_index
+            WHERE search_index MATCH :match AND rowid % 4 IN ({codes})
+            ORDER BY score DESC, rowid
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT hits.rowid % 4 AS kind, hits.rowid / 4 AS id, search_index.title, search_index.body, hits.score
+        FROM hits JOIN search_index ON search_index.rowid = hits.rowid
+        ORDER BY hits.score DESC, hits.rowid
+    """
+    return text(sql), {'match': ' '.join(quoted)}
+
+
+def search():
+    """
+    Run the search described by the request's `q`, `type`, `limit` and
+    `cursor`; returns the response body.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise SearchError('q is required')
+
+    kinds = KINDS
+    if request.args.get('type'):
+        kinds = tuple(kind.strip() for kind in request.args['type'].split(','))
+        unknown = set(kinds).difference(KINDS)
+        if unknown:
+            raise SearchError(f"type must be one of: {', '.join(KINDS)}")
+
+    limit = request.args.get('limit', current_app.config['PAGINATION_DEFAULT_LIMIT'], type=int)
+    if limit is None or limit < 1:
+        raise PaginationError('limit must be a positive integer')
+    limit = min(limit, current_app.config['PAGINATION_MAX_LIMIT'])
+
+    # Ranked results have no index order to resume from, so the cursor is an offset
+    offset = 0
+    max_offset = MAX_PAGES * current_app.config['PAGINATION_MAX_LIMIT']
+    if request.args.get('cursor'):
+        offset, = decode_cursor(request.args['cursor'], [column('offset', Integer)])
+        if offset is None or not 0 <= offset <= max_offset:
+            raise PaginationError('Invalid cursor')
+
+    terms = search_terms(query)
+    if not terms:
+        return {'results': [], 'next_cursor': None}
+
+    if db.engine.dialect.name == 'postgresql':
+        statement, params = _postgres_query(terms, kinds)
+    else:
+        statement, params = _sqlite_query(terms, kinds)
+    rows = db.session.execute(statement, {
+        **params,
+        'top': offset + limit + 1,
+        'limit': limit + 1,
+        'offset': offset,
+    }).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit <= max_offset:
+            next_cursor = encode_cursor([offset + limit])
+
+    pattern = hit_pattern(terms)
+
+    return {
+        'results': [{
+            'type': KIND_NAMES.get(row.kind, row.kind),
+            'id': row.id,
+            'title': row.title,
+            'snippet': snippet(row.body, pattern),
+            'score': round(row.score, 6),
+        } for row in rows],
+        'next_cursor': next_cursor,
+    }
+
+
+# ==================== SCHEMA ====================
+# Kept in step with migration c4d1e9a7b352 so create_all() databases can search too
+
+def postgres_search_vector(kind):
+    _, title, keywords, body = SOURCES[kind]
+    return (
+        f"setweight(to_tsvector('{LANGUAGE}', coalesce({title}, '')), 'A') || "
+        f"setweight(to_tsvector('{LANGUAGE}', {_keywords(keywords)}), 'B') || "
+        f"setweight(to_tsvector('{LANGUAGE}', coalesce({body}, '')), 'C')"
+    )
+
+
+def sqlite_triggers(kind):
+    table, title, keywords, body = SOURCES[kind]
+    code = KIND_CODES[kind]
+    insert = (f"INSERT INTO search_index (rowid, title, keywords, body) VALUES "
+              f"(new.id * 4 + {code}, new.{title}, {_keywords(keywords, 'new.')}, coalesce(new.{body}, ''))")
+    delete = f'DELETE FROM search_index WHERE rowid = old.id * 4 + {code}'
+    # Only edits to the indexed text reindex a row, not e.g. seat bookings
+    indexed = ', '.join((title, *keywords, body))
+    return [
+        f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN {insert}; END',
+        f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {indexed} ON {table} '
+        f'BEGIN {delete}; {insert}; END',
+        f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN {delete}; END',
+    ]
+
+
+SQLITE_INDEX = ("CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+                "USING fts5(title, keywords, body, tokenize='porter unicode61', prefix='3 4 5 6')")
+
+for _kind, _model in (('course', Course), ('event', Event), ('faq', FAQ)):
+    _table = SOURCES[_kind][0]
+    for _statement in (
+        f'ALTER TABLE {_table} ADD COLUMN search_vector tsvector '
+        f'GENERATED ALWAYS AS ({postgres_search_vector(_kind)}) STORED',
+        f'CREATE INDEX ix_{_table}_search_vector ON {_table} USING gin (search_vector)',
+    ):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+    event.listen(_model.__table__, 'after_create', DDL(SQLITE_INDEX).execute_if(dialect='sqlite'))
+    for _statement in sqlite_triggers(_kind):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
+event.listen(db.metadata, 'after_drop', DDL('DROP TABLE IF EXISTS search_index').execute_if(dialect='sqlite'))
@@ -0,0 +1,53 @@
+"""
+Response shapes for event listings.
+
+By default every event embeds its building and subject area. With
+`?shape=normalized` events carry `building_id` and `subject_area_id`
+instead, and the response side-loads each referenced building and subject
+area once, in `buildings` and `subject_areas` maps keyed by id:
+
+    {"events": [{"id": 7, "building_id": 2, "subject_area_id": 5, ...}],
+     "buildings": {"2": {...}}, "subject_areas": {"5": {...}}}
+"""
+from flask import request
+from sqlalchemy import inspect
+
+SHAPES = ('nested', 'normalized')
+
+
+class ShapeError(ValueError):
+    """Raised for an unknown ?shape=; reported as a 400"""
+
+
+def wants_normalized():
+    """Whether this request asked for the normalized shape"""
+    shape = request.args.get('shape', 'nested')
+    if shape not in SHAPES:
+        raise ShapeError(f"shape must be one of: {', '.join(SHAPES)}")
+    return shape == 'normalized'
+
+
+class SideLoader:
+    """
+    Collects the buildings and subject areas of events as they are serialized.
+
+    Works in one pass, so it can follow a streamed listing and report the
+    maps once the last event has gone out.
+    """
+
+    def __init__(self):
+        self.buildings = {}
+        self.subject_areas = {}
+
+    def add(self, event):
+        # A sparse fieldset (app/fields.py) may have left either one unloaded
+        unloaded = inspect(event).unloaded
+        if 'building' not in unloaded and event.building is not None \
+                and event.building_id not in self.buildings:
+            self.buildings[event.building_id] = event.building.to_dict()
+        if 'subject_area' not in unloaded and event.subject_area is not None \
+                and event.subject_area_id not in self.subject_areas:
+            self.subject_areas[event.subject_area_id] = event.subject_area.to_dict()
+
+    def payload(self):
+        return {'buildings': self.buildings, 'subject_areas': self.subject_areas}
@@ -0,0 +1,64 @@
+"""
+Idempotent inserts in a single INSERT ... ON CONFLICT statement.
+
+The unique constraint decides whether a row already exists, so there is
+no SELECT-then-INSERT window for concurrent requests to race through.
+Postgres and SQLite (3.35+) both support ON CONFLICT with RETURNING.
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _insert(model, values):
+    dialect = db.engine.dialect.name
+    if dialect not in _INSERTS:
+        raise NotImplementedError(f'ON CONFLICT inserts are not supported on {dialect}')
+    return _INSERTS[dialect](model).values(values)
+
+
+def insert_if_absent(model, values, conflict_columns):
+    """Insert a row unless one with the same conflict columns exists; returns the new object or None"""
+    statement = (
+        _insert(model, values)
+        .on_conflict_do_nothing(index_elements=conflict_columns)
+        .returning(model)
+    )
+    return db.session.scalars(statement).first()
+
+
+def insert_all_if_absent(model, rows, conflict_columns, returning):
+    """insert_if_absent for many rows in one multi-VALUES statement; returns `returning` of the rows inserted"""
+    if not rows:
+        return []
+    statement = (
+        _insert(model, rows)
+        .on_conflict_do_nothing(index_elements=conflict_columns)
+        .returning(returning)
+    )
+    return db.session.scalars(statement).all()
+
+
+def insert_or_get(model, values, conflict_columns):
+    """
+    Insert a row, or fetch the one already holding the conflict columns.
+
+    Returns (object, created). A conflict costs one extra SELECT. A no-op
+    ON CONFLICT DO UPDATE could return the existing row in the same
+    statement, but on Postgres it writes a new version of that row for
+    every duplicate, so duplicates would cost dead tuples and WAL. DO
+    NOTHING writes nothing. If the row is deleted between the INSERT and
+    the SELECT, the insert is tried again.
+    """
+    conditions = {column: values[column] for column in conflict_columns}
+    while True:
+        obj = insert_if_absent(model, values, conflict_columns)
+        if obj is not None:
+            return obj, True
+        existing = db.session.scalars(
+            select(model).filter_by(**conditions).execution_options(populate_existing=True)
+        ).first()
+        if existing is not None:
+            return existing, False
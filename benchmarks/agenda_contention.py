@@ -0,0 +1,107 @@
+"""
+Contention benchmark for agenda booking.
+
+Fires thousands of concurrent `POST /api/agenda/add/<id>` requests at one
+popular session with limited capacity and checks that it is never
+overbooked: exactly `capacity` adds succeed, every other one is told the
+event is full, and the maintained seat counter matches the agenda rows.
+
+    python -m benchmarks.agenda_contention --users 5000 --capacity 300
+    python -m benchmarks.agenda_contention --database-url postgresql://... --threads 64
+
+The target database is dropped and recreated, so point it at a scratch
+database. It defaults to a temporary SQLite file.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as dtime
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, func
+from app import create_app, db
+from app.models import User, OpenDay, Event, UserAgenda
+from benchmarks.common import make_config, percentile, scratch_database_url
+
+
+def seed(users, capacity):
+    # One precomputed hash; the benchmark never logs in
+    password_hash = '$2b$04$' + 'x' * 53
+    db.session.execute(insert(User), [
+        {'email': f'visitor{i}@example.com', 'password_hash': password_hash, 'full_name': f'Visitor {i}'}
+        for i in range(users)
+    ])
+    open_day = OpenDay(title='Launch Day', event_date=date.today(), start_time=dtime(9), end_time=dtime(17))
+    db.session.add(open_day)
+    db.session.flush()
+    event = Event(
+        open_day_id=open_day.id, title='Popular Session', event_type='Talk',
+        start_time=dtime(10), end_time=dtime(11), capacity=capacity
+    )
+    db.session.add(event)
+    db.session.commit()
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+    return event.id, [create_access_token(identity=str(user_id)) for user_id in user_ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--capacity', type=int, default=150)
+    parser.add_argument('--clicks', type=int, default=2, help='requests per user (repeat clicks)')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    database_url = args.database_url or scratch_database_url('contention')
+    app = create_app(make_config(database_url, args.threads, RESPONSE_CACHE_ENABLED=False))
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        event_id, tokens = seed(args.users, args.capacity)
+
+    client = app.test_client()
+    path = f'/api/agenda/add/{event_id}'
+
+    def add(token):
+        started = time.perf_counter()
+        response = client.post(path, headers={'Authorization': f'Bearer {token}'})
+        return response.status_code, time.perf_counter() - started
+
+    requests = [token for token in tokens for _ in range(args.clicks)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(add, requests))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _ in results)
+    latencies = [latency for _, latency in results]
+
+    with app.app_context():
+        seats_taken = db.session.get(Event, event_id).seats_taken
+        booked = db.session.query(func.count(UserAgenda.id)).filter(UserAgenda.event_id == event_id).scalar()
+
+    expected = min(args.users, args.capacity)
+    checks = {
+        'no overbooking': booked <= args.capacity,
+        'every seat sold': booked == expected,
+        'one 201 per seat': statuses[201] == expected,
+        'seat counter matches agenda rows': seats_taken == booked,
+        'no server errors': not any(status >= 500 for status in statuses),
+    }
+
+    print(f'{len(requests)} adds from {args.users} users, capacity {args.capacity}, {args.threads} threads')
+    print(f'statuses: {dict(sorted(statuses.items()))}')
+    print(f'throughput: {len(requests) / elapsed:.0f} req/s over {elapsed:.2f}s')
+    print(f'latency ms: p50 {percentile(latencies, 50) * 1000:.1f}  '
+          f'p95 {percentile(latencies, 95) * 1000:.1f}  p99 {percentile(latencies, 99) * 1000:.1f}')
+    for name, passed in checks.items():
+        print(f"{'ok' if passed else 'FAIL':4}  {name}")
+
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Shared setup for the benchmark scripts: configuration, seeding, statistics."""
+import os
+import random
+import subprocess
+import tempfile
+from datetime import date, time, timedelta
+from sqlalchemy import insert, update, bindparam
+from config import Config
+from app import db, password_hasher
+from app.models import (
+    User, OpenDay, Event, Building, SubjectArea,
+    Registration, UserAgenda, Course
+)
+
+BATCH_SIZE = 5000
+
+# Named scale factors; any field can be overridden on the command line
+SCALES = {
+    'small': {'users': 10, 'open_days': 2, 'events': 50, 'buildings': 4,
+              'subject_areas': 8, 'courses': 20, 'agenda_per_user': 3},
+    'medium': {'users': 1000, 'open_days': 5, 'events': 5000, 'buildings': 20,
+               'subject_areas': 20, 'courses': 500, 'agenda_per_user': 3},
+    'large': {'users': 100000, 'open_days': 20, 'events': 50000, 'buildings': 60,
+              'subject_areas': 40, 'courses': 5000, 'agenda_per_user': 3},
+}
+
+EVENT_TYPES = ('Talk', 'Workshop', 'Tour', 'Q&A')
+CAMPUSES = ('City Campus', 'Walsall Campus', 'Telford Campus')
+PASSWORD = 'Benchmark123!'
+
+
+def scratch_database_url(name):
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'{name}.db')
+
+
+def make_config(database_url, threads, **overrides):
+    """A Config subclass pointed at a scratch database and sized for `threads`"""
+    options = {}
+    if database_url.startswith('sqlite'):
+        # SQLite serializes writers; wait for the lock rather than failing
+        options['connect_args'] = {'timeout': 60, 'check_same_thread': False}
+    else:
+        options['pool_size'] = threads
+        options['max_overflow'] = 0
+
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': options,
+        'SERVER_TIMING_LOG': False,
+    }
+    attrs.update(overrides)
+    return type('BenchConfig', (Config,), attrs)
+
+
+def _insert_batched(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed(scale, rng=None, password_hash=None):
+    """
+    Fill an empty database at the given scale with bulk inserts.
+
+    Every user shares one password hash (for PASSWORD) so seeding 100k
+    users does not mean 100k bcrypt runs, while logins still pay the real
+    verification cost.
+    """
+    rng = rng or random.Random(0)
+    password_hash = password_hash or password_hasher.hash(PASSWORD)
+    now = date.today()
+
+    _insert_batched(SubjectArea, [
+        {'name': f'Subject {i}', 'description': f'Courses in subject {i}'}
+        for i in range(scale['subject_areas'])
+    ])
+    _insert_batched(Building, [
+        {'name': f'Building {i}', 'code': f'B{i}', 'description': 'Lecture theatres and labs ' * 8,
+         'campus': CAMPUSES[i % len(CAMPUSES)],
+         'latitude': 52.58 + rng.uniform(-0.01, 0.01), 'longitude': -2.12 + rng.uniform(-0.01, 0.01)}
+        for i in range(scale['buildings'])
+    ])
+    _insert_batched(OpenDay, [
+        {'title': f'Open Day {i}', 'description': 'Come and see the campus',
+         'event_date': now + timedelta(days=7 * (i + 1)),
+         'start_time': time(9), 'end_time': time(17), 'location': CAMPUSES[i % len(CAMPUSES)]}
+        for i in range(scale['open_days'])
+    ])
+    _insert_batched(Course, [
+        {'name': f'Course {i}', 'description': 'A course description ' * 10,
+         'subject_area_id': rng.randint(1, scale['subject_areas']),
+         'faculty': f'Faculty {i % 5}', 'duration': '3 years', 'ucas_code': f'U{i:04d}', 'level': 'Undergraduate'}
+        for i in range(scale['courses'])
+    ])
+
+    events = []
+    for i in range(scale['events']):
+        start = rng.randint(9 * 4, 16 * 4 - 1)
+        length = rng.choice((2, 3, 4))
+        events.append({
+            'open_day_id': rng.randint(1, scale['open_days']),
+            'title': f'Session {i}', 'description': 'What this session covers ' * 6,
+            'event_type': rng.choice(EVENT_TYPES),
+            'start_time': time(start // 4, start % 4 * 15),
+            'end_time': time((start + length) // 4, (start + length) % 4 * 15),
+            'building_id': rng.randint(1, scale['buildings']), 'room': f'R{i % 50}',
+            'capacity': rng.choice((None, 30, 60, 120)),
+            'subject_area_id': rng.randint(1, scale['subject_areas']),
+            'presenter': f'Presenter {i % 200}', 'seats_taken': 0,
+        })
+    _insert_batched(Event, events)
+
+    _insert_batched(User, [
+        {'email': f'user{i}@example.com', 'password_hash': password_hash, 'full_name': f'User {i}'}
+        for i in range(scale['users'])
+    ])
+
+    registrations, agenda, seats = [], [], {}
+    for user_id in range(1, scale['users'] + 1):
+        registrations.append({'user_id': user_id, 'open_day_id': rng.randint(1, scale['open_days']),
+                              'interest_area': rng.randint(1, scale['subject_areas'])})
+        for event_id in rng.sample(range(1, scale['events'] + 1), min(scale['agenda_per_user'], scale['events'])):
+            capacity = events[event_id - 1]['capacity']
+            if capacity is not None and seats.get(event_id, 0) >= capacity:
+                continue
+            agenda.append({'user_id': user_id, 'event_id': event_id})
+            seats[event_id] = seats.get(event_id, 0) + 1
+    _insert_batched(Registration, registrations)
+    _insert_batched(UserAgenda, agenda)
+
+    # Keep the maintained seat counter consistent with the seeded agendas
+    events_table = Event.__table__
+    if seats:
+        db.session.connection().execute(
+            update(events_table)
+            .where(events_table.c.id == bindparam('event_id'))
+            .values(seats_taken=bindparam('taken')),
+            [{'event_id': event_id, 'taken': taken} for event_id, taken in seats.items()]
+        )
+    db.session.commit()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,122 @@
+"""
+Peak memory and time of large list exports, buffered versus streamed.
+
+Seeds a scratch database with 50k events and 50k registrations, then
+fetches two unpaginated exports under each encoder configuration:
+
+    GET /api/events                  (LEGACY_UNPAGINATED_LISTS: every event)
+    GET /api/registrations/export    (admin: every registration)
+
+The configurations are:
+
+    buffered/stdlib   .all() + jsonify with the stdlib encoder (the old path)
+    buffered/orjson   .all() + jsonify with orjson
+    streamed/stdlib   yield_per + chunked encoding with the stdlib encoder
+    streamed/orjson   yield_per + chunked encoding with orjson
+
+Each measurement runs in a fresh subprocess, because peak RSS only ever
+grows within a process. The body is consumed chunk by chunk, as a WSGI
+server would send it, and the peak RSS growth over the warmed-up
+baseline is reported.
+
+    python -m benchmarks.json_export
+    python -m benchmarks.json_export --rows 100000 --database-url postgresql://localhost/wlv_bench
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+from app import create_app, db
+from app.auth import create_tokens
+from app.encoding import orjson
+from app.models import User
+from benchmarks.common import make_config, seed, scratch_database_url
+
+EXPORTS = ('/api/events', '/api/registrations/export')
+VARIANTS = {
+    'buffered/stdlib': {'JSON_STREAM_LISTS': False, 'JSON_BACKEND': 'stdlib'},
+    'buffered/orjson': {'JSON_STREAM_LISTS': False, 'JSON_BACKEND': 'orjson'},
+    'streamed/stdlib': {'JSON_STREAM_LISTS': True, 'JSON_BACKEND': 'stdlib'},
+    'streamed/orjson': {'JSON_STREAM_LISTS': True, 'JSON_BACKEND': 'orjson'},
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(database_url, variant, path):
+    """Run in the child process: fetch one export and report time and memory"""
+    config = make_config(database_url, 1, RESPONSE_CACHE_ENABLED=False, LEGACY_UNPAGINATED_LISTS=True,
+                         **VARIANTS[variant])
+    app = create_app(config)
+    client = app.test_client()
+
+    with app.app_context():
+        token, _ = create_tokens(db.session.get(User, 1))
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # Warm up imports, pools and the role-version cache before the baseline
+    client.get('/api/events?limit=1', headers=headers).get_data()
+    baseline = peak_rss_mb()
+
+    started = time.perf_counter()
+    response = client.get(path, headers=headers)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - started
+
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} returned {response.status_code}')
+    return {'seconds': elapsed, 'rss_growth_mb': peak_rss_mb() - baseline, 'bytes': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--rows', type=int, default=50000, help='events and registrations to export')
+    parser.add_argument('--child', nargs=2, metavar=('VARIANT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.database_url, *args.child)))
+        return 0
+
+    database_url = args.database_url or scratch_database_url('export')
+    app = create_app(make_config(database_url, 1))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # One registration per user, so --rows users give --rows registrations
+        seed({'users': args.rows, 'open_days': 10, 'events': args.rows, 'buildings': 20,
+              'subject_areas': 20, 'courses': 10, 'agenda_per_user': 0}, random.Random(0))
+        db.session.get(User, 1).is_admin = True
+        db.session.commit()
+
+    variants = [name for name in VARIANTS if orjson is not None or not name.endswith('orjson')]
+    if orjson is None:
+        print('orjson is not installed; only the stdlib variants are measured')
+
+    print(f"{'export':28} {'variant':16} {'seconds':>8} {'peak RSS +MB':>13} {'body MB':>8}")
+    for path in EXPORTS:
+        for variant in variants:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.json_export', '--database-url', database_url,
+                 '--child', variant, path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            print(f"{path:28} {variant:16} {stats['seconds']:>8.2f} {stats['rss_growth_mb']:>13.1f} "
+                  f"{stats['bytes'] / 1e6:>8.1f}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Idle capacity and fan-out latency of GET /api/opendays/<id>/stream.
+
+Serves the app from a threaded server in this process, opens
+--connections event streams to one open day from a single client thread,
+then publishes --messages updates and measures how long each takes to
+reach every stream:
+
+    connect     time to open all the streams
+    delivery    publish-to-receipt latency over every stream and message
+
+Reports the median, 95th percentile and worst delivery against the 1s
+target, and checks that every stream saw every message.
+
+    python -m benchmarks.live_streams
+    python -m benchmarks.live_streams --connections 5000 --messages 20
+"""
+import argparse
+import selectors
+import socket
+import sys
+import threading
+import time as clock
+from datetime import date, time
+from werkzeug.serving import make_server
+from app import create_app, db, live
+from app.models import OpenDay
+from benchmarks.common import make_config, percentile, scratch_database_url
+
+TARGET_MS = 1000
+
+
+def open_streams(port, count, path):
+    request = f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n'.encode()
+    streams = []
+    for _ in range(count):
+        connection = socket.create_connection(('127.0.0.1', port))
+        connection.sendall(request)
+        connection.setblocking(False)
+        streams.append(connection)
+    return streams
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=10)
+    args = parser.parse_args()
+
+    database_url = args.database_url or scratch_database_url('live')
+    app = create_app(make_config(database_url, 4, LIVE_MAX_CONNECTIONS=args.connections, LIVE_HEARTBEAT=5))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        open_day = OpenDay(title='Launch Day', event_date=date.today(), start_time=time(9), end_time=time(17))
+        db.session.add(open_day)
+        db.session.commit()
+        open_day_id = open_day.id
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    started = clock.perf_counter()
+    streams = open_streams(server.server_port, args.connections, f'/api/opendays/{open_day_id}/stream')
+    while live.broker.connections < args.connections:
+        clock.sleep(0.01)
+    print(f'{args.connections} streams open in {(clock.perf_counter() - started) * 1000:.0f}ms')
+
+    selector = selectors.DefaultSelector()
+    for stream in streams:
+        selector.register(stream, selectors.EVENT_READ, bytearray())
+
+    latencies = []
+    received = 0
+    for number in range(args.messages):
+        sent_at = clock.perf_counter()
+        with app.app_context():
+            live.publish(open_day_id, 'benchmark', {'number': number})
+            db.session.commit()
+
+        marker = f'"number": {number}}}'.encode()
+        waiting = set(streams)
+        deadline = sent_at + 10
+        while waiting and clock.perf_counter() < deadline:
+            for key, _ in selector.select(timeout=1):
+                buffer = key.data
+                buffer += key.fileobj.recv(65536)
+                if key.fileobj in waiting and marker in buffer:
+                    waiting.discard(key.fileobj)
+                    latencies.append((clock.perf_counter() - sent_at) * 1000)
+                    del buffer[:]
+        received += len(streams) - len(waiting)
+
+    for stream in streams:
+        stream.close()
+    server.shutdown()
+
+    expected = args.connections * args.messages
+    worst = max(latencies) if latencies else float('inf')
+    print(f"delivery p50 {percentile(latencies, 50):.1f}ms  p95 {percentile(latencies, 95):.1f}ms  "
+          f"max {worst:.1f}ms; target {TARGET_MS}ms: {'ok' if worst <= TARGET_MS else 'MISSED'}")
+    print(f"delivered {received}/{expected}: {'ok' if received == expected else 'MISSED'}")
+    return 0 if received == expected else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Load test for the API.
+
+Boots create_app() against a scratch database and seeds it at a named
+scale. It then drives a weighted mix of visitor sessions through the
+api_bp routes from a pool of threads:
+
+    browse  - open day list and detail, event listing, subject areas
+    filter  - events by type and subject, buildings by campus, courses
+    agenda  - add a session, view the agenda, sometimes remove one
+    login   - password login (pays the real bcrypt cost)
+
+The report gives throughput and p50/p95/p99 latency per route. It is also
+written as JSON so runs can be compared across commits:
+
+    python -m benchmarks.loadtest --scale medium --duration 30
+    python -m benchmarks.loadtest --scale large --database-url postgresql://localhost/wlv_bench \\
+        --output results/large.json
+
+The target database is dropped and recreated, so point it at a scratch
+database. It defaults to a temporary SQLite file.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models import OpenDay
+from benchmarks.common import SCALES, CAMPUSES, EVENT_TYPES, PASSWORD, make_config, seed, percentile, git_commit, scratch_database_url
+
+# Scenario weights in the mix
+MIX = {'browse': 40, 'filter': 25, 'agenda': 25, 'login': 10}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, status, latency):
+        with self._lock:
+            self.samples[route].append(latency)
+            if status >= 500:
+                self.errors[route] += 1
+
+
+class Visitor:
+    """One simulated visitor session driving the test client"""
+
+    def __init__(self, client, recorder, rng, world):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.world = world
+        self.user = rng.randrange(world['users'])
+        self.headers = {'Authorization': f"Bearer {world['tokens'][self.user % len(world['tokens'])]}"}
+
+    def call(self, route, method, url, **kwargs):
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        response.get_data()
+        self.recorder.record(route, response.status_code, time.perf_counter() - started)
+        return response
+
+    def open_day(self):
+        return self.rng.choice(self.world['open_day_ids'])
+
+    def browse(self):
+        open_day_id = self.open_day()
+        self.call('GET /opendays', 'GET', '/api/opendays')
+        self.call('GET /opendays/<id>', 'GET', f'/api/opendays/{open_day_id}')
+        self.call('GET /events?open_day_id', 'GET', f'/api/events?open_day_id={open_day_id}')
+        self.call('GET /courses/subject-areas', 'GET', '/api/courses/subject-areas')
+
+    def filter(self):
+        open_day_id = self.open_day()
+        event_type = self.rng.choice(EVENT_TYPES)
+        subject = self.rng.randint(1, self.world['subject_areas'])
+        self.call('GET /events?filters', 'GET',
+                  f'/api/events?open_day_id={open_day_id}&event_type={event_type}&subject_area_id={subject}')
+        self.call('GET /maps/buildings?campus', 'GET', f'/api/maps/buildings?campus={self.rng.choice(CAMPUSES)}')
+        self.call('GET /courses?subject_area_id', 'GET', f'/api/courses?subject_area_id={subject}')
+
+    def agenda(self):
+        event_id = self.rng.randint(1, self.world['events'])
+        self.call('POST /agenda/add/<id>', 'POST', f'/api/agenda/add/{event_id}', headers=self.headers)
+        self.call('GET /agenda', 'GET', '/api/agenda', headers=self.headers)
+        if self.rng.random() < 0.3:
+            self.call('DELETE /agenda/remove/<id>', 'DELETE', f'/api/agenda/remove/{event_id}', headers=self.headers)
+
+    def login(self):
+        self.call('POST /auth/login', 'POST', '/api/auth/login',
+                  json={'email': f'user{self.user}@example.com', 'password': PASSWORD})
+
+
+def run(app, world, threads, duration, seed_value):
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    scenarios, weights = zip(*MIX.items())
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            visitor = Visitor(client, recorder, rng, world)
+            getattr(visitor, rng.choices(scenarios, weights)[0])()
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route, samples in sorted(recorder.samples.items()):
+        routes[route] = {
+            'requests': len(samples),
+            'errors': recorder.errors[route],
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        }
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return routes, {'requests': total, 'throughput_rps': round(total / elapsed, 1), 'elapsed_s': round(elapsed, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    for field in SCALES['small']:
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, help=f'override the scale\'s {field}')
+    parser.add_argument('--database-url')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-cache', action='store_true', help='disable the public response cache')
+    parser.add_argument('--output', default='loadtest.json')
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    for field in scale:
+        if getattr(args, field) is not None:
+            scale[field] = getattr(args, field)
+
+    database_url = args.database_url or scratch_database_url('loadtest')
+    app = create_app(make_config(database_url, args.threads, RESPONSE_CACHE_ENABLED=not args.no_cache))
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seeding_started = time.perf_counter()
+        seed(scale, random.Random(args.seed))
+        seeding_time = time.perf_counter() - seeding_started
+        world = dict(scale)
+        world['open_day_ids'] = [open_day_id for (open_day_id,) in db.session.query(OpenDay.id)]
+        world['tokens'] = [create_access_token(identity=str(i + 1)) for i in range(min(scale['users'], 1000))]
+
+    print(f"seeded {args.scale} scale in {seeding_time:.1f}s: "
+          + ', '.join(f'{k}={v}' for k, v in scale.items()))
+
+    recorder, elapsed = run(app, world, args.threads, args.duration, args.seed)
+    routes, total = summarize(recorder, elapsed)
+
+    print(f"\n{'route':32} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in routes.items():
+        print(f"{route:32} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    print(f"\ntotal {total['requests']} requests, {total['throughput_rps']} req/s over {total['elapsed_s']}s")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'database': database_url.split(':', 1)[0],
+            'scale_name': args.scale,
+            'scale': scale,
+            'threads': args.threads,
+            'duration_s': args.duration,
+            'response_cache': not args.no_cache,
+            'mix': MIX,
+            'seed_s': round(seeding_time, 2),
+        },
+        'total': total,
+        'routes': routes,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f'wrote {args.output}')
+
+    return 1 if any(stats['errors'] for stats in routes.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Notification fan-out to a large audience.
+
+Seeds --users registrants for one open day, a share of whom also hold one
+of its events in their agenda, then sends notifications about that event
+through `POST /api/notifications` to each audience. The request only
+queues the delivery, so it reports how long the request took and then how
+long the queued fan-out job took to run. Afterwards it times the per-user
+reads:
+
+    GET /api/notifications/unread-count
+    GET /api/notifications?limit=20
+    POST /api/notifications/read-all
+
+and checks that every user's maintained unread counter equals the number
+of their unread deliveries.
+
+    python -m benchmarks.notifications
+    python -m benchmarks.notifications --users 100000 --database-url postgresql://localhost/wlv_bench
+"""
+import argparse
+import random
+import sys
+import time as clock
+from datetime import date, time
+from sqlalchemy import func, insert
+from app import create_app, db, jobs
+from app.auth import create_tokens
+from app.models import Event, OpenDay, Registration, User, UserAgenda, UserNotification
+from benchmarks.common import BATCH_SIZE, make_config, percentile, scratch_database_url
+
+AUDIENCES = ('agenda', 'registrants', 'both')
+
+
+def seed(users, agenda_share, rng):
+    # One precomputed hash; the benchmark never logs in
+    password_hash = '$2b$04$' + 'x' * 53
+    rows = [{'email': f'visitor{i}@example.com', 'password_hash': password_hash, 'full_name': f'Visitor {i}'}
+            for i in range(users)]
+    rows.append({'email': 'admin@example.com', 'password_hash': password_hash, 'full_name': 'Admin', 'is_admin': True})
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(User), rows[start:start + BATCH_SIZE])
+
+    open_day = OpenDay(title='Launch Day', event_date=date.today(), start_time=time(9), end_time=time(17))
+    db.session.add(open_day)
+    db.session.flush()
+    event = Event(open_day_id=open_day.id, title='Keynote', event_type='Talk', start_time=time(10), end_time=time(11))
+    db.session.add(event)
+    db.session.flush()
+
+    registrations = [{'user_id': user_id, 'open_day_id': open_day.id} for user_id in range(1, users + 1)]
+    agenda = [{'user_id': user_id, 'event_id': event.id}
+              for user_id in range(1, users + 1) if rng.random() < agenda_share]
+    for model, values in ((Registration, registrations), (UserAgenda, agenda)):
+        for start in range(0, len(values), BATCH_SIZE):
+            db.session.execute(insert(model), values[start:start + BATCH_SIZE])
+    db.session.commit()
+    return event.id, len(agenda)
+
+
+def timed(call):
+    started = clock.perf_counter()
+    response = call()
+    elapsed = (clock.perf_counter() - started) * 1000
+    if response.status_code not in (200, 201, 202):
+        raise RuntimeError(f'{response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--agenda-share', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    database_url = args.database_url or scratch_database_url('notifications')
+    app = create_app(make_config(database_url, 1, RESPONSE_CACHE_ENABLED=False))
+    rng = random.Random(0)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        event_id, holders = seed(args.users, args.agenda_share, rng)
+        if database_url.startswith('postgresql'):
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        admin = User.query.filter_by(email='admin@example.com').one()
+        admin_headers = {'Authorization': f'Bearer {create_tokens(admin)[0]}'}
+        user_headers = [{'Authorization': f'Bearer {create_tokens(user)[0]}'}
+                        for user in User.query.filter(User.id <= args.users).order_by(func.random()).limit(50)]
+
+    client = app.test_client()
+    print(f'{args.users} registrants, {holders} agenda holders')
+    print(f"{'fan-out to':12} {'delivered':>10} {'request':>10} {'job':>10}")
+    for audience in AUDIENCES:
+        response, elapsed = timed(lambda: client.post('/api/notifications', headers=admin_headers, json={
+            'title': 'Room change', 'message': 'The keynote has moved to the main hall',
+            'related_event_id': event_id, 'audience': audience,
+        }))
+        notification_id = response.get_json()['notification']['id']
+        with app.app_context():
+            started = clock.perf_counter()
+            jobs.work_until_empty('benchmark')
+            job_elapsed = (clock.perf_counter() - started) * 1000
+            delivered = UserNotification.query.filter_by(notification_id=notification_id).count()
+        print(f"{audience:12} {delivered:>10} {elapsed:>8.1f}ms {job_elapsed:>8.1f}ms")
+
+    print(f"{'read':34} {'p50':>8} {'p95':>8}")
+    for label, call in (
+        ('GET /api/notifications/unread-count', lambda h: client.get('/api/notifications/unread-count', headers=h)),
+        ('GET /api/notifications?limit=20', lambda h: client.get('/api/notifications?limit=20', headers=h)),
+    ):
+        samples = [timed(lambda: call(rng.choice(user_headers)))[1] for _ in range(args.repeat)]
+        print(f'{label:34} {percentile(samples, 50):>6.2f}ms {percentile(samples, 95):>6.2f}ms')
+    samples = [timed(lambda: client.post('/api/notifications/read-all', headers=headers))[1] for headers in user_headers]
+    print(f"{'POST /api/notifications/read-all':34} {percentile(samples, 50):>6.2f}ms {percentile(samples, 95):>6.2f}ms")
+
+    with app.app_context():
+        unread = dict(db.session.query(UserNotification.user_id, func.count())
+                      .filter(UserNotification.is_read.is_(False)).group_by(UserNotification.user_id))
+        drift = sum(1 for user_id, counter in db.session.query(User.id, User.unread_notifications)
+                    if counter != unread.get(user_id, 0))
+    print(f"unread counters: {'ok' if not drift else f'{drift} users out of step'}")
+    return 1 if drift else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
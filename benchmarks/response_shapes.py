@@ -0,0 +1,114 @@
+"""
+Compare the nested and normalized response shapes for event listings.
+
+Seeds a scratch database, then requests the same listings with and without
+`?shape=normalized`, with the response cache off:
+
+    GET /api/events?open_day_id=<busiest open day>
+    GET /api/events
+    GET /api/agenda                      (a visitor with a full agenda)
+
+For each listing and shape it reports the payload size, raw and gzipped,
+and the median serialize, json and total times. The times come from the
+Server-Timing header (app/instrumentation.py).
+
+    python -m benchmarks.response_shapes --scale medium --repeat 20
+    python -m benchmarks.response_shapes --scale large --database-url postgresql://localhost/wlv_bench
+"""
+import argparse
+import gzip
+import random
+import statistics
+import sys
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func
+from app import create_app, db
+from app.models import Event, UserAgenda
+from benchmarks.common import SCALES, make_config, seed, scratch_database_url
+
+SHAPES = ('nested', 'normalized')
+
+
+def server_timing(header):
+    """{'serialize': ms, 'json': ms, ...} from a Server-Timing header"""
+    timings = {}
+    for metric in header.split(','):
+        name, *params = [part.strip() for part in metric.split(';')]
+        for param in params:
+            if param.startswith('dur='):
+                timings[name] = float(param[4:])
+    return timings
+
+
+def measure(client, path, headers, repeat):
+    samples, body = [], b''
+    for _ in range(repeat):
+        response = client.get(path, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+        body = response.get_data()
+        samples.append(server_timing(response.headers['Server-Timing']))
+    return {
+        'bytes': len(body),
+        'gzip_bytes': len(gzip.compress(body)),
+        **{name: statistics.median(sample[name] for sample in samples) for name in ('serialize', 'json', 'total')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='medium')
+    parser.add_argument('--database-url')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--agenda-size', type=int, default=40, help='events on the measured visitor\'s agenda')
+    args = parser.parse_args()
+
+    database_url = args.database_url or scratch_database_url('shapes')
+    # Buffered lists, so that Server-Timing covers serialization and encoding
+    app = create_app(make_config(database_url, 1, RESPONSE_CACHE_ENABLED=False, JSON_STREAM_LISTS=False))
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(SCALES[args.scale], random.Random(0))
+        busiest = (
+            db.session.query(Event.open_day_id)
+            .group_by(Event.open_day_id)
+            .order_by(func.count().desc())
+            .limit(1)
+            .scalar()
+        )
+        # Give visitor 1 a long agenda so the agenda listing is worth measuring
+        taken = {event_id for (event_id,) in db.session.query(UserAgenda.event_id).filter(UserAgenda.user_id == 1)}
+        extra = [event_id for event_id in range(1, args.agenda_size + 1) if event_id not in taken]
+        db.session.add_all([UserAgenda(user_id=1, event_id=event_id) for event_id in extra])
+        db.session.commit()
+        token = create_access_token(identity='1')
+
+    listings = [
+        (f'/api/events?open_day_id={busiest}', {}),
+        ('/api/events', {}),
+        ('/api/agenda', {'Authorization': f'Bearer {token}'}),
+    ]
+    client = app.test_client()
+
+    print(f"{'listing':34} {'shape':11} {'bytes':>10} {'gzip':>9} {'serialize':>10} {'json':>8} {'total':>8}")
+    for path, headers in listings:
+        results = {}
+        for shape in SHAPES:
+            url = path + ('&' if '?' in path else '?') + f'shape={shape}'
+            results[shape] = measure(client, url, headers, args.repeat)
+            stats = results[shape]
+            print(f"{path:34} {shape:11} {stats['bytes']:>10} {stats['gzip_bytes']:>9} "
+                  f"{stats['serialize']:>8.2f}ms {stats['json']:>6.2f}ms {stats['total']:>6.2f}ms")
+        nested, normalized = results['nested'], results['normalized']
+        print(f"{'':34} {'saving':11} {1 - normalized['bytes'] / nested['bytes']:>10.0%} "
+              f"{1 - normalized['gzip_bytes'] / nested['gzip_bytes']:>9.0%} "
+              f"{1 - normalized['serialize'] / nested['serialize']:>10.0%} "
+              f"{1 - normalized['json'] / nested['json']:>8.0%} {1 - normalized['total'] / nested['total']:>8.0%}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
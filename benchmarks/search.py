@@ -0,0 +1,124 @@
+"""
+Latency of GET /api/search on a large corpus.
+
+Seeds a scratch database with --rows courses, events and FAQs (10/60/30)
+whose text is drawn from a Zipf-distributed vocabulary, so some words are
+in most rows and others in a handful, then runs a mix of queries with the
+response cache off:
+
+    common word, rare word, two words, a prefix as typed, no match,
+    each with the default page size and filtered to one type
+
+and reports the median and 95th percentile request time against the
+20ms target. It also checks that an event titled exactly "Campus Tour",
+added after the rest of the corpus, comes first for `campus tour`, even
+though both words are in most rows.
+
+    python -m benchmarks.search
+    python -m benchmarks.search --rows 100000 --database-url postgresql://localhost/wlv_bench
+"""
+import argparse
+import random
+import sys
+import time as clock
+from datetime import time
+from sqlalchemy import insert
+from app import create_app, db
+from app.models import Course, Event, FAQ
+from benchmarks.common import BATCH_SIZE, EVENT_TYPES, make_config, percentile, scratch_database_url
+
+TARGET_MS = 20
+VOCABULARY = [
+    'computing', 'nursing', 'engineering', 'business', 'design', 'psychology', 'law', 'music',
+    'biology', 'chemistry', 'physics', 'history', 'education', 'pharmacy', 'sport', 'media',
+    'campus', 'student', 'course', 'lecture', 'workshop', 'tour', 'library', 'placement',
+    'research', 'project', 'laboratory', 'studio', 'finance', 'accommodation', 'parking', 'career',
+]
+FILLER = ['the', 'and', 'with', 'for', 'our', 'about', 'learn', 'how', 'you', 'will', 'explore', 'meet']
+
+QUERIES = [
+    'campus',                # in most rows
+    'accommodation',         # in a few percent
+    'nursing placement',
+    'engin',                 # prefix, as typed
+    'astrophysics',          # no match
+    'psychology research&type=course',
+    'parking&type=faq',
+]
+
+
+def sentence(rng, words):
+    vocabulary = rng.choices(VOCABULARY, weights=[1 / (rank + 1) for rank in range(len(VOCABULARY))], k=words)
+    return ' '.join(word if rng.random() < 0.6 else f'{rng.choice(FILLER)} {word}' for word in vocabulary)
+
+
+def seed_corpus(rows, rng):
+    tables = {
+        Course: [
+            {'name': sentence(rng, 3).title(), 'description': sentence(rng, 40),
+             'faculty': f'Faculty of {rng.choice(VOCABULARY).title()}', 'ucas_code': f'U{i:05d}'}
+            for i in range(rows // 10)
+        ],
+        Event: [
+            {'title': sentence(rng, 4).capitalize(), 'description': sentence(rng, 30),
+             'event_type': rng.choice(EVENT_TYPES), 'start_time': time(10), 'end_time': time(11),
+             'presenter': f'Presenter {i % 500}', 'seats_taken': 0}
+            for i in range(rows * 6 // 10)
+        ],
+        FAQ: [
+            {'question': sentence(rng, 8).capitalize() + '?', 'answer': sentence(rng, 25)}
+            for _ in range(rows * 3 // 10)
+        ],
+    }
+    for model, values in tables.items():
+        for start in range(0, len(values), BATCH_SIZE):
+            db.session.execute(insert(model), values[start:start + BATCH_SIZE])
+    exact = Event(title='Campus Tour', event_type='Tour', start_time=time(10), end_time=time(11), seats_taken=0)
+    db.session.add(exact)
+    db.session.commit()
+    return exact.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    database_url = args.database_url or scratch_database_url('search')
+    app = create_app(make_config(database_url, 1, RESPONSE_CACHE_ENABLED=False))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        exact_id = seed_corpus(args.rows, random.Random(0))
+        if database_url.startswith('postgresql'):
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+    client = app.test_client()
+    print(f"{'query':34} {'hits':>5} {'p50':>8} {'p95':>8}")
+    worst = 0
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = clock.perf_counter()
+            response = client.get(f'/api/search?q={query}')
+            body = response.get_json()
+            samples.append((clock.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'{query} returned {response.status_code}')
+        p95 = percentile(samples, 95)
+        worst = max(worst, p95)
+        print(f"{query:34} {len(body['results']):>5} {percentile(samples, 50):>6.2f}ms {p95:>6.2f}ms")
+
+    print(f"worst p95 {worst:.2f}ms; target {TARGET_MS}ms: {'ok' if worst <= TARGET_MS else 'MISSED'}")
+
+    top = client.get('/api/search?q=campus tour&limit=1').get_json()['results']
+    found = bool(top) and (top[0]['type'], top[0]['id']) == ('event', exact_id)
+    print(f"exact title match ranked first: {'ok' if found else 'MISSED'}")
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
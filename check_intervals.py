@@ -0,0 +1,62 @@
+"""
+Interval index regression check (app/intervals.py).
+
+Compares IntervalIndex.overlapping with a brute-force scan, over random
+days of every size up to 300 events and over the shapes that once lost
+hits: n-1 short morning events and one late event, where the late one
+sits in a partly filled right subtree. It fails on any difference.
+
+    python check_intervals.py
+"""
+import random
+import sys
+from app.intervals import DAY_MINUTES, IntervalIndex
+
+QUERIES = 200
+# Sizes at which a late event in a partly filled subtree was once missed
+LATE_EVENT_SIZES = [42, 74, 82, 84, 86, 90, 106, 138]
+
+
+def brute_force(intervals, start, end):
+    return [event_id for s, e, event_id in sorted(intervals) if s < end and e > start]
+
+
+def mismatches(intervals, windows):
+    index = IntervalIndex(intervals)
+    return sum(index.overlapping(start, end) != brute_force(intervals, start, end) for start, end in windows)
+
+
+def random_windows(rng):
+    windows = []
+    for _ in range(QUERIES):
+        start = rng.randrange(0, DAY_MINUTES - 1)
+        windows.append((start, rng.randrange(start + 1, min(start + 240, DAY_MINUTES) + 1)))
+    return windows
+
+
+def main():
+    rng = random.Random(0)
+    failed = False
+
+    random_misses = 0
+    for n in list(range(301)) + [512, 1000, 1023, 1024, 1025]:
+        intervals = []
+        for event_id in range(n):
+            start = rng.randrange(0, DAY_MINUTES - 1)
+            intervals.append((start, min(start + rng.randrange(1, 240), DAY_MINUTES), event_id))
+        random_misses += mismatches(intervals, random_windows(rng))
+    failed = failed or random_misses > 0
+    print(f"{'ok' if not random_misses else 'FAIL':4}  {'random days, 0-300 and 512-1025 events':44} {random_misses} wrong answers")
+
+    for n in LATE_EVENT_SIZES:
+        intervals = [(9 * 60 + i % 60, 9 * 60 + i % 60 + 30, i) for i in range(n - 1)]
+        intervals.append((16 * 60, 16 * 60 + 30, n - 1))
+        misses = mismatches(intervals, [(16 * 60 + 10, 16 * 60 + 20), (16 * 60, 16 * 60 + 15)] + random_windows(rng))
+        failed = failed or misses > 0
+        print(f"{'ok' if not misses else 'FAIL':4}  {f'{n - 1} morning events and one at 16:00':44} {misses} wrong answers")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
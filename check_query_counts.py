@@ -0,0 +1,133 @@
+"""
+Query-count regression check for the list endpoints.
+
+Seeds a throwaway SQLite database at two sizes and requests every list
+endpoint against each. The number of SQL statements an endpoint issues must
+not depend on how many rows it returns; if it does, a serializer is lazily
+loading a relationship that its loading profile in app/loading.py misses.
+
+    python check_query_counts.py
+"""
+import sys
+from datetime import date, time, timedelta
+from flask_jwt_extended import create_access_token
+from config import Config
+from app import create_app, db
+from app.models import (
+    User, OpenDay, Event, Building, SubjectArea,
+    Registration, UserAgenda, Course
+)
+from app.instrumentation import count_queries
+from app.auth import role_versions
+
+SMALL, LARGE = 3, 200
+
+# (path, needs a JWT)
+ENDPOINTS = [
+    ('/api/opendays', False),
+    ('/api/events', False),
+    ('/api/events?open_day_id=1', False),
+    ('/api/events?limit=100', False),
+    ('/api/events?fields=id,title,building', False),
+    ('/api/events?open_day_id=1&from=10:00&to=12:00', False),
+    ('/api/courses', False),
+    ('/api/courses?fields=name,subject_area', False),
+    ('/api/courses/subject-areas', False),
+    ('/api/maps/buildings', False),
+    ('/api/registrations', True),
+    ('/api/agenda', True),
+    ('/api/agenda?open_day_id=1', True),
+    ('/api/agenda?limit=100', True),
+    ('/api/agenda/conflicts', True),
+    ('/api/notifications', True),
+    ('/api/notifications?limit=20', True),
+    ('/api/search?q=session', False),
+    ('/api/opendays/1/bundle', False),
+    ('/api/opendays/1/bundle', True),
+]
+
+
+class QueryCountConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    RESPONSE_CACHE_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
+    SERVER_TIMING_LOG = False
+
+
+def seed(size):
+    """Create `size` rows of everything the list endpoints return"""
+    user = User(email='visitor@example.com', password='Visitor123!', full_name='Visitor')
+    db.session.add(user)
+
+    subject_areas = [SubjectArea(name=f'Subject {i}') for i in range(size)]
+    buildings = [Building(name=f'Building {i}', campus='City Campus') for i in range(size)]
+    open_days = [
+        OpenDay(title=f'Open Day {i}', event_date=date.today() + timedelta(days=i),
+                start_time=time(9), end_time=time(16))
+        for i in range(size)
+    ]
+    db.session.add_all(subject_areas + buildings + open_days)
+    db.session.flush()
+
+    for i in range(size):
+        event = Event(
+            open_day_id=open_days[0].id, title=f'Event {i}', event_type='Talk',
+            start_time=time(9 + i % 8), end_time=time(10 + i % 8),
+            building_id=buildings[i].id, subject_area_id=subject_areas[i].id
+        )
+        db.session.add(event)
+        db.session.flush()
+        db.session.add(UserAgenda(user_id=user.id, event_id=event.id))
+        db.session.add(Course(name=f'Course {i}', subject_area_id=subject_areas[i].id))
+        db.session.add(Registration(user_id=user.id, open_day_id=open_days[i].id))
+
+    db.session.commit()
+    return create_access_token(identity=str(user.id))
+
+
+def measure(size):
+    """Return {(path, needs a JWT): statement count} for a database seeded with `size` rows"""
+    app = create_app(QueryCountConfig)
+    counts = {}
+
+    with app.app_context():
+        db.create_all()
+        token = seed(size)
+        client = app.test_client()
+        # Load the role-version map now so its periodic refresh is not counted
+        role_versions.reload()
+
+        for path, needs_auth in ENDPOINTS:
+            headers = {'Authorization': f'Bearer {token}'} if needs_auth else {}
+            # Drop the identity map so nothing is served from the seed session
+            db.session.expunge_all()
+            with count_queries() as counter:
+                response = client.get(path, headers=headers)
+                # Streamed lists only run their query as the body is read
+                body = response.get_data(as_text=True)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}: {body}')
+            counts[path, needs_auth] = counter.count
+
+        db.drop_all()
+
+    return counts
+
+
+def main():
+    small = measure(SMALL)
+    large = measure(LARGE)
+
+    failed = False
+    for endpoint in ENDPOINTS:
+        status = 'ok' if small[endpoint] == large[endpoint] else 'FAIL'
+        failed = failed or status == 'FAIL'
+        label = endpoint[0] + (' (JWT)' if endpoint[1] else '')
+        print(f'{status:4}  {label:38} {small[endpoint]:>3} queries @ {SMALL} rows, {large[endpoint]:>3} @ {LARGE} rows')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Query-plan regression check for the API's hot paths.
+
+Seeds a scratch database, sends each route below, and captures every SELECT
+it runs. Each captured query is then run through EXPLAIN with its original
+parameters. A route fails if any of its queries reads a whole table, either
+by a sequential scan or by walking an index with no search condition, which
+means no index serves that filter. Tables that a route legitimately reads
+in full are listed beside it.
+
+On Postgres, sequential scans are disabled for the EXPLAIN. That way a
+Seq Scan shows up only when no index can be used at all, whatever the table
+sizes. SQLite has no statistics, so it uses an index whenever one applies.
+
+    python check_query_plans.py
+    python check_query_plans.py --database-url postgresql://localhost/wlv_plans
+
+The target database is dropped and recreated, so point it at a scratch
+database.
+"""
+import argparse
+import random
+import sys
+from flask_jwt_extended import create_access_token
+from app import create_app, db, password_hasher
+from app.models import FAQ, Feedback, Registration
+from app.instrumentation import count_queries
+from app.auth import role_versions
+from benchmarks.common import SCALES, PASSWORD, make_config, seed
+
+# (method, path, needs a JWT, JSON body, tables it may scan in full)
+ENDPOINTS = [
+    ('GET', '/api/opendays', False, None, {'open_days'}),
+    ('GET', '/api/opendays/1', False, None, set()),
+    ('GET', '/api/events?open_day_id=1', False, None, set()),
+    ('GET', '/api/events?open_day_id=1&event_type=Talk&subject_area_id=3', False, None, set()),
+    ('GET', '/api/events?subject_area_id=3', False, None, set()),
+    ('GET', '/api/events?building_id=2', False, None, set()),
+    ('GET', '/api/events?limit=50', False, None, set()),
+    ('GET', '/api/events/1', False, None, set()),
+    ('GET', '/api/events?open_day_id=1&fields=id,title,start_time', False, None, set()),
+    ('GET', '/api/events?open_day_id=1&from=10:00&to=12:00', False, None, set()),
+    ('GET', '/api/courses?subject_area_id=3', False, None, set()),
+    ('GET', '/api/courses?limit=50', False, None, set()),
+    ('GET', '/api/courses/subject-areas', False, None, {'subject_areas'}),
+    ('GET', '/api/maps/buildings?campus=City Campus', False, None, set()),
+    ('GET', '/api/maps/buildings?limit=20', False, None, set()),
+    ('GET', '/api/faqs?limit=20', False, None, set()),
+    ('GET', '/api/search?q=session', False, None, set()),
+    ('GET', '/api/search?q=question&type=faq', False, None, set()),
+    ('GET', '/api/registrations', True, None, set()),
+    ('GET', '/api/agenda', True, None, set()),
+    ('GET', '/api/agenda?open_day_id=1', True, None, set()),
+    ('GET', '/api/agenda/conflicts', True, None, {'buildings'}),
+    ('POST', '/api/agenda/auto?open_day_id=1', True, {}, set()),
+    ('GET', '/api/notifications?limit=20', True, None, set()),
+    ('GET', '/api/notifications?unread=true', True, None, set()),
+    ('GET', '/api/notifications/unread-count', True, None, set()),
+    ('POST', '/api/notifications/read-all', True, {}, set()),
+    ('GET', '/api/opendays/1/bundle', True, None, {'subject_areas'}),
+    ('POST', '/api/auth/login', False, {'email': 'user0@example.com', 'password': PASSWORD}, set()),
+    ('POST', '/api/register/openday/1', True, {}, set()),
+    ('POST', '/api/feedback', True, {'open_day_id': 1, 'rating': 4}, set()),
+    ('POST', '/api/contact', False, {'name': 'Visitor', 'email': 'visitor@example.com', 'message': 'Hello'}, set()),
+]
+
+
+def seed_extras(user_id):
+    """Rows the benchmark seed does not create"""
+    db.session.add_all([FAQ(question=f'Question {i}?', answer='An answer', category='General') for i in range(50)])
+    # Already registered and already reviewed, so the POST routes only look up
+    if not Registration.query.filter_by(user_id=user_id, open_day_id=1).first():
+        db.session.add(Registration(user_id=user_id, open_day_id=1))
+    db.session.add(Feedback(user_id=user_id, open_day_id=1, rating=5))
+    db.session.commit()
+
+
+def explain(connection, statement, parameters):
+    """Return the tables `statement` reads in full"""
+    bounded = ' LIMIT ' in statement.upper()
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        scans, nodes = set(), [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.add(node['Relation Name'])
+            elif node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node and not bounded:
+                scans.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return scans
+
+    # SQLite reports "SCAN t" for a full scan and "SCAN t USING INDEX ix" for
+    # an index walk with no search condition, which reads every row unless
+    # the query is cut short by a LIMIT. A virtual table (the FTS5 search
+    # index) is searched when its index string names a constraint, and
+    # scans of CTEs and subqueries only read rows already produced.
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    intermediate = {detail.split()[1] for *_, detail in rows if detail.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    return {
+        detail.split()[1] for *_, detail in rows
+        if detail.startswith('SCAN ') and 'CONSTANT ROW' not in detail
+        and not (bounded and ' USING ' in detail)
+        and not (' VIRTUAL TABLE INDEX ' in detail and not detail.endswith(':'))
+        and detail.split()[1] not in intermediate and not detail.split()[1].startswith('(subquery-')
+    }
+
+
+def table_name(alias):
+    # Eager loads alias their joins as buildings_1, subject_areas_1, ...
+    name, _, suffix = alias.rpartition('_')
+    return name if suffix.isdigit() else alias
+
+
+def check(connection, label, counter, allowed):
+    """Print one line per route and return whether it passed"""
+    scans = set()
+    for statement, parameters in zip(counter.statements, counter.parameters):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            scans |= {table_name(alias) for alias in explain(connection, statement, parameters)}
+    scans -= allowed
+    status = 'FAIL' if scans else 'ok'
+    detail = f"full scan of {', '.join(sorted(scans))}" if scans else f'{counter.count} queries'
+    print(f'{status:4}  {label:64} {detail}')
+    return not scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='medium')
+    args = parser.parse_args()
+
+    app = create_app(make_config(args.database_url, 1, TESTING=True, RESPONSE_CACHE_ENABLED=False,
+                                 BCRYPT_LOG_ROUNDS=4))
+    passed = True
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(SCALES[args.scale], random.Random(0), password_hasher.hash(PASSWORD))
+        seed_extras(user_id=1)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        token = create_access_token(identity='1')
+        client = app.test_client()
+
+        with count_queries() as counter:
+            role_versions.reload()
+        with db.engine.begin() as connection:
+            passed &= check(connection, 'role version refresh', counter, set())
+
+        for method, path, needs_auth, body, allowed in ENDPOINTS:
+            headers = {'Authorization': f'Bearer {token}'} if needs_auth else {}
+            db.session.expunge_all()
+            with count_queries() as counter:
+                response = client.open(path, method=method, headers=headers, json=body)
+                # Streamed lists only run their query as the body is read
+                response.get_data()
+            if response.status_code >= 500:
+                raise RuntimeError(f'{method} {path} returned {response.status_code}: '
+                                   f'{response.get_data(as_text=True)}')
+            with db.engine.begin() as connection:
+                passed &= check(connection, f'{method} {path}', counter, allowed)
+
+        db.session.remove()
+        db.drop_all()
+
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
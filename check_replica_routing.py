@@ -0,0 +1,115 @@
+"""
+Read-replica routing check (app/db_routing.py).
+
+Runs the app against two scratch SQLite files, one as the primary and one
+as the replica, and records which database each request's statements go
+to. The replica starts as a copy of the primary and then never receives
+the primary's writes, like a replica that has fallen behind. It fails
+unless:
+
+    a public GET reads from the replica
+    a write (POST) goes to the primary
+    a GET on a @use_primary route reads from the primary
+    a browser's GET right after its own write reads from the primary (pin cookie)
+    a Bearer-token client without cookies reads its own write (pin by user)
+    a user who has not written still reads from the replica
+
+    python check_replica_routing.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, time
+from sqlalchemy import event
+from app import create_app, db
+from app.auth import create_tokens
+from app.db_routing import REPLICA
+from app.models import OpenDay, User
+from benchmarks.common import make_config
+
+
+class Recorder:
+    """Which databases ('primary', 'replica') ran statements"""
+
+    def __init__(self, engines):
+        self.used = set()
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', self._listener(name))
+
+    def _listener(self, name):
+        def record(conn, cursor, statement, parameters, context, executemany):
+            self.used.add(name)
+        return record
+
+    def run(self, call):
+        self.used = set()
+        response = call()
+        response.get_data()
+        if response.status_code >= 500:
+            raise RuntimeError(f'{response.status_code}: {response.get_data(as_text=True)}')
+        return response, self.used
+
+
+def check(label, used, expected):
+    ok = used == {expected}
+    print(f"{'ok' if ok else 'FAIL':4}  {label:58} {', '.join(sorted(used)) or 'no queries'}")
+    return ok
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    primary = os.path.join(directory, 'primary.db')
+    replica = os.path.join(directory, 'replica.db')
+
+    app = create_app(make_config(f'sqlite:///{primary}', 1, TESTING=True, RESPONSE_CACHE_ENABLED=False,
+                                 BCRYPT_LOG_ROUNDS=4, SQLALCHEMY_REPLICA_URI=f'sqlite:///{replica}'))
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(OpenDay(title='Launch Day', event_date=date.today(), start_time=time(9), end_time=time(17)))
+        db.session.add_all([User('first@example.com', 'Passw0rd!x', 'First'),
+                            User('second@example.com', 'Passw0rd!x', 'Second'),
+                            User('third@example.com', 'Passw0rd!x', 'Third')])
+        db.session.commit()
+        first, second, third = (create_tokens(user)[0] for user in User.query.order_by(User.id))
+        db.session.remove()
+        db.engines[None].dispose()
+        shutil.copyfile(primary, replica)
+        recorder = Recorder({'primary': db.engines[None], 'replica': db.engines[REPLICA]})
+
+    browser = app.test_client()
+    bearer = app.test_client(use_cookies=False)
+    as_first = {'Authorization': f'Bearer {first}'}
+    as_second = {'Authorization': f'Bearer {second}'}
+    as_third = {'Authorization': f'Bearer {third}'}
+    passed = True
+
+    _, used = recorder.run(lambda: browser.get('/api/opendays'))
+    passed &= check('GET /api/opendays', used, 'replica')
+
+    _, used = recorder.run(lambda: browser.get('/api/auth/me', headers=as_second))
+    passed &= check('GET /api/auth/me (@use_primary)', used, 'primary')
+
+    _, used = recorder.run(lambda: browser.post('/api/register/openday/1', headers=as_second, json={}))
+    passed &= check('POST /api/register/openday/1', used, 'primary')
+
+    _, used = recorder.run(lambda: browser.get('/api/opendays'))
+    passed &= check('GET /api/opendays after a write (pin cookie)', used, 'primary')
+
+    recorder.run(lambda: bearer.post('/api/register/openday/1', headers=as_first, json={}))
+    response, used = recorder.run(lambda: bearer.get('/api/registrations', headers=as_first))
+    passed &= check('GET /api/registrations after a write (pin by user)', used, 'primary')
+    registrations = response.get_json()['registrations']
+    own_write = len(registrations) == 1
+    print(f"{'ok' if own_write else 'FAIL':4}  {'  ...and it sees the new registration':58} {len(registrations)} found")
+    passed &= own_write
+
+    _, used = recorder.run(lambda: bearer.get('/api/registrations', headers=as_third))
+    passed &= check('GET /api/registrations by a user who has not written', used, 'replica')
+
+    shutil.rmtree(directory)
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,4 +11,97 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-dev-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
\ No newline at end of file
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+
+    # Public GET response cache (app/cache.py)
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 512
+    RESPONSE_CACHE_MAX_AGE = int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 0))
+    # Longest an entry is served; commits in other worker processes do not reach this one's cache
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+
+    # Keyset pagination (app/pagination.py). While the frontend migrates,
+    # list endpoints only paginate when a client sends `limit` or `cursor`.
+    LEGACY_UNPAGINATED_LISTS = os.environ.get('LEGACY_UNPAGINATED_LISTS', 'true').lower() == 'true'
+    PAGINATION_DEFAULT_LIMIT = 50
+    PAGINATION_MAX_LIMIT = 200
+
+    # Most event ids one POST /api/agenda/batch may add and remove in total
+    AGENDA_BATCH_LIMIT = 100
+
+    # Password hashing (app/passwords.py)
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+    BCRYPT_QUEUE_LIMIT = int(os.environ.get('BCRYPT_QUEUE_LIMIT', 32))
+
+    # Role versions (app/auth.py) are reloaded at least this often, so a role change
+    # made by another worker takes effect within this many seconds
+    ROLE_VERSION_REFRESH = 30
+
+    # JSON encoding (app/encoding.py): auto picks orjson when installed.
+    # Unpaginated list responses are streamed in batches of rows.
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    JSON_STREAM_LISTS = True
+    JSON_STREAM_BATCH_SIZE = 1000
+
+    # Building index for nearby queries and walking estimates (app/geo.py)
+    GEO_GRID_METERS = 250
+    GEO_MAX_RADIUS = 5000
+    GEO_INDEX_REFRESH = 60
+    WALKING_SPEED = 80  # metres a minute
+    WALKING_DETOUR = 1.3  # paths are this much longer than the straight line
+
+    # Per-open-day interval index of event times (app/intervals.py), rebuilt at least this often
+    INTERVAL_INDEX_REFRESH = 30
+
+    # Automatic agenda planning (app/planner.py): plan cache lifetime in seconds, and how
+    # many times a commit re-plans around events that filled up meanwhile
+    AUTO_AGENDA_REFRESH = 30
+    AUTO_AGENDA_RETRIES = 3
+
+    # Live open-day streams (app/live.py). Every stream holds a worker thread while
+    # open, so serve thousands per node with a gevent worker or a large thread pool.
+    LIVE_HEARTBEAT = 15  # seconds between keep-alive comments
+    LIVE_RETRY_MS = 3000  # client reconnect delay
+    LIVE_REPLAY_SIZE = 256  # messages per open day kept for Last-Event-ID resume
+    LIVE_MAX_CONNECTIONS = 5000  # per worker
+    LIVE_PG_RELAY = True  # relay between workers with LISTEN/NOTIFY on Postgres
+
+    # Background jobs (app/jobs.py), run by `flask worker`. Failed jobs retry after
+    # JOB_RETRY_BASE * 2^(attempt - 1) seconds, capped at JOB_RETRY_MAX.
+    JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', 1))
+    JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 4))
+    JOB_POLL_INTERVAL = 1.0  # seconds an idle worker thread waits between claims
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_BASE = 10
+    JOB_RETRY_MAX = 3600
+    JOB_LOCK_TIMEOUT = 600  # a running job older than this lost its worker
+    JOB_REAP_INTERVAL = 60
+    JOB_RETENTION_DAYS = 7  # finished jobs are deleted after this
+
+    # Outgoing email (app/mail.py); the defaults reach `flask smtp-sink`
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 1025))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'false').lower() == 'true'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_TIMEOUT = 10
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'opendays@wlv.ac.uk')
+    CONTACT_EMAIL = os.environ.get('CONTACT_EMAIL', 'opendays@wlv.ac.uk')
+
+    # Response compression (app/compression.py) and static assets (app/assets.py)
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+    ASSET_MAX_AGE = 365 * 24 * 3600
+
+    # Per-request timing (app/instrumentation.py)
+    SERVER_TIMING_ENABLED = True
+    SERVER_TIMING_LOG = os.environ.get('SERVER_TIMING_LOG', 'true').lower() == 'true'
+
+    # Read replica (app/db_routing.py); GET requests read from it when set
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 0)) or None
+    SQLALCHEMY_REPLICA_POOL_SIZE = int(os.environ.get('DATABASE_REPLICA_POOL_SIZE', 0)) or None
+    REPLICA_PIN_SECONDS = 5
@@ -0,0 +1,26 @@
+"""Add user role version
+
+Revision ID: 175b96a99e52
+Revises: 89af61dc5435
+Create Date: 2026-10-17 10:02:47.118630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '175b96a99e52'
+down_revision = '89af61dc5435'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('role_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('role_version')
@@ -0,0 +1,32 @@
+"""Add event seats taken counter
+
+Revision ID: 6277d2483e49
+Revises: 175b96a99e52
+Create Date: 2026-10-17 10:41:09.553812
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6277d2483e49'
+down_revision = '175b96a99e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('seats_taken', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the agenda entries that already exist
+    op.execute(
+        'UPDATE events SET seats_taken = '
+        '(SELECT COUNT(*) FROM user_agenda WHERE user_agenda.event_id = events.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_column('seats_taken')
@@ -0,0 +1,26 @@
+"""Add faq category
+
+Revision ID: 89af61dc5435
+Revises: ec73678e6edf
+Create Date: 2026-10-17 09:12:31.504118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '89af61dc5435'
+down_revision = 'ec73678e6edf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('faqs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('faqs', schema=None) as batch_op:
+        batch_op.drop_column('category')
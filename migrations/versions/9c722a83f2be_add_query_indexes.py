@@ -0,0 +1,51 @@
+"""Add indexes for the hot filter and lookup columns
+
+Revision ID: 9c722a83f2be
+Revises: 6277d2483e49
+Create Date: 2026-10-17 14:02:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c722a83f2be'
+down_revision = '6277d2483e49'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, extra options)
+INDEXES = [
+    ('ix_events_open_day_start', 'events', ['open_day_id', 'start_time', 'id'], {}),
+    ('ix_events_start', 'events', ['start_time', 'id'], {}),
+    ('ix_events_event_type', 'events', ['event_type'], {}),
+    ('ix_events_subject_area_id', 'events', ['subject_area_id'], {}),
+    ('ix_events_building_id', 'events', ['building_id'], {}),
+    ('ix_registrations_user_open_day', 'registrations', ['user_id', 'open_day_id'], {}),
+    ('ix_feedback_user_open_day', 'feedback', ['user_id', 'open_day_id'], {}),
+    ('ix_user_agenda_event_id', 'user_agenda', ['event_id'], {}),
+    ('ix_courses_subject_area_name', 'courses', ['subject_area_id', 'name', 'id'], {}),
+    ('ix_courses_name', 'courses', ['name', 'id'], {}),
+    ('ix_buildings_campus_name', 'buildings', ['campus', 'name', 'id'], {}),
+    ('ix_buildings_name', 'buildings', ['name', 'id'], {}),
+    ('ix_open_days_event_date', 'open_days', ['event_date'], {}),
+    ('ix_faqs_created_at', 'faqs', ['created_at', 'id'], {}),
+    ('ix_users_role_version', 'users', ['role_version'],
+     {'postgresql_where': sa.text('role_version > 0'), 'sqlite_where': sa.text('role_version > 0')}),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; on Postgres
+    # this builds each index without taking a write lock on the table.
+    # users.email needs nothing new: its unique constraint is already an index.
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **options)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,55 @@
+"""Make registrations and feedback unique per user and open day
+
+Revision ID: bf2f1070e81e
+Revises: 9c722a83f2be
+Create Date: 2026-10-17 15:20:44.803517
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'bf2f1070e81e'
+down_revision = '9c722a83f2be'
+branch_labels = None
+depends_on = None
+
+# (constraint, table, index it replaces)
+CONSTRAINTS = [
+    ('registration_user_open_day_unique', 'registrations', 'ix_registrations_user_open_day'),
+    ('feedback_user_open_day_unique', 'feedback', 'ix_feedback_user_open_day'),
+]
+
+
+def upgrade():
+    # Keep the earliest row of any existing duplicates
+    for _, table, _ in CONSTRAINTS:
+        op.execute(
+            f'DELETE FROM {table} WHERE id NOT IN '
+            f'(SELECT MIN(id) FROM {table} GROUP BY user_id, open_day_id)'
+        )
+
+    if op.get_context().dialect.name == 'postgresql':
+        # Build the unique index without blocking writes, then attach it as
+        # the constraint, which only needs a brief lock
+        with op.get_context().autocommit_block():
+            for name, table, _ in CONSTRAINTS:
+                op.create_index(name, table, ['user_id', 'open_day_id'], unique=True, postgresql_concurrently=True)
+        for name, table, _ in CONSTRAINTS:
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+        with op.get_context().autocommit_block():
+            for _, table, index in CONSTRAINTS:
+                op.drop_index(index, table_name=table, postgresql_concurrently=True, if_exists=True)
+        return
+
+    for name, table, index in CONSTRAINTS:
+        op.drop_index(index, table_name=table, if_exists=True)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_unique_constraint(name, ['user_id', 'open_day_id'])
+
+
+def downgrade():
+    for name, table, index in CONSTRAINTS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
+        op.create_index(index, table, ['user_id', 'open_day_id'])
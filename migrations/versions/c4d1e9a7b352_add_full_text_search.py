@@ -0,0 +1,81 @@
+"""Add full-text search over courses, events and FAQs
+
+Revision ID: c4d1e9a7b352
+Revises: bf2f1070e81e
+Create Date: 2026-10-17 23:48:12.120954
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d1e9a7b352'
+down_revision = 'bf2f1070e81e'
+branch_labels = None
+depends_on = None
+
+# table: (FTS5 kind code, title column, keyword columns, body column); mirrors app/search.py
+SOURCES = {
+    'courses': (1, 'name', ('ucas_code', 'faculty'), 'description'),
+    'events': (2, 'title', ('presenter',), 'description'),
+    'faqs': (3, 'question', (), 'answer'),
+}
+
+
+def keywords(columns, row=''):
+    return " || ' ' || ".join(f"coalesce({row}{name}, '')" for name in columns) or "''"
+
+
+def upgrade_postgresql():
+    # Adding a stored generated column rewrites the table under an exclusive lock
+    for table, (_, title, keyword_columns, body) in SOURCES.items():
+        op.execute(
+            f'ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ('
+            f"setweight(to_tsvector('english', coalesce({title}, '')), 'A') || "
+            f"setweight(to_tsvector('english', {keywords(keyword_columns)}), 'B') || "
+            f"setweight(to_tsvector('english', coalesce({body}, '')), 'C')"
+            f') STORED'
+        )
+    with op.get_context().autocommit_block():
+        for table in SOURCES:
+            op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def upgrade_sqlite():
+    op.execute("CREATE VIRTUAL TABLE search_index USING fts5(title, keywords, body, tokenize='porter unicode61', "
+               "prefix='3 4 5 6')")
+    for table, (code, title, keyword_columns, body) in SOURCES.items():
+        op.execute(
+            f'INSERT INTO search_index (rowid, title, keywords, body) '
+            f"SELECT id * 4 + {code}, {title}, {keywords(keyword_columns)}, coalesce({body}, '') FROM {table}"
+        )
+        insert = (f'INSERT INTO search_index (rowid, title, keywords, body) VALUES '
+                  f"(new.id * 4 + {code}, new.{title}, {keywords(keyword_columns, 'new.')}, "
+                  f"coalesce(new.{body}, ''))")
+        delete = f'DELETE FROM search_index WHERE rowid = old.id * 4 + {code}'
+        indexed = ', '.join((title, *keyword_columns, body))
+        op.execute(f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN {insert}; END')
+        op.execute(f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {indexed} ON {table} '
+                   f'BEGIN {delete}; {insert}; END')
+        op.execute(f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN {delete}; END')
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        upgrade_postgresql()
+    else:
+        upgrade_sqlite()
+
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        for table in SOURCES:
+            op.drop_index(f'ix_{table}_search_vector', table_name=table)
+            op.execute(f'ALTER TABLE {table} DROP COLUMN search_vector')
+        return
+
+    for table in SOURCES:
+        for action in ('insert', 'update', 'delete'):
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_search_{action}')
+    op.execute('DROP TABLE IF EXISTS search_index')
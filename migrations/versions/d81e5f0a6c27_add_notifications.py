@@ -0,0 +1,63 @@
+"""Add notifications, user notifications and the unread counter
+
+Revision ID: d81e5f0a6c27
+Revises: c4d1e9a7b352
+Create Date: 2026-10-18 00:12:40.513806
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e5f0a6c27'
+down_revision = 'c4d1e9a7b352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('notification_type', sa.String(length=50), nullable=True),
+        sa.Column('related_event_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['related_event_id'], ['events.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'user_notifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('notification_id', sa.Integer(), nullable=True),
+        sa.Column('is_read', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('delivered_at', sa.DateTime(), server_default=sa.func.current_timestamp(), nullable=True),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'notification_id', name='user_notification_unique')
+    )
+    op.create_index('ix_user_notifications_notification_id', 'user_notifications', ['notification_id'])
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False))
+
+    # registrations is live; build its index without a write lock on Postgres
+    with op.get_context().autocommit_block():
+        op.create_index('ix_registrations_open_day_user', 'registrations', ['open_day_id', 'user_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_registrations_open_day_user', table_name='registrations',
+                      postgresql_concurrently=True, if_exists=True)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
+
+    op.drop_table('user_notifications')
+    op.drop_table('notifications')
@@ -0,0 +1,44 @@
+"""Make faqs.created_at NOT NULL; it is the FAQ list's keyset sort key
+
+Revision ID: f3c8a2d9e1b7
+Revises: e5a93b1f7d40
+Create Date: 2026-10-18 09:20:44.182630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8a2d9e1b7'
+down_revision = 'e5a93b1f7d40'
+branch_labels = None
+depends_on = None
+
+
+def _sqlite_triggers():
+    # SQLite rebuilds the table to change a column, which drops its triggers
+    # (the search index ones from c4d1e9a7b352); they are put back afterwards
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return []
+    return bind.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'faqs'").scalars().all()
+
+
+def upgrade():
+    # Rows without a creation time sort as if created when last edited, or now
+    op.execute('UPDATE faqs SET created_at = coalesce(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL')
+    triggers = _sqlite_triggers()
+    with op.batch_alter_table('faqs', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False,
+                              server_default=sa.func.current_timestamp())
+    for trigger in triggers:
+        op.execute(trigger)
+
+
+def downgrade():
+    triggers = _sqlite_triggers()
+    with op.batch_alter_table('faqs', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True, server_default=None)
+    for trigger in triggers:
+        op.execute(trigger)